@@ -0,0 +1,534 @@
+"""
+Many Blokus games played side by side, as stacked NumPy arrays.
+
+A Batch holds K games on boards of the same size, with the same start
+positions, as arrays with one row per game (struct of arrays) instead
+of K Blokus objects:
+
+    owner:     (K, C) who covers each square (0 if nobody)
+    blocked:   (K, n, C) the squares each player may not cover (occupied,
+               or sharing an edge with one of their pieces)
+    corners:   (K, n, C) the open corners of each player
+    remaining: (K, n) the shapes each player has left, as bit sets of
+               kinds (bit k for placements.KINDS[k])
+    last:      (K, n) the kind index of each player's last shape, or -1
+    left:      (K, n) the squares each player has left to play
+    active:    (K, n) whether each player is still playing
+    curr:      (K,) the player to move (numbered from 1)
+    over:      (K,) whether the game is over
+
+where C is the number of squares (size * size, numbered row by row as in
+placements.PlacementTable) and n the number of players. The square
+arrays have one extra column at the end, always false, which the
+padding of the placement geometry points to.
+
+step moves every game that is not over at once. The candidate moves of
+the current players are the placements of the shared PlacementTable
+that cover one of their open corners; they are sampled (or, failing
+that, all checked) together for all games, and one legal move is picked
+in each game, at random or greedily. As in a Blokus game with
+auto_pass, a player with no legal move when their turn comes is retired
+instead.
+"""
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from shape_definitions import ShapeKind
+from piece import Point, ORIENTATIONS, SHAPE_SIZES
+from placements import KINDS, PlacementTable, placements_for
+
+POLICIES = ("random", "greedy")
+
+# Games whose candidate moves are checked together (which bounds the
+# memory used by a step)
+CHUNK = 1024
+
+# Rounds of sampling, and candidates drawn per game in each round,
+# before every candidate of a game is checked (see Batch._choose)
+ROUNDS = 3
+SAMPLES = 16
+
+# The windows around squares (see Geometry), large enough to hold every
+# placement covering the square in the middle, and packed into two
+# 64-bit words
+REACH = max(SHAPE_SIZES.values()) - 1
+WINDOW = 2 * REACH + 1
+_BITS = 128
+
+_ALL_KINDS = (1 << len(KINDS)) - 1
+_ONE = KINDS.index(ShapeKind.ONE)
+
+
+class Geometry:
+    """
+    The squares of every placement of a (size x size) board, and the
+    squares around them, as arrays of square numbers with one row per
+    placement id, padded with size * size (the padding column of the
+    batch arrays):
+
+        cells:   the squares covered
+        edges:   the squares sharing an edge with the placement
+        corners: the squares sharing only a corner with the placement
+
+    Squares beyond the bounds of the board are left out. sizes holds
+    the number of squares of each kind of shape, by kind index, and
+    tiers[s] the bit set of the kinds of s squares.
+
+    The placements of kind KINDS[k] covering square i are at positions
+    cover_bounds[i * len(KINDS) + k] to cover_bounds[i * len(KINDS) + k
+    + 1] of cover_ids (which is the cover_ids array of the table, whose
+    placements are sorted by id, and so by kind, for each square).
+
+    Every placement covering a square lies in the (WINDOW x WINDOW)
+    window centered on it. windows holds, for each position of
+    cover_ids, the squares of that placement as bits of the window of
+    the square it covers (bit WINDOW * (dr + REACH) + dc + REACH for the
+    square dr rows and dc columns away), in two 64-bit words (two rows
+    of the array, low words first). Packing the blocked squares of a
+    window the same way, once for each open corner, lets every
+    candidate covering that corner be checked with two ANDs.
+    """
+
+    table: PlacementTable
+    cells: np.ndarray
+    edges: np.ndarray
+    corners: np.ndarray
+    sizes: np.ndarray
+    tiers: np.ndarray
+    kind_numbers: np.ndarray
+    cover_ids: np.ndarray
+    cover_bounds: np.ndarray
+    windows: np.ndarray
+
+    def __init__(self, table: PlacementTable) -> None:
+        """
+        Constructor
+        """
+        self.table = table
+        size = table.size
+        pad = size * size
+        count = len(table)
+        self.cells = np.where(table.cells >= 0, table.cells,
+                              pad).astype(np.int64)
+        orientations = [o for kind in KINDS for o in ORIENTATIONS[kind]]
+        widest_edges = max(len(o.edges) for o in orientations)
+        widest_corners = max(len(o.corners) for o in orientations)
+        self.edges = np.full((count, widest_edges), pad, dtype=np.int16)
+        self.corners = np.full((count, widest_corners), pad, dtype=np.int16)
+        for k, kind in enumerate(KINDS):
+            of_kind = table.kinds == k
+            for o in ORIENTATIONS[kind]:
+                ids = np.flatnonzero(of_kind & (table.orientations == o.id))
+                anchors = table.anchors[ids].astype(np.int32)
+                self.edges[ids, :len(o.edges)] = _squares(anchors, o.edges,
+                                                          size)
+                self.corners[ids, :len(o.corners)] = _squares(anchors,
+                                                              o.corners, size)
+        self.sizes = np.array([SHAPE_SIZES[kind] for kind in KINDS],
+                              dtype=np.int16)
+        self.tiers = np.zeros(self.sizes.max() + 1, dtype=np.int32)
+        for k, squares in enumerate(self.sizes.tolist()):
+            self.tiers[squares] |= 1 << k
+        self.kind_numbers = np.arange(len(KINDS), dtype=np.int32)
+
+        #in memory rather than memory-mapped, since they are read a lot
+        self.cover_ids = np.array(table.cover_ids, dtype=np.int64)
+        positions = np.arange(len(self.cover_ids))
+        cells = np.searchsorted(table.cover_starts, positions, side="right") - 1
+        keys = cells * len(KINDS) + table.kinds[self.cover_ids]
+        self.cover_bounds = np.searchsorted(
+            keys, np.arange(pad * len(KINDS) + 1))
+
+        rows, cols = np.divmod(cells, size)
+        covered = self.cells[self.cover_ids]
+        inside = covered < pad
+        bits = np.where(inside,
+                        (covered // size - rows[:, None] + REACH) * WINDOW
+                        + covered % size - cols[:, None] + REACH,
+                        WINDOW * WINDOW)
+        window = np.zeros((len(self.cover_ids), WINDOW * WINDOW + 1),
+                          dtype=bool)
+        np.put_along_axis(window, bits, inside, axis=1)
+        self.windows = _pack(window[:, :WINDOW * WINDOW])
+
+        for array in (self.cells, self.edges, self.corners, self.sizes,
+                      self.tiers, self.kind_numbers, self.cover_ids,
+                      self.cover_bounds, self.windows):
+            array.setflags(write=False)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """
+    Packs rows of at most _BITS booleans into two 64-bit words each,
+    returned as two rows (the low words, then the high words).
+    """
+    packed = np.packbits(bits, axis=-1, bitorder="little")
+    raw = np.zeros((len(bits), _BITS // 8), dtype=np.uint8)
+    raw[:, :packed.shape[1]] = packed
+    return np.ascontiguousarray(raw.view(np.uint64).T)
+
+
+def _squares(anchors: np.ndarray, offsets: tuple[Point, ...],
+             size: int) -> np.ndarray:
+    """
+    Returns the square numbers of the given offsets from each anchor,
+    with size * size for the squares beyond the bounds of the board.
+    """
+    rel = np.array(offsets, dtype=np.int32)
+    rows = anchors[:, :1] + rel[:, 0]
+    cols = anchors[:, 1:] + rel[:, 1]
+    inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+    return np.where(inside, rows * size + cols, size * size)
+
+
+_GEOMETRY: dict[int, Geometry] = {}
+
+
+def geometry_for(size: int) -> Geometry:
+    """
+    Returns the placement geometry of a board of the given size, shared
+    by every batch of that size in the process.
+    """
+    if size not in _GEOMETRY:
+        _GEOMETRY[size] = Geometry(placements_for(size))
+    return _GEOMETRY[size]
+
+
+class Batch:
+    """
+    K Blokus games played side by side (see the module docstring for
+    the arrays). Every game starts out empty, with player 1 to move.
+    """
+
+    count: int
+    num_players: int
+    size: int
+    geometry: Geometry
+    rng: np.random.Generator
+    owner: np.ndarray
+    blocked: np.ndarray
+    corners: np.ndarray
+    remaining: np.ndarray
+    last: np.ndarray
+    left: np.ndarray
+    active: np.ndarray
+    curr: np.ndarray
+    over: np.ndarray
+    moves: int
+
+    def __init__(self, count: int, num_players: int, size: int,
+                 start_positions: set[Point],
+                 seed: Optional[int] = None) -> None:
+        """
+        Constructor
+
+            count: Number of games
+            num_players: Number of players in each game
+            size: Number of squares on each side of the board
+            start_positions: Positions for players' first moves
+            seed: Seed of the random moves (and tie-breaks)
+
+        Raises ValueError in the same cases as the Blokus constructor,
+        or if count is less than 1.
+        """
+        if count < 1 or num_players < 1 or num_players > 4 or size < 5:
+            raise ValueError
+        for r, c in start_positions:
+            if r < 0 or c < 0 or r > size - 1 or c > size - 1:
+                raise ValueError
+        if len(start_positions) < num_players:
+            raise ValueError
+
+        self.count = count
+        self.num_players = num_players
+        self.size = size
+        self.geometry = geometry_for(size)
+        self.rng = np.random.default_rng(seed)
+
+        squares = size * size + 1
+        self.owner = np.zeros((count, squares), dtype=np.int8)
+        self.blocked = np.zeros((count, num_players, squares), dtype=bool)
+        self.corners = np.zeros((count, num_players, squares), dtype=bool)
+        for r, c in start_positions:
+            self.corners[:, :, r * size + c] = True
+        total = sum(SHAPE_SIZES.values())
+        self.remaining = np.full((count, num_players), _ALL_KINDS,
+                                 dtype=np.int32)
+        self.last = np.full((count, num_players), -1, dtype=np.int8)
+        self.left = np.full((count, num_players), total, dtype=np.int16)
+        self.active = np.ones((count, num_players), dtype=bool)
+        self.curr = np.ones(count, dtype=np.int8)
+        self.over = np.zeros(count, dtype=bool)
+        self.moves = 0
+
+    def legal_ids(self, game: int) -> np.ndarray:
+        """
+        Returns the ids (in the PlacementTable) of the legal moves of
+        the current player of a game, in increasing order.
+        """
+        if self.over[game]:
+            return np.zeros(0, dtype=np.int64)
+        games = np.array([game])
+        players = self.curr[games].astype(np.intp) - 1
+        ranges = self._ranges(games, players, self.remaining[games, players])
+        _, ids = self._legal(*ranges)
+        return ids
+
+    def _ranges(self, games: np.ndarray, players: np.ndarray,
+                allowed: np.ndarray
+                ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the candidate moves of the given players in the given
+        games: the placements of the allowed kinds (a bit set per game)
+        covering one of their open corners. They are returned as
+        ranges of positions in cover_ids (the position in games they
+        belong to, where they start and how long they are), sorted by
+        game, along with the blocked squares of the window around the
+        corner of each range (see Geometry). A placement covering
+        several corners is in several ranges.
+        """
+        geometry = self.geometry
+        size = self.size
+        which, cells = np.nonzero(self.corners[games, players])
+        #the windows are slices of the boards, with a margin all around
+        #so that the windows of the squares on the sides fit
+        boards = np.zeros((len(games), size + 2 * REACH, size + 2 * REACH),
+                          dtype=bool)
+        boards[:, REACH:REACH + size, REACH:REACH + size] = \
+            self.blocked[games, players, :size * size].reshape(-1, size, size)
+        windows = sliding_window_view(boards, (WINDOW, WINDOW), axis=(1, 2))
+        rows, cols = np.divmod(cells, size)
+        blocked = _pack(windows[which, rows, cols].reshape(len(which),
+                                                           WINDOW * WINDOW))
+        pairs, kinds = np.nonzero(
+            (allowed[which][:, None] >> geometry.kind_numbers) & 1)
+        keys = cells[pairs] * len(KINDS) + kinds
+        starts = geometry.cover_bounds[keys]
+        lengths = geometry.cover_bounds[keys + 1] - starts
+        keep = lengths > 0
+        pairs = pairs[keep]
+        return which[pairs], starts[keep], lengths[keep], blocked[:, pairs]
+
+    def _blocked(self, positions: np.ndarray, blocked: np.ndarray,
+                 ranges: np.ndarray) -> np.ndarray:
+        """
+        Returns which of the placements at the given positions of
+        cover_ids cover a square blocked for the player of their game,
+        given the blocked squares of the window of each range (see
+        _ranges) and the range of each position.
+        """
+        windows = self.geometry.windows
+        low = windows[0][positions] & blocked[0][ranges]
+        high = windows[1][positions] & blocked[1][ranges]
+        return (low | high) != 0
+
+    def _legal(self, owner: np.ndarray, starts: np.ndarray,
+               lengths: np.ndarray, blocked: np.ndarray
+               ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Checks every candidate in the given ranges (see _ranges), and
+        returns the legal ones: for each, the position of its game in
+        the games the ranges were found for and its placement id,
+        sorted by game and then by id.
+        """
+        geometry = self.geometry
+        ends = np.cumsum(lengths)
+        ranges = np.repeat(np.arange(len(starts)), lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) \
+            + (starts - ends + lengths)[ranges]
+        legal = ~self._blocked(positions, blocked, ranges)
+        ids = geometry.cover_ids[positions[legal]]
+        count = len(geometry.cells)
+        keys = np.unique(owner[ranges[legal]].astype(np.int64) * count + ids)
+        return keys // count, keys % count
+
+    def _choose(self, games: np.ndarray, players: np.ndarray,
+                allowed: np.ndarray) -> np.ndarray:
+        """
+        Picks a legal move of one of the allowed kinds for the current
+        player of each given game, uniformly at random, and returns
+        their ids, with -1 for the games where there is none.
+
+        Candidates are sampled first: a (corner, placement) pair is
+        drawn at random among those in the ranges of the game, and
+        accepted if the placement is legal, with a probability of one
+        over the number of corners it covers (so that every legal
+        placement is equally likely). The games still without a move
+        after a few rounds have all their candidates checked.
+        """
+        geometry = self.geometry
+        owner, starts, lengths, blocked = self._ranges(games, players,
+                                                       allowed)
+        totals = np.bincount(owner, weights=lengths,
+                             minlength=len(games)).astype(np.int64)
+        ends = np.cumsum(lengths)
+        firsts = np.cumsum(totals) - totals
+        picked = np.full(len(games), -1, dtype=np.int64)
+
+        todo = np.flatnonzero(totals > 0)
+        for _ in range(ROUNDS):
+            if not len(todo):
+                break
+            draws = (self.rng.random((len(todo), SAMPLES))
+                     * totals[todo, None]).astype(np.int64) \
+                + firsts[todo, None]
+            where = np.searchsorted(ends, draws, side="right")
+            positions = starts[where] + draws - (ends[where] - lengths[where])
+            ids = geometry.cover_ids[positions]
+            rows = np.broadcast_to(todo[:, None], ids.shape)
+            legal = ~self._blocked(positions, blocked, where)
+            squares = self.size * self.size + 1
+            corner_rows = (games[rows] * self.num_players
+                           + players[rows]) * squares
+            touched = self.corners.reshape(-1)[
+                corner_rows[..., None] + geometry.cells[ids]].sum(axis=-1)
+            accept = legal & (self.rng.random(ids.shape) * touched < 1)
+            found = accept.any(axis=1)
+            first = accept.argmax(axis=1)
+            picked[todo[found]] = ids[found, first[found]]
+            todo = todo[~found]
+
+        if len(todo):
+            keep = np.isin(owner, todo)
+            owner, ids = self._legal(owner[keep], starts[keep],
+                                     lengths[keep], blocked[:, keep])
+            counts = np.bincount(owner, minlength=len(games))
+            firsts = np.cumsum(counts) - counts
+            has = todo[counts[todo] > 0]
+            choice = firsts[has] + (self.rng.random(len(has))
+                                    * counts[has]).astype(np.int64)
+            picked[has] = ids[choice]
+        return picked
+
+    def _pick(self, games: np.ndarray, policy: str) -> np.ndarray:
+        """
+        Picks a move with the given policy for the current player of
+        each given game, and returns their ids, with -1 for the games
+        where they have no legal move.
+        """
+        players = self.curr[games].astype(np.intp) - 1
+        remaining = self.remaining[games, players]
+        if policy == "random":
+            return self._choose(games, players, remaining)
+
+        #the largest shapes first: all the kinds of the largest size a
+        #player has left, then the next size down for those who could
+        #not play any of them, and so on
+        picked = np.full(len(games), -1, dtype=np.int64)
+        todo = np.flatnonzero(remaining != 0)
+        while len(todo):
+            tiers = self.geometry.tiers[None, :]
+            sizes = np.where(remaining[todo, None] & tiers,
+                             np.arange(tiers.shape[1]), 0).max(axis=1)
+            allowed = remaining[todo] & self.geometry.tiers[sizes]
+            picked[todo] = self._choose(games[todo], players[todo], allowed)
+            remaining[todo] &= ~allowed
+            todo = todo[(picked[todo] < 0) & (remaining[todo] != 0)]
+        return picked
+
+    def step(self, policy: str = "random") -> np.ndarray:
+        """
+        Plays one turn in every game that is not over: the current
+        player plays a move picked by the given policy ("random" for
+        any legal move, "greedy" for one with the largest shape they
+        can play, both uniformly at random among those), or is retired
+        if they have no legal move.
+
+        Returns the placement id played in each game, with -1 for the
+        games where nobody played.
+
+        Raises ValueError if the policy is unknown.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        played = np.full(self.count, -1, dtype=np.int64)
+        live = np.flatnonzero(~self.over)
+        for begin in range(0, len(live), CHUNK):
+            games = live[begin:begin + CHUNK]
+            picked = self._pick(games, policy)
+            moved = picked >= 0
+            stuck = games[~moved]
+            self.active[stuck, self.curr[stuck].astype(np.intp) - 1] = False
+            self._place(games[moved], picked[moved])
+            played[games] = picked
+        self._next_player(live)
+        return played
+
+    def _place(self, games: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Plays the given placements in the given games, for their
+        current players.
+        """
+        if not len(games):
+            return
+        geometry = self.geometry
+        table = geometry.table
+        pad = self.size * self.size
+        players = self.curr[games].astype(np.intp) - 1
+        cells = geometry.cells[ids]
+        kinds = table.kinds[ids].astype(np.int64)
+        rows = games[:, None]
+        everyone = np.arange(self.num_players)[None, :, None]
+
+        self.owner[rows, cells] = self.curr[games][:, None]
+        self.blocked[rows[:, :, None], everyone, cells[:, None, :]] = True
+        self.blocked[rows, players[:, None], geometry.edges[ids]] = True
+
+        #the same frontier update as Blokus._update_frontier
+        first = self.remaining[games, players] == _ALL_KINDS
+        self.corners[games[first], players[first]] = False
+        self.corners[rows, players[:, None], geometry.corners[ids]] = True
+        self.corners[rows[:, :, None], everyone, cells[:, None, :]] = False
+        self.corners[games, players] &= ~self.blocked[games, players]
+        self.blocked[:, :, pad] = False
+        self.corners[:, :, pad] = False
+        self.owner[:, pad] = 0
+
+        self.remaining[games, players] &= ~(1 << kinds).astype(np.int32)
+        self.last[games, players] = kinds
+        self.left[games, players] -= geometry.sizes[kinds]
+        self.active[games, players] &= self.remaining[games, players] != 0
+        self.moves += len(games)
+
+    def _next_player(self, games: np.ndarray) -> None:
+        """
+        Passes the turn to the next player still playing in each of
+        the given games, and ends the games where nobody is.
+        """
+        n = self.num_players
+        curr = self.curr[games].astype(np.intp) - 1
+        found = np.zeros(len(games), dtype=bool)
+        for shift in range(1, n + 1):
+            player = (curr + shift) % n
+            hit = ~found & self.active[games, player]
+            self.curr[games[hit]] = player[hit] + 1
+            found |= hit
+        self.over[games[~found]] = True
+
+    def run(self, policy: str = "random") -> int:
+        """
+        Plays every game to the end with the given policy (see step),
+        and returns the number of moves played.
+        """
+        before = self.moves
+        while not self.over.all():
+            self.step(policy)
+        return self.moves - before
+
+    def scores(self) -> np.ndarray:
+        """
+        Returns the score of every player of every game, as a
+        (K, n) array (see Blokus.get_score).
+        """
+        bonus = np.where(self.last == _ONE, 20, 15)
+        return np.where(self.remaining == 0, bonus, -self.left)
+
+    def winners(self) -> np.ndarray:
+        """
+        Returns, for every game, which players have the best score, as
+        a (K, n) array of booleans.
+        """
+        scores = self.scores()
+        return scores == scores.max(axis=1, keepdims=True)
@@ -0,0 +1,176 @@
+"""
+Bitboard representation of a Blokus board.
+
+Every square of the board is mapped to one bit of a Python int, so the
+squares occupied by a player (or by all players) fit in a single integer.
+Overlap, edge contact and corner contact between a piece and the squares
+already on the board then become a handful of shifts and ANDs, instead
+of a walk over every cell of the grid.
+
+Squares are laid out row by row with one extra padding column at the end
+of each row. The padding bits are never set, which keeps a shift to the
+east or west of the last/first column from wrapping into the next row.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+from shape_definitions import ShapeKind
+from piece import Point
+from base import Grid
+
+
+class Bitboard:
+    """
+    Packed occupancy masks for a (size x size) Blokus board.
+
+    players maps each player number to the mask of the squares covered
+    by that player's pieces, and occupied is the union of all of them.
+    pieces keeps the mask of every piece played so far, together with
+    the player and the shape kind, so a Grid can be rebuilt on demand.
+    """
+
+    size: int
+    stride: int
+    full: int
+    occupied: int
+    players: dict[int, int]
+    pieces: list[tuple[int, ShapeKind, int]]
+
+    def __init__(self, num_players: int, size: int) -> None:
+        """
+        Constructor
+
+            num_players: Number of players
+            size: Number of squares on each side of the board
+        """
+        self.size = size
+        self.stride = size + 1
+
+        # one row of real squares, followed by an (always empty) padding bit
+        row_mask = (1 << size) - 1
+        self.full = 0
+        for r in range(size):
+            self.full |= row_mask << (r * self.stride)
+
+        self.occupied = 0
+        self.players = {p: 0 for p in range(1, num_players + 1)}
+        self.pieces = []
+
+    def index(self, point: Point) -> int:
+        """
+        Returns the bit index of a point on the board.
+        """
+        r, c = point
+        return r * self.stride + c
+
+    def point(self, index: int) -> Point:
+        """
+        Returns the point corresponding to a bit index.
+        """
+        return divmod(index, self.stride)
+
+    def mask(self, points: Iterable[Point]) -> Optional[int]:
+        """
+        Returns the mask covering the given points, or None if
+        at least one of them is beyond the bounds of the board.
+        """
+        size = self.size
+        stride = self.stride
+        m = 0
+        for r, c in points:
+            if r < 0 or c < 0 or r >= size or c >= size:
+                return None
+            m |= 1 << (r * stride + c)
+        return m
+
+    def points(self, mask: int) -> list[Point]:
+        """
+        Returns the points covered by a mask, in row-major order.
+        """
+        pts: list[Point] = []
+        stride = self.stride
+        while mask:
+            low = mask & -mask
+            pts.append(divmod(low.bit_length() - 1, stride))
+            mask ^= low
+        return pts
+
+    def to_array(self, mask: int) -> np.ndarray:
+        """
+        Returns the mask as a (size x size) array of booleans,
+        indexed by row and column.
+        """
+        num_bytes = (self.size * self.stride + 7) // 8
+        raw = np.frombuffer(mask.to_bytes(num_bytes, "little"), dtype=np.uint8)
+        bits = np.unpackbits(raw, bitorder="little")[:self.size * self.stride]
+        return bits.reshape(self.size, self.stride)[:, :self.size].astype(bool)
+
+    def edges(self, mask: int) -> int:
+        """
+        Returns the squares on the board that share an edge
+        with the given mask, not including the mask itself.
+        """
+        stride = self.stride
+        around = (mask << 1) | (mask >> 1) | (mask << stride) | (mask >> stride)
+        return around & self.full & ~mask
+
+    def corners(self, mask: int) -> int:
+        """
+        Returns the squares on the board that share a corner
+        (but not an edge) with the given mask, not including
+        the mask itself.
+        """
+        stride = self.stride
+        diagonal = (
+            (mask << (stride + 1))
+            | (mask << (stride - 1))
+            | (mask >> (stride + 1))
+            | (mask >> (stride - 1))
+        )
+        return diagonal & self.full & ~mask & ~self.edges(mask)
+
+    def place(self, player: int, kind: ShapeKind, mask: int) -> None:
+        """
+        Records a piece played by the given player.
+
+        The caller is responsible for checking that the piece
+        is legal; this method only updates the masks.
+        """
+        self.players[player] |= mask
+        self.occupied |= mask
+        self.pieces.append((player, kind, mask))
+
+    def copy(self) -> "Bitboard":
+        """
+        Returns a copy of the board, which can be changed without
+        affecting this one.
+        """
+        other = Bitboard.__new__(Bitboard)
+        other.size = self.size
+        other.stride = self.stride
+        other.full = self.full
+        other.occupied = self.occupied
+        other.players = self.players.copy()
+        other.pieces = self.pieces.copy()
+        return other
+
+    def unplace(self) -> tuple[int, ShapeKind, int]:
+        """
+        Takes back the most recently placed piece, and returns
+        the player, shape kind and mask that it was placed with.
+        """
+        player, kind, mask = self.pieces.pop()
+        self.players[player] &= ~mask
+        self.occupied &= ~mask
+        return player, kind, mask
+
+    def to_grid(self) -> Grid:
+        """
+        Builds the Grid view of the board.
+        """
+        grid: Grid = [[None] * self.size for _ in range(self.size)]
+        for player, kind, mask in self.pieces:
+            for r, c in self.points(mask):
+                grid[r][c] = (player, kind)
+        return grid
@@ -1,8 +1,15 @@
-from typing import Optional
-from shape_definitions import ShapeKind, definitions
-from piece import Point, Shape, Piece
-from base import BlokusBase
+from typing import Any, Callable, Iterable, Iterator, Optional
 import copy
+import numpy as np
+from shape_definitions import ShapeKind
+from piece import Point, Shape, Piece, Placement, ORIENTATIONS, SHAPES, \
+    SHAPE_SIZES, shape_copies
+from base import BlokusBase
+from bitboard import Bitboard
+from zobrist import ZobristKeys, keys_for
+from placements import KINDS, placements_for
+from moveindex import MoveDelta, MoveIndex
+from events import BlokusListener
 
 # Unoccupied grid cells are represented with None.
 #
@@ -24,26 +31,43 @@ class Blokus(BlokusBase):
     This implementation behaves according to the official Blokus specifications.
     """
 
-    _shapes: dict[ShapeKind, Shape]
+    _shapes: Optional[dict[ShapeKind, Shape]]
     _size: int
     _num_players: int
     _curr_player: int
-    _grid: Grid
+    _grid: Optional[Grid]
+    _board: Bitboard
+    _start_mask: int
     _retired_players: set[int]
     _start_positions: set[Point]
     _players: dict[int, dict[ShapeKind, Shape]]
     _last_move: dict[int, Optional[ShapeKind]]
-    empty_locations : set[Point]
+    _corners: dict[int, int]
+    _history: list["_Change"]
+    _keys: ZobristKeys
+    _hash: int
+    _active: set[int]
+    _auto_pass: bool
+    _moves: Optional[MoveIndex]
+    _remaining_squares: dict[int, int]
+    _ranking: Optional[list[list[int]]]
+    _empty: Optional[set[Point]]
+    _listeners: list[BlokusListener]
 
     def __init__(self,
                  num_players: int,
                  size: int,
-                 start_positions: set[Point]) -> None:
+                 start_positions: set[Point],
+                 auto_pass: bool = False) -> None:
         """
         Attributes:
             num_players: Number of players
             size: Number of squares on each side of the board
             start_positions: Positions for players' first moves
+            auto_pass: If True, a player who has no legal move left
+                when their turn comes is retired automatically (a
+                player who cannot move now never can again), so
+                nobody has to call retire for them.
 
         Raises ValueError (Not implemented yet)
             if num_players is less than 1 or more than 4,
@@ -66,29 +90,72 @@ class Blokus(BlokusBase):
         #if no ValueErrors, proceed
         super().__init__(num_players, size, start_positions)
         self._curr_player = 1
-        self._grid = [[None] * size for _ in range(size)]
         self._retired_players = set()
 
+        #the players who are still playing: not retired, and with shapes left
+        self._active = set(range(1, num_players + 1))
+        self._auto_pass = auto_pass
+
+        #the live move lists of every player (see moveindex.py), kept up to
+        #date once live_moves is first called
+        self._moves = None
+
+        #the board itself is kept as bitmasks (see bitboard.py); the grid is
+        #only built when someone asks for it, and kept in sync from then on
+        self._board = Bitboard(num_players, size)
+        self._grid = None
+        start_mask = self._board.mask(start_positions)
+        assert start_mask is not None
+        self._start_mask = start_mask
+
         #a set of locations that are empty in the grid, that keeps track of the
-        #empty locations (aybalas request)
-        self.empty_locations: set[Point] = set()
-        for x in range(size):
-            for y in range(size):
-                self.empty_locations.add((x,y))
+        #empty locations (aybalas request); built when first asked for, like
+        #the grid
+        self._empty = None
 
-        #load in _shapes using the from_string method in piece.py
-        self._shapes = {}
-        for shape_kind, str_rep in definitions.items():
-            self._shapes[shape_kind] = Shape.from_string(shape_kind, str_rep)
+        #the game's own copy of the shapes, made when it is first asked
+        #for (the game itself only needs the shared SHAPES)
+        self._shapes = None
 
         # a dictionary to keep track of the players and their pieces left
         # a dictionary to keep track of each player's last piece played
+        # a running count of each player's squares left to play
         self._players = {}
         self._last_move: dict[int, Optional[ShapeKind]] = {}
+        self._remaining_squares = {}
+        total = sum(SHAPE_SIZES.values())
         for i in range(num_players):
-            self._players[i + 1] = self._shapes.copy()
+            self._players[i + 1] = SHAPES.copy()
             self._last_move[i + 1] = None
+            self._remaining_squares[i + 1] = total
+
+        #the players grouped by score, best first, once the game is over
+        #(computed on demand, and forgotten when a move is undone)
+        self._ranking = None
+
+        #the frontier of each player, as a bitboard mask: the free squares
+        #where their next piece may touch a corner. Before a player's first
+        #move the only corners they can use are the start positions. (The
+        #squares where their piece may not go, because they share an edge
+        #with one of their pieces, are board.edges of their own squares.)
+        self._corners = {}
+        for i in range(num_players):
+            self._corners[i + 1] = start_mask
 
+        #what each placement or retirement changed, most recent last, so
+        #that pop can undo them
+        self._history = []
+
+        #the objects told about every change to the game (see events.py)
+        self._listeners = []
+
+        #the Zobrist hash of the position (see zobrist.py): every player
+        #still has every shape, and it is player 1's turn
+        self._keys = keys_for(size)
+        self._hash = self._keys.turn[1]
+        for i in range(num_players):
+            for key in self._keys.shapes[i + 1].values():
+                self._hash ^= key
 
     @property
     def shapes(self) -> dict[ShapeKind, Shape]:
@@ -104,7 +171,12 @@ class Blokus(BlokusBase):
         origin at the middle (third) square.
 
         See shape_definitions.py for more details.
+
+        The shapes belong to this game, so flipping or rotating
+        them does not affect other games.
         """
+        if self._shapes is None:
+            self._shapes = shape_copies()
         return self._shapes
 
     @property
@@ -150,6 +222,14 @@ class Blokus(BlokusBase):
         """
         return self._retired_players
 
+    @property
+    def active_players(self) -> set[int]:
+        """
+        Returns the set of players who are still playing: they have
+        neither retired nor played all of their pieces.
+        """
+        return set(self._active)
+
     @property
     def grid(self) -> Grid:
         """
@@ -160,8 +240,41 @@ class Blokus(BlokusBase):
         of that piece. If no played piece occupies this square,
         then the Cell is None.
         """
+        if self._grid is None:
+            self._grid = self._board.to_grid()
         return self._grid
 
+    @property
+    def empty_locations(self) -> set[Point]:
+        """
+        Returns the set of squares that no piece covers. The set is
+        kept up to date as pieces are placed (and taken back).
+        """
+        if self._empty is None:
+            board = self._board
+            self._empty = set(board.points(board.full & ~board.occupied))
+        return self._empty
+
+    @property
+    def board(self) -> Bitboard:
+        """
+        Returns the bitboard of the game (see bitboard.py), which is
+        kept up to date as pieces are placed (and taken back), and
+        must not be changed.
+        """
+        return self._board
+
+    @property
+    def zobrist(self) -> int:
+        """
+        Returns the 64-bit Zobrist hash of the current position.
+        Positions with the same squares covered by the same players,
+        the same player to move, the same remaining shapes, the same
+        retired players and the same "1 piece played last" bonuses
+        have the same hash, whatever order the moves came in.
+        """
+        return self._hash
+
     @property
     def game_over(self) -> bool:
         """
@@ -169,16 +282,7 @@ class Blokus(BlokusBase):
         when every player is either retired or has played all
         their pieces.
         """
-        #if all players are retired, return True
-        if len(self.retired_players) == self.num_players:
-            return True
-
-        #if a player has not played all their pieces, return False
-        for x in range(1, self.num_players + 1):
-            if x not in self.retired_players:
-                if len(self.remaining_shapes(x)) != 0:
-                    return False
-        return True
+        return not self._active
 
     @property
     def winners(self) -> Optional[list[int]]:
@@ -186,18 +290,28 @@ class Blokus(BlokusBase):
         Returns the (one or more) players who have the highest
         score. Returns None if the game is not over.
         """
+        ranking = self.ranking
+        if ranking is None:
+            return None
+        return list(ranking[0])
+
+    @property
+    def ranking(self) -> Optional[list[list[int]]]:
+        """
+        Returns the players grouped by score, from the highest score
+        to the lowest; players with the same score share a group.
+        Returns None if the game is not over.
+        """
         if not self.game_over:
             return None
 
-        win_list: list[int] = []
-        max_score: int = -100000000
-        for x in range(1, self.num_players+1):
-            if self.get_score(x) > max_score:
-                win_list = [x]
-                max_score = self.get_score(x)
-            elif self.get_score(x) == max_score:
-                win_list.append(x)
-        return win_list
+        if self._ranking is None:
+            scores: dict[int, list[int]] = {}
+            for x in range(1, self.num_players + 1):
+                scores.setdefault(self.get_score(x), []).append(x)
+            self._ranking = [scores[score]
+                             for score in sorted(scores, reverse=True)]
+        return [list(group) for group in self._ranking]
 
     #
     # METHODS
@@ -210,7 +324,7 @@ class Blokus(BlokusBase):
         """
         return list(self._players[player].keys())
 
-    def any_wall_collisions(self, piece: Piece) -> bool:
+    def any_wall_collisions(self, piece: Piece | Placement) -> bool:
         """
         Returns a boolean indicating whether or not the
         given piece (not yet played on the board) would
@@ -226,17 +340,13 @@ class Blokus(BlokusBase):
         is None or not a valid position on the board.
         """
         #check ValueErrors
-        piece._check_anchor()
-        if piece.shape.kind not in self.remaining_shapes(self.curr_player):
+        if _kind_of(piece) not in self._players[self.curr_player]:
             raise ValueError
 
-        #if the piece was placed at the given anchor, check for collisions
-        for x, y in piece.squares():
-            if x < 0 or y < 0 or x > self.size - 1 or y > self.size - 1:
-                return True
-        return False
+        #the piece hits a wall if any of its squares has no bit on the board
+        return self._board.mask(piece.squares()) is None
 
-    def any_collisions(self, piece: Piece) -> bool:
+    def any_collisions(self, piece: Piece | Placement) -> bool:
         """
         Returns a boolean indicating whether or not the
         given piece (not yet played on the board) would
@@ -251,23 +361,21 @@ class Blokus(BlokusBase):
         is None or not a valid position on the board.
         """
         #check ValueErrors
-        piece._check_anchor()
+        kind = _kind_of(piece)
         assert not piece.anchor is None
         anchor_row, anchor_col = piece.anchor
 
         if anchor_row < 0 or anchor_col < 0 \
         or anchor_row > self.size - 1 or anchor_col > self.size - 1:
             raise ValueError
-        if piece.shape.kind not in self.remaining_shapes(self.curr_player):
+        if kind not in self._players[self.curr_player]:
             raise ValueError
 
         #check if the necessary grid space is empty
-        for x, y in piece.squares():
-            if self.grid[x][y] is not None:
-                return True
-        return False
+        mask = self._board.mask(piece.squares())
+        return mask is None or mask & self._board.occupied != 0
 
-    def legal_to_place(self, piece: Piece) -> bool:
+    def legal_to_place(self, piece: Piece | Placement) -> bool:
         """
         If the current player has not already played
         this shape, this method returns a boolean
@@ -284,42 +392,31 @@ class Blokus(BlokusBase):
         Raises ValueError if the player has already
         played a piece with this shape.
         """
-        if piece.shape.kind not in self.remaining_shapes(self.curr_player):
+        if _kind_of(piece) not in self._players[self.curr_player]:
             raise ValueError
-        
-        start_check = False
-
-        #if first piece, must be on a start position
-        if len(self.remaining_shapes(self.curr_player)) == len(self.shapes):
-            for pos in self.start_positions:
-                if pos in piece.squares() and self.grid[pos[0]][pos[1]] is None:
-                    return not self.any_wall_collisions(piece)
-            return False
 
-        #corners/edges thing
-        corners = piece.intercardinal_neighbors()
-        edges = piece.cardinal_neighbors()
-        corner_check = False
+        return self._legal_mask(self._board.mask(piece.squares()))
 
-        #iterate through grid
-        for row in range(self.size):
-            for col in range(self.size):
-                current = self.grid[row][col]
-
-                if current is not None and current[0] == self.curr_player:
-
-                    #if piece shares an edge, illegal
-                    if (row, col) in edges:
-                        return False
-
-                    #piece must share at least one corner
-                    if (row, col) in corners:
-                        corner_check = True
+    def _legal_mask(self, mask: Optional[int]) -> bool:
+        """
+        Checks the placement rules for the current player against
+        the mask of a piece (None if the piece hits a wall).
+        """
+        board = self._board
+        if mask is None or mask & board.occupied:
+            return False
 
-        return not self.any_wall_collisions(piece) and not self.any_collisions(piece) and (corner_check or start_check)
+        #if first piece, must be on a (free) start position
+        own = board.players[self.curr_player]
+        if own == 0:
+            return mask & self._start_mask != 0
 
+        #no shared edges with our own pieces, and at least one shared corner
+        if board.edges(mask) & own:
+            return False
+        return board.corners(mask) & own != 0
 
-    def maybe_place(self, piece: Piece) -> bool:
+    def maybe_place(self, piece: Piece | Placement) -> bool:
         """
         If the piece is legal to place, this method
         places the piece on the board, updates the
@@ -334,41 +431,138 @@ class Blokus(BlokusBase):
         who have not retired and have remaining pieces
         should still get their turns.
 
+        The move may be given as a Piece or as a Placement,
+        here as in legal_to_place and the collision checks.
+
         Raises ValueError if the player has already
         played a piece with this shape.
         """
 
         #check if the piece is legal to place
-        if self.legal_to_place(piece):
-
-            #check if the piece we want to play is played before (or available
-            #to play)
-            if piece.shape.kind in self.remaining_shapes(self.curr_player):
-                #remove the piece from remaining pieces
-                del self._players[self.curr_player][piece.shape.kind]
-            else:
-                raise ValueError("This piece is already played")
-
-            for square in piece.squares():
-                x2, y2 = square
-                #change the grid
-                self._grid[x2][y2] = (self.curr_player, piece.shape.kind)
+        kind = _kind_of(piece)
+        if kind not in self._players[self.curr_player]:
+            raise ValueError("This piece is already played")
+        squares = piece.squares()
+        mask = self._board.mask(squares)
+        if self._legal_mask(mask):
+            assert mask is not None
+            player = self.curr_player
+            change = _Change(player, kind, mask, squares,
+                             self._last_move[player], self._hash)
+
+            #remove the piece from remaining pieces (in a new dict, since
+            #snapshots may share the old one)
+            remaining = self._players[player].copy()
+            del remaining[kind]
+            self._players[player] = remaining
+            self._remaining_squares[player] -= len(squares)
+            self._ranking = None
+
+            #change the board, and the grid if it has been built already
+            board = self._board
+            first_move = board.players[player] == 0
+            board.place(player, kind, mask)
+            self._update_frontier(change, first_move)
+            if self._moves is not None:
+                change.moves = self._moves.place(
+                    player, kind, mask, board.edges(mask),
+                    change.corners, self._corners,
+                    board.occupied | board.edges(board.players[player]),
+                    remaining)
+            square_keys = self._keys.squares[player]
+            self._hash ^= self._keys.shapes[player][kind]
+            for x2, y2 in squares:
+                self._hash ^= square_keys[x2 * self.size + y2]
+                if self._grid is not None:
+                    self._grid[x2][y2] = (player, kind)
+
+                #change the occupied coordinates set
+                if self._empty is not None:
+                    self._empty.remove((x2, y2))
+
+            #a player who played every piece is done
+            if not self._players[player]:
+                self._active.discard(player)
+                change.deactivated.append(player)
 
             # Add the piece to the last move dictionary
-            self._last_move[self.curr_player] = piece.shape.kind
+            if self._last_move[player] == ShapeKind.ONE:
+                self._hash ^= self._keys.bonus[player]
+            if kind == ShapeKind.ONE:
+                self._hash ^= self._keys.bonus[player]
+            self._last_move[player] = kind
+
+            self._next_player(change)
+            self._history.append(change)
+            if self._listeners:
+                self._notify(change)
+            return True
 
-            #change the occupied coordinates set
-            self.empty_locations.remove((x2,y2))
+        return False
 
-            #change who's turn it is - account for retired players
-            self._curr_player = (self.curr_player % self.num_players) + 1
-            if len(self.retired_players) != self.num_players:
-                while self.curr_player in self.retired_players:
+    def _next_player(self, change: "_Change") -> None:
+        """
+        Passes the turn to the next player that is still playing.
+        With auto_pass, players on the way who cannot move are
+        retired (and recorded in the change).
+        """
+        self._hash ^= self._keys.turn[self.curr_player]
+        self._curr_player = (self.curr_player % self.num_players) + 1
+        if self._active:
+            while True:
+                while self.curr_player not in self._active:
                     self._curr_player = (self.curr_player % self.num_players)+1
+                if not self._auto_pass or self._can_move(self.curr_player):
+                    break
+
+                #stuck: retire them, and look further
+                self._retired_players.add(self.curr_player)
+                self._hash ^= self._keys.retired[self.curr_player]
+                self._active.discard(self.curr_player)
+                change.retired.append(self.curr_player)
+                change.deactivated.append(self.curr_player)
+                if not self._active:
+                    break
+        elif len(self.retired_players) != self.num_players:
+            while self.curr_player in self.retired_players:
+                self._curr_player = (self.curr_player % self.num_players) + 1
+        self._hash ^= self._keys.turn[self.curr_player]
 
-            return True
+    def _can_move(self, player: int) -> bool:
+        """
+        Returns whether the given player has at least one legal move.
+        A player without open corners cannot move at all; otherwise,
+        the search stops at the first legal move.
+        """
+        if not self._corners[player]:
+            return False
+        if self._moves is not None:
+            return bool(self._moves.live[player])
+        moves = self._iter_moves(player, self._players[player])
+        return next(moves, None) is not None
 
-        return False
+    def _update_frontier(self, change: "_Change", first_move: bool) -> None:
+        """
+        Updates the corners of every player after a player placed a
+        piece (already on the board), looking only at the squares
+        around that piece. The corners from before are kept in the
+        change, so that pop can put them back.
+        """
+        board = self._board
+        player = change.player
+        change.corners = self._corners.copy()
+        corners = 0 if first_move else self._corners[player]
+
+        #squares next to the piece are now off limits for this player, and
+        #free squares diagonal to it open up, unless they are off limits
+        forbidden = board.edges(board.players[player])
+        corners |= board.corners(change.mask) & ~board.occupied
+        self._corners[player] = corners & ~forbidden
+
+        #nobody can use the squares the piece now covers
+        for other, other_corners in self._corners.items():
+            if other_corners & change.mask:
+                self._corners[other] = other_corners & ~change.mask
 
     def retire(self) -> None:
         """
@@ -376,12 +570,250 @@ class Blokus(BlokusBase):
         may choose to retire. This player does not get any more
         turns; they are skipped over during subsequent gameplay.
         """
+        change = _Change(self.curr_player, None, 0, [], None, self._hash)
         self._retired_players.add(self.curr_player)
-        self._curr_player = (self.curr_player % self.num_players) + 1
-        if len(self.retired_players) != self.num_players:
-            while self.curr_player in self.retired_players:
-                self._curr_player = (self.curr_player % self.num_players) + 1
+        self._hash ^= self._keys.retired[self.curr_player]
+        if self.curr_player in self._active:
+            self._active.discard(self.curr_player)
+            change.deactivated.append(self.curr_player)
+        change.retired.append(self.curr_player)
+        self._next_player(change)
+        self._history.append(change)
+        if self._listeners:
+            self._notify(change)
+
+    def add_listener(self, listener: BlokusListener) -> None:
+        """
+        Attaches a listener, which is told about every change to the
+        game from now on (see events.py).
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: BlokusListener) -> None:
+        """
+        Detaches a listener.
 
+        Raises ValueError if the listener is not attached.
+        """
+        self._listeners.remove(listener)
+
+    def _notify(self, change: "_Change") -> None:
+        """
+        Tells the listeners about a placement or retirement that
+        has just been made.
+        """
+        game_over = self.game_over
+        for listener in list(self._listeners):
+            if change.kind is not None:
+                listener.on_place(change.player, change.kind, change.squares)
+            for player in change.retired:
+                listener.on_retire(player)
+            if game_over:
+                listener.on_game_over()
+            else:
+                listener.on_turn(self.curr_player)
+
+    def push(self, piece: Piece | Placement) -> bool:
+        """
+        Same as maybe_place: plays the piece if it is legal and
+        returns whether it was played. Meant to be paired with pop
+        when searching ahead, instead of copying the whole game.
+        """
+        return self.maybe_place(piece)
+
+    def pop(self) -> None:
+        """
+        Undoes the most recent placement or retirement, restoring
+        the board, the current player, the retired players, the
+        remaining shapes, the last moves and the frontiers exactly
+        as they were before it.
+
+        Raises ValueError if there is nothing to undo.
+        """
+        if not self._history:
+            raise ValueError("No move to undo")
+        change = self._history.pop()
+        player = change.player
+        self._curr_player = player
+        self._hash = change.zobrist
+        self._retired_players.difference_update(change.retired)
+        self._active.update(change.deactivated)
+        self._ranking = None
+        if change.kind is not None:
+            self._unplace(change)
+        if self._listeners:
+            for listener in list(self._listeners):
+                listener.on_undo(player, change.kind, change.squares)
+
+    def _unplace(self, change: "_Change") -> None:
+        """
+        Takes back the piece placed by a change (the last one on the
+        board), for pop.
+        """
+        player = change.player
+
+        #move lists started after this move cannot be rolled back past it
+        if self._moves is not None:
+            if change.moves is None:
+                self._moves = None
+            else:
+                self._moves.undo(change.moves)
+
+        #put the shape back, keeping the order of shape_definitions
+        remaining = self._players[player]
+        self._players[player] = {kind: shape
+                                 for kind, shape in SHAPES.items()
+                                 if kind in remaining or kind == change.kind}
+        self._remaining_squares[player] += len(change.squares)
+        self._last_move[player] = change.last_move
+
+        self._board.unplace()
+        for x2, y2 in change.squares:
+            if self._grid is not None:
+                self._grid[x2][y2] = None
+            if self._empty is not None:
+                self._empty.add((x2, y2))
+        self._corners = change.corners.copy()
+
+    def snapshot(self) -> "Snapshot":
+        """
+        Returns a snapshot of the game, which restore can bring back
+        later (on this game or on a clone of it), however the game has
+        changed in between.
+
+        Taking a snapshot copies only a few small dicts: the board
+        masks are ints, and the remaining shapes and the history are
+        never changed in place, so they are shared with the game.
+        """
+        return Snapshot(self)
+
+    def restore(self, snapshot: "Snapshot") -> None:
+        """
+        Puts the game back in the state it had when the snapshot was
+        taken. The grid, the empty locations and the live move lists
+        are rebuilt when next asked for.
+
+        Raises ValueError if the snapshot was taken from a game with
+        a different board, start positions or number of players.
+        """
+        if snapshot.size != self.size \
+           or snapshot.num_players != self.num_players \
+           or snapshot.start_mask != self._start_mask:
+            raise ValueError("Snapshot of a different game")
+
+        self._curr_player = snapshot.curr_player
+        self._retired_players = set(snapshot.retired)
+        self._active = set(snapshot.active)
+        board = self._board
+        board.occupied = snapshot.occupied
+        board.players = snapshot.player_masks.copy()
+        board.pieces = list(snapshot.pieces)
+        self._players = snapshot.players.copy()
+        self._last_move = snapshot.last_move.copy()
+        self._remaining_squares = snapshot.remaining_squares.copy()
+        self._ranking = snapshot.ranking
+        self._corners = snapshot.corners.copy()
+        self._history = list(snapshot.history)
+        self._hash = snapshot.zobrist
+        self._grid = None
+        self._empty = None
+        self._moves = None
+        if self._listeners:
+            for listener in list(self._listeners):
+                listener.on_restore()
+
+    def clone(self) -> "Blokus":
+        """
+        Returns a copy of the game, sharing everything that neither
+        game changes in place (see snapshot), so that it costs about
+        as much as a snapshot. Moves can be undone with pop on either
+        game independently.
+
+        The clone has its own copy of the shapes (see shapes), and
+        no listeners.
+        """
+        other = copy.copy(self)
+        other._board = self._board.copy()
+        other._shapes = None
+        other._listeners = []
+        other.restore(self.snapshot())
+        return other
+
+    @classmethod
+    def load(cls,
+             num_players: int,
+             size: int,
+             start_positions: set[Point],
+             curr_player: int,
+             retired: Iterable[int],
+             remaining: dict[int, Iterable[ShapeKind]],
+             last_move: dict[int, Optional[ShapeKind]],
+             player_masks: dict[int, int],
+             pieces: Iterable[tuple[int, ShapeKind, int]],
+             corners: dict[int, int],
+             auto_pass: bool = False) -> "Blokus":
+        """
+        Returns a game in the given position, with no history (so its
+        moves cannot be undone past that position). Everything the
+        game keeps besides (the occupied squares, the squares left,
+        who is still playing, the Zobrist hash) is worked out from it.
+
+        Attributes:
+            num_players, size, start_positions, auto_pass: As in
+                the constructor
+            curr_player: The player to move
+            retired: The players who retired
+            remaining: The shapes each player has left
+            last_move: The last shape each player played, or None
+            player_masks: The squares of each player, as bitboard
+                masks (see bitboard.py)
+            pieces: The pieces on the board, in the order they were
+                played, as (player, kind, mask)
+            corners: The open corners of each player, as bitboard
+                masks (see open_corners_mask)
+
+        Raises ValueError as the constructor does, or if curr_player
+            is not a player.
+        """
+        blokus = cls(num_players, size, start_positions, auto_pass)
+        players = range(1, num_players + 1)
+        if curr_player not in players:
+            raise ValueError("No such player")
+
+        board = blokus._board
+        board.players = {p: player_masks[p] for p in players}
+        board.occupied = 0
+        for mask in board.players.values():
+            board.occupied |= mask
+        board.pieces = list(pieces)
+        blokus._players = {p: {kind: SHAPES[kind] for kind in remaining[p]}
+                           for p in players}
+        blokus._last_move = {p: last_move[p] for p in players}
+        blokus._remaining_squares = {
+            p: sum(SHAPE_SIZES[kind] for kind in blokus._players[p])
+            for p in players}
+        blokus._corners = {p: corners[p] for p in players}
+        blokus._retired_players = set(retired)
+        blokus._active = {p for p in players
+                          if p not in blokus._retired_players
+                          and blokus._players[p]}
+        blokus._curr_player = curr_player
+
+        #the hash from scratch: the turn, then what each player has left,
+        #has covered, earned and given up (as maybe_place and retire add
+        #them up move by move)
+        keys = blokus._keys
+        blokus._hash = keys.turn[curr_player]
+        for p in players:
+            for kind in blokus._players[p]:
+                blokus._hash ^= keys.shapes[p][kind]
+            for x, y in board.points(board.players[p]):
+                blokus._hash ^= keys.squares[p][x * size + y]
+            if blokus._last_move[p] == ShapeKind.ONE:
+                blokus._hash ^= keys.bonus[p]
+            if p in blokus._retired_players:
+                blokus._hash ^= keys.retired[p]
+        return blokus
 
     def get_score(self, player: int) -> int:
         """
@@ -389,17 +821,106 @@ class Blokus(BlokusBase):
         can be computed at any time during gameplay or at the
         completion of a game.
         """
-        score: int = 0
-        for shape in self._players[player].values():
-            score += len(shape.squares)
-
-        # Account for bonuses (negative since we return the opposite)
-        if len(self.remaining_shapes(player)) == 0:
+        # Account for bonuses
+        if not self._players[player]:
             if self._last_move[player] == ShapeKind.ONE:
-                score = -20
-            else:
-                score = -15
-        return -1 * score
+                return 20
+            return 15
+        return -self._remaining_squares[player]
+
+    def remaining_squares(self, player: int) -> int:
+        """
+        Returns the number of squares of the shapes the given player
+        has left.
+        """
+        return self._remaining_squares[player]
+
+    def open_corners_mask(self, player: int) -> int:
+        """
+        Returns the open corners of the given player (see
+        open_corners), as a bitboard mask.
+        """
+        return self._corners[player]
+
+    def open_corners(self, player: int) -> set[Point]:
+        """
+        Returns the free squares that the given player's next piece
+        could cover while touching one of their pieces at a corner
+        (or, before their first move, the free start positions).
+        Every legal move for the player covers at least one of them.
+        """
+        return set(self._board.points(self._corners[player]))
+
+    def forbidden_squares(self, player: int) -> set[Point]:
+        """
+        Returns the squares that share an edge with one of the given
+        player's pieces, which that player can never cover.
+        """
+        board = self._board
+        return set(board.points(board.edges(board.players[player])))
+
+    def planes(self, player: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns three (size x size) arrays of booleans for the given
+        player: the occupied squares, the squares forbidden to them
+        (see forbidden_squares) and their open corners (see
+        open_corners).
+        """
+        board = self._board
+        return (board.to_array(board.occupied),
+                board.to_array(board.edges(board.players[player])),
+                board.to_array(self._corners[player]))
+
+    def legal_mask(self, kind: ShapeKind,
+                   player: Optional[int] = None) -> np.ndarray:
+        """
+        Returns an array of booleans, indexed by orientation id (see
+        piece.ORIENTATIONS), anchor row and anchor column, telling
+        whether the piece of that kind, in that orientation and at that
+        anchor, would be legal for the given player (by default, the
+        current one) to place.
+
+        Every placement is evaluated at once: for each square of an
+        orientation, the occupied/forbidden and open corner planes are
+        shifted by that square's offset, so a placement is legal when
+        none of its squares lands on a blocked (or off-board) square
+        and at least one lands on an open corner.
+
+        Note that orientations which are translations of each other
+        (see Orientation.canonical) list the same placements at
+        different anchors.
+
+        Raises ValueError if the player has already
+        played a piece with this shape.
+        """
+        if player is None:
+            player = self.curr_player
+        if kind not in self._players[player]:
+            raise ValueError
+
+        size = self.size
+        occupied, forbidden, corners = self.planes(player)
+
+        #pad the planes so that shifted squares off the board are blocked
+        #and never count as corners
+        pad = 4
+        blocked = np.ones((size + 2 * pad, size + 2 * pad), dtype=bool)
+        blocked[pad:pad + size, pad:pad + size] = occupied | forbidden
+        touching = np.zeros_like(blocked)
+        touching[pad:pad + size, pad:pad + size] = corners
+
+        orientations = ORIENTATIONS[kind]
+        legal = np.zeros((len(orientations), size, size), dtype=bool)
+        for o in orientations:
+            hit = np.zeros((size, size), dtype=bool)
+            touch = np.zeros((size, size), dtype=bool)
+            for dr, dc in o.squares:
+                rows = slice(pad + dr, pad + dr + size)
+                cols = slice(pad + dc, pad + dc + size)
+                hit |= blocked[rows, cols]
+                touch |= touching[rows, cols]
+            legal[o.id] = touch & ~hit
+        return legal
 
     def available_moves(self) -> set[Piece]:
         """
@@ -413,46 +934,357 @@ class Blokus(BlokusBase):
         (because they may differ in location and orientation).
         """
 
-        #the piece of code that actually calculates all available moves is 
-        #commented out below. It takes appoximately 15 seconds to run 1 game
-        #with it, that is why I'm leaving the code that doesn't calculate for
-        #rotations. But you can comment out and try the real available_moves!
-        
-        """available_pieces: set[Piece]  = set()
-        shapes = self._players[self._curr_player].values()
-        for shape in shapes:
-            for loc in self.empty_locations:
-                p = Piece(shape)
-                p.set_anchor(loc)
-                p.flip_horizontally()
-                if self.legal_to_place(p):
-                    available_pieces.add(p)
-    
-                for n in range(3):
-                    p = Piece(shape)
-                    p.set_anchor(loc)
-                    for _ in range(n):
-                       p.rotate_right()
-                    if self.legal_to_place(p):
-                        available_pieces.add(p)
-
-                for n in range(3):
-                    p = Piece(shape)
-                    p.set_anchor(loc)
-                    p.flip_horizontally()
-                    for _ in range(n):
-                       p.rotate_right()
-                    if self.legal_to_place(p):
-                        available_pieces.add(p)
-        return available_pieces"""
-        
-
-        available_pieces: set[Piece]  = set()
-        shapes = self._players[self._curr_player].values()
-        for shape in shapes:
-            for loc in self.empty_locations:
-                p = Piece(shape)
-                p.set_anchor(loc)
-                if self.legal_to_place(p):
-                    available_pieces.add(p)
-        return available_pieces
\ No newline at end of file
+        available_pieces: set[Piece] = set()
+        remaining = self._players[self.curr_player]
+        for kind, orientation, anchor in self._iter_moves(self.curr_player,
+                                                          remaining):
+            p = Piece(SHAPES[kind], orientation=orientation)
+            p.set_anchor(anchor)
+            available_pieces.add(p)
+        return available_pieces
+
+    def available_placements(self) -> set[Placement]:
+        """
+        Returns the same moves as available_moves, as Placements.
+        """
+        if self._moves is not None:
+            return self.live_moves()
+        remaining = self._players[self.curr_player]
+        return {Placement(kind, orientation, anchor)
+                for kind, orientation, anchor
+                in self._iter_moves(self.curr_player, remaining)}
+
+    def live_moves(self, player: Optional[int] = None) -> set[Placement]:
+        """
+        Returns the placements that are legal for the given player
+        (by default, the current player) on the board as it is.
+
+        The first call finds every player's moves; from then on, each
+        placement (and pop) updates the lists by looking only at the
+        squares around the piece, instead of searching again.
+        """
+        if player is None:
+            player = self.curr_player
+        index = self._move_index()
+        table = index.table
+        return {table.placement(i) for i in index.live[player]}
+
+    def live_move_ids(self, player: Optional[int] = None) -> set[int]:
+        """
+        Returns the same moves as live_moves, as ids in the
+        placement table of the board (see placements_for). The set
+        is the one kept up to date, not a copy, and must not be
+        changed.
+        """
+        if player is None:
+            player = self.curr_player
+        return self._move_index().live[player]
+
+    @property
+    def live_moves_on(self) -> bool:
+        """
+        Returns whether the live move lists are kept up to date (see
+        live_moves).
+        """
+        return self._moves is not None
+
+    def stop_live_moves(self) -> None:
+        """
+        Stops keeping the live move lists up to date, so that each
+        placement and pop costs what it did before live_moves was
+        first called. The next call to live_moves (or mobility)
+        starts them again.
+        """
+        self._moves = None
+
+    def mobility(self, player: int) -> int:
+        """
+        Returns the number of legal placements of a player (0 once
+        they are retired), for any player and not just the current
+        one.
+
+        Like live_moves, the first call finds every player's moves,
+        and the counts are kept up to date by each placement and pop
+        from then on, so later calls cost next to nothing.
+        """
+        if player in self._retired_players:
+            return 0
+        return len(self._move_index().live[player])
+
+    def mobility_by_shape(self, player: int) -> dict[ShapeKind, int]:
+        """
+        Returns the number of legal placements of a player with each
+        of the shapes they have left (all 0 once they are retired).
+        See mobility.
+        """
+        counts = self._move_index().counts[player]
+        retired = player in self._retired_players
+        return {kind: 0 if retired else counts[k]
+                for k, kind in enumerate(KINDS)
+                if kind in self._players[player]}
+
+    def _move_index(self) -> MoveIndex:
+        """
+        Returns the live move lists, building them the first time.
+        """
+        if self._moves is None:
+            board = self._board
+            self._moves = MoveIndex(placements_for(self.size), self._players)
+            for player, remaining in self._players.items():
+                blocked = board.occupied | board.edges(board.players[player])
+                self._moves.fill(player, blocked, self._corners[player],
+                                 remaining)
+        return self._moves
+
+    def iter_available_moves(
+        self,
+        shapes: Optional[Iterable[ShapeKind]] = None,
+        key: Optional[Callable[[ShapeKind], Any]] = None,
+    ) -> Iterator[Piece]:
+        """
+        Yields the same moves as available_moves, one at a time, so
+        that a caller who only needs the first few (or to know whether
+        there are any) can stop early without the rest being found.
+
+            shapes: If given, only moves with these shapes are
+                    yielded (shapes the player has already played
+                    are ignored).
+            key:    If given, shapes are tried in the order given
+                    by sorting them with this key, as in sorted();
+                    for example, largest_first. By default, they
+                    are tried in the order of shape_definitions.
+
+        All the moves for one shape are yielded before moving on to
+        the next shape. The game should not be changed while the
+        generator is in use; a caller that places a piece should
+        stop iterating.
+        """
+        remaining = self._players[self.curr_player]
+        if shapes is None:
+            kinds = list(remaining)
+        else:
+            kinds = [kind for kind in shapes if kind in remaining]
+        if key is not None:
+            kinds.sort(key=key)
+
+        for kind, orientation, anchor in self._iter_moves(self.curr_player,
+                                                          kinds):
+            p = Piece(SHAPES[kind], orientation=orientation)
+            p.set_anchor(anchor)
+            yield p
+
+    def has_any_move(self) -> bool:
+        """
+        Returns whether the current player has at least one legal
+        move, stopping at the first one found.
+        """
+        return self._can_move(self.curr_player)
+
+    def _iter_moves(self, player: int, kinds: Iterable[ShapeKind]
+                    ) -> Iterator[tuple[ShapeKind, int, Point]]:
+        """
+        Finds every distinct legal placement of the given shapes for
+        the given player, as (shape kind, orientation id, anchor)
+        triples, one shape after the other.
+
+        Every legal piece covers one of the player's open corners, so
+        instead of trying every anchor on the board, each square of
+        each orientation is lined up against each open corner in turn.
+        Such a piece only needs to stay on the board and avoid occupied
+        and forbidden squares; touching a corner is guaranteed.
+        """
+        board = self._board
+        blocked = board.occupied | board.edges(board.players[player])
+        return generate_moves(self.size, blocked,
+                              board.points(self._corners[player]), kinds)
+
+
+def _kind_of(piece: Piece | Placement) -> ShapeKind:
+    """
+    Returns the kind of shape of a move, given as a Piece or as a
+    Placement.
+
+    Raises ValueError if a Piece has no anchor.
+    """
+    if isinstance(piece, Placement):
+        return piece.kind
+    piece._check_anchor()
+    return piece.kind
+
+
+def largest_first(kind: ShapeKind) -> int:
+    """
+    Sort key for iter_available_moves that tries the shapes with
+    the most squares first.
+    """
+    return -SHAPE_SIZES[kind]
+
+
+def smallest_first(kind: ShapeKind) -> int:
+    """
+    Sort key for iter_available_moves that tries the shapes with
+    the fewest squares first.
+    """
+    return SHAPE_SIZES[kind]
+
+
+class _Change:
+    """
+    What one call to maybe_place or retire changed, so that
+    Blokus.pop can undo it, along with the hash before the change.
+    For a retirement, kind is None and no piece is recorded.
+
+    retired lists the players retired by the change (including
+    players passed automatically), and deactivated the players who
+    stopped playing because of it (retired, or out of shapes).
+
+    moves is what the placement changed in the live move lists, or
+    None if they were not being kept at the time.
+    """
+
+    player: int
+    kind: Optional[ShapeKind]
+    mask: int
+    squares: list[Point]
+    last_move: Optional[ShapeKind]
+    zobrist: int
+    corners: dict[int, int]
+    retired: list[int]
+    deactivated: list[int]
+    moves: Optional[MoveDelta]
+
+    def __init__(self, player: int, kind: Optional[ShapeKind], mask: int,
+                 squares: list[Point], last_move: Optional[ShapeKind],
+                 zobrist: int) -> None:
+        """
+        Constructor. The other changes are filled in as they happen.
+        """
+        self.player = player
+        self.kind = kind
+        self.mask = mask
+        self.squares = squares
+        self.last_move = last_move
+        self.zobrist = zobrist
+        self.corners = {}
+        self.retired = []
+        self.deactivated = []
+        self.moves = None
+
+
+class Snapshot:
+    """
+    The state of a game at one point in time (see Blokus.snapshot).
+
+    Everything in a snapshot is either immutable, or a copy that
+    only the snapshot holds, or (for the remaining shapes of each
+    player, and the changes in the history) shared with games that
+    never change it in place.
+    """
+
+    size: int
+    num_players: int
+    start_mask: int
+    curr_player: int
+    retired: frozenset[int]
+    active: frozenset[int]
+    occupied: int
+    player_masks: dict[int, int]
+    pieces: tuple[tuple[int, ShapeKind, int], ...]
+    players: dict[int, dict[ShapeKind, Shape]]
+    last_move: dict[int, Optional[ShapeKind]]
+    remaining_squares: dict[int, int]
+    ranking: Optional[list[list[int]]]
+    corners: dict[int, int]
+    history: tuple[_Change, ...]
+    zobrist: int
+
+    def __init__(self, blokus: Blokus) -> None:
+        """
+        Constructor. Takes a snapshot of the given game.
+        """
+        board = blokus._board
+        self.size = blokus.size
+        self.num_players = blokus.num_players
+        self.start_mask = blokus._start_mask
+        self.curr_player = blokus._curr_player
+        self.retired = frozenset(blokus._retired_players)
+        self.active = frozenset(blokus._active)
+        self.occupied = board.occupied
+        self.player_masks = board.players.copy()
+        self.pieces = tuple(board.pieces)
+        self.players = blokus._players.copy()
+        self.last_move = blokus._last_move.copy()
+        self.remaining_squares = blokus._remaining_squares.copy()
+        self.ranking = blokus._ranking
+        self.corners = blokus._corners.copy()
+        self.history = tuple(blokus._history)
+        self.zobrist = blokus._hash
+
+
+# A template places one orientation of a shape on a board of a given size:
+# the orientation id (see piece.ORIENTATIONS), its squares shifted so that
+# the top-left of its bounding box is at (0, 0), the bitboard mask of those
+# squares, the height and width of the bounding box, and the offset from
+# the origin to the top-left of the bounding box.
+Template = tuple[int, list[Point], int, int, int, int, int]
+
+_TEMPLATES: dict[int, dict[ShapeKind, list[Template]]] = {}
+
+
+def _templates(size: int) -> dict[ShapeKind, list[Template]]:
+    """
+    Returns the templates of the canonical orientations of every shape
+    for a board of the given size, building them the first time.
+    """
+    if size not in _TEMPLATES:
+        stride = size + 1
+        templates: dict[ShapeKind, list[Template]] = {}
+        for kind, orientations in ORIENTATIONS.items():
+            templates[kind] = []
+            for o in orientations:
+                if not o.canonical:
+                    continue
+                min_r = min(r for r, _ in o.squares)
+                min_c = min(c for _, c in o.squares)
+                cells = [(r - min_r, c - min_c) for r, c in o.squares]
+                base = 0
+                for r, c in cells:
+                    base |= 1 << (r * stride + c)
+                height = max(r for r, _ in cells) + 1
+                width = max(c for _, c in cells) + 1
+                templates[kind].append(
+                    (o.id, cells, base, height, width, min_r, min_c))
+        _TEMPLATES[size] = templates
+    return _TEMPLATES[size]
+
+
+def generate_moves(size: int, blocked: int, corners: list[Point],
+                   kinds: Iterable[ShapeKind]
+                   ) -> Iterator[tuple[ShapeKind, int, Point]]:
+    """
+    Finds every distinct placement of the given shapes on a board of
+    the given size that covers one of the given corners and none of
+    the blocked squares (a bitboard mask), as (shape kind, orientation
+    id, anchor) triples, one shape after the other (see
+    Blokus._iter_moves).
+    """
+    stride = size + 1
+    templates = _templates(size)
+    for kind in kinds:
+        #a placement is identified by the squares it covers
+        seen: set[int] = set()
+        for template in templates[kind]:
+            orientation, cells, base, height, width, min_r, min_c = template
+            max_r = size - height
+            max_c = size - width
+            for cr, cc in corners:
+                for nr, nc in cells:
+                    top = cr - nr
+                    left = cc - nc
+                    if top < 0 or left < 0 or top > max_r or left > max_c:
+                        continue
+                    mask = base << (top * stride + left)
+                    if mask & blocked or mask in seen:
+                        continue
+                    seen.add(mask)
+                    yield kind, orientation, (top - min_r, left - min_c)
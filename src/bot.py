@@ -1,7 +1,12 @@
 import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import click
 from piece import Point, Piece
-from blokus import Blokus
+from blokus import Blokus, largest_first, smallest_first
+from solver import EndgameSolver
+
+#the endgame solver of the E-bot, made when first needed
+SOLVER: EndgameSolver | None = None
 
 def game(player1: str, player2: str) -> list[int] | None:
     """
@@ -14,14 +19,18 @@ def game(player1: str, player2: str) -> list[int] | None:
     Returns [list[int] | None]: returns a list showing who won, or None if
         the game is not over.
     """
-    blokus = Blokus(2, 10, {(0,0), (9,9)})
+    #stuck players are passed by the game itself
+    blokus = Blokus(2, 10, {(0,0), (9,9)}, auto_pass=True)
+    #forget what the E-bot found in earlier games, so that each game only
+    #depends on its seed
+    if SOLVER is not None:
+        SOLVER.table.clear()
 
     while not blokus.game_over:
-        #player 1 (indexed as 0)
-        choose_bot(player1, blokus)
-
-        #player 2 (indexed as 1)
-        choose_bot(player2, blokus)
+        if blokus.curr_player == 1:
+            choose_bot(player1, blokus)
+        else:
+            choose_bot(player2, blokus)
 
     return blokus.winners
 
@@ -40,7 +49,7 @@ def choose_bot(bot: str, blokus: "Blokus") -> None:
         N-bot plays.
     
     Inputs:
-        bot [str]: string representing the bot's strategy, S, N or U
+        bot [str]: string representing the bot's strategy, S, N, U or E
         game ["Blokus"]: the blokus game that is currently being run
 
     Returns [None]
@@ -51,6 +60,8 @@ def choose_bot(bot: str, blokus: "Blokus") -> None:
         ni_bot(blokus)
     if bot == "U":
         u_bot(blokus)
+    if bot == "E":
+        e_bot(blokus)
     if bot == "":
         ni_bot(blokus)
 
@@ -68,8 +79,12 @@ def ni_bot(blokus: "Blokus") -> None:
     """
     avail_moves: set[Piece] = blokus.available_moves()
     if len(avail_moves) != 0:
-        for _ in range(len(avail_moves)):
-            piece = random.choice(list(avail_moves))
+        #sets of pieces have no fixed order, so choose from a sorted list
+        #for the same seed to give the same game
+        ordered = sorted(avail_moves, key=lambda p: (p.kind.value,
+                                                      p.squares()))
+        for _ in range(len(ordered)):
+            piece = random.choice(ordered)
             if blokus.maybe_place(piece):
                 return None
         blokus.retire()
@@ -79,116 +94,162 @@ def ni_bot(blokus: "Blokus") -> None:
 
 def s_bot(blokus: "Blokus") -> None:
     """
-    Satisfactory bot. Chooses pieces using the function choose_larger, 
-    where the bot prefers the play the largest piece it can play.
+    Satisfactory bot. Plays the first move it finds with the largest
+    piece it can play, trying larger shapes first.
 
     Inputs: 
         blokus [Blokus]: the blokus game being played
     
     Returns [None]: Just plays or retires
     """
-    avail_moves: set[Piece] = blokus.available_moves()
-    length = len(avail_moves)
-    if length != 0:
-        for _ in range(length):
-            piece = choose_larger(avail_moves)
-            if blokus.maybe_place(piece):
-                return None
-            avail_moves.remove(piece)
-        blokus.retire()
-        return None
+    for piece in blokus.iter_available_moves(key=largest_first):
+        if blokus.maybe_place(piece):
+            return None
     blokus.retire()
     return None
 
 def u_bot(blokus: "Blokus") -> None:
     """
-    Satisfactory bot. Chooses pieces using the function choose_larger, 
-    where the bot prefers the play the largest piece it can play.
+    Unsatisfactory bot. Plays the first move it finds with the smallest
+    piece it can play, trying smaller shapes first.
 
     Inputs: 
         blokus [Blokus]: the blokus game being played
     
     Returns [None]: Just plays or retires
     """
-    avail_moves: set[Piece] = blokus.available_moves()
-    length = len(avail_moves)
-    if length != 0:
-        for _ in range(length):
-            piece = choose_smaller(avail_moves)
-            if blokus.maybe_place(piece):
-                return None
-            avail_moves.remove(piece)
-        blokus.retire()
-        return None
+    for piece in blokus.iter_available_moves(key=smallest_first):
+        if blokus.maybe_place(piece):
+            return None
     blokus.retire()
     return None
 
-def choose_larger(pcs: set[Piece]) -> Piece:
+def e_bot(blokus: "Blokus") -> None:
     """
-    A function to choose the larger pieces out of a given set of pieces
+    Endgame bot. Plays like the S-bot until the game is far enough in
+    its endgame (see EndgameSolver.should_solve), then plays the best
+    line the endgame solver finds.
 
     Inputs:
-        pcs [set[Piece]]: the set of pieces to choose from
+        blokus [Blokus]: the blokus game being played
 
-    Returns [Piece]: the comparatively large piece chosen. 
+    Returns [None]: Just plays or retires
     """
-    max_squares: int = 0
-    max_piece = pcs.pop()
-    pcs.add(max_piece)
-    for piece in pcs:
-        cur_len = len(piece.squares())
-        if cur_len == 5:
-            return piece
-        if cur_len > max_squares:
-            max_squares = cur_len
-            max_piece = piece
-    return max_piece
+    global SOLVER
+    if SOLVER is None:
+        SOLVER = EndgameSolver(max_nodes=50_000)
+    if not SOLVER.should_solve(blokus):
+        s_bot(blokus)
+        return None
+    move = SOLVER.solve(blokus).move
+    if move is None or not blokus.maybe_place(move):
+        blokus.retire()
+    return None
 
-def choose_smaller(pcs: set[Piece]) -> Piece:
+def play_chunk(player1: str, player2: str, seed: int, start: int,
+               count: int) -> tuple[int, int, int]:
     """
-    A function to choose the smaller pieces out of a given set of pieces
+    Plays games start to start + count - 1 of a tournament. Each game
+    seeds the random bots from the tournament seed and its own number,
+    so its result does not depend on which process plays it, or on
+    what that process played before.
 
     Inputs:
-        pcs [set[Piece]]: the set of pieces to choose from
-
-    Returns [Piece]: the comparatively small piece chosen. 
-    """
-    min_squares: int = 5
-    min_piece = pcs.pop()
-    pcs.add(min_piece)
-    for piece in pcs:
-        cur_len = len(piece.squares())
-        if cur_len == 1:
-            return piece
-        if cur_len < min_squares:
-            min_squares = cur_len
-            min_piece = piece
-    return min_piece
-
-@click.command()
-@click.option('-n', '--num-games', type = click.INT, default = 20)
-@click.option('-1', '--player1', type = click.STRING, default = "N")
-@click.option('-2', '--player2', type = click.STRING, default = "N")
+        player1 [str]: The strategy of the first player
+        player2 [str]: The strategy of the second player
+        seed [int]: The seed of the tournament
+        start [int]: The number of the first game
+        count [int]: The number of games
 
-def main(player1: str, player2: str, num_games: int) -> str:
-    """
-    The "main" loop that runs
+    Returns [tuple[int, int, int]]: the wins of the first player, the wins
+        of the second player, and the ties
     """
     win0 = 0
     win1 = 0
     tie = 0
-    for _ in range(num_games):
+    for number in range(start, start + count):
+        random.seed(f"{seed}-{number}")
         winners = game(player1, player2)
+        assert winners is not None
         if len(winners) > 1:
             tie += 1
         elif 1 in winners:
             win0 += 1
         else:
             win1 += 1
+    return win0, win1, tie
+
+
+def tournament(player1: str, player2: str, num_games: int, workers: int = 1,
+               chunk_size: int | None = None,
+               seed: int = 0) -> tuple[int, int, int]:
+    """
+    Plays num_games games between two bots, and counts the results.
+
+    With more than one worker, the games are split into chunks that a
+    pool of worker processes plays, and the counts are added up as the
+    chunks finish. The results only depend on the seed, not on the
+    number of workers or the size of the chunks.
+
+    Inputs:
+        player1 [str]: The strategy of the first player
+        player2 [str]: The strategy of the second player
+        num_games [int]: The number of games
+        workers [int]: The number of worker processes (1 to play every
+            game in this process)
+        chunk_size [int | None]: The number of games per chunk; by
+            default, enough chunks for each worker to get about eight
+        seed [int]: The seed of the tournament
+
+    Returns [tuple[int, int, int]]: the wins of the first player, the wins
+        of the second player, and the ties
+    """
+    if chunk_size is None:
+        chunk_size = max(1, num_games // (max(workers, 1) * 8))
+    chunks = [(start, min(chunk_size, num_games - start))
+              for start in range(0, num_games, chunk_size)]
+
+    totals = [0, 0, 0]
+    if workers <= 1:
+        for start, count in chunks:
+            for i, n in enumerate(play_chunk(player1, player2, seed,
+                                             start, count)):
+                totals[i] += n
+        return totals[0], totals[1], totals[2]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_chunk, player1, player2, seed, start,
+                               count)
+                   for start, count in chunks]
+        for future in as_completed(futures):
+            for i, n in enumerate(future.result()):
+                totals[i] += n
+    return totals[0], totals[1], totals[2]
+
+
+@click.command()
+@click.option('-n', '--num-games', type = click.INT, default = 20)
+@click.option('-1', '--player1', type = click.STRING, default = "N")
+@click.option('-2', '--player2', type = click.STRING, default = "N")
+@click.option('-w', '--workers', type = click.INT, default = 1)
+@click.option('--chunk-size', type = click.INT, default = None)
+@click.option('--seed', type = click.INT, default = None)
+
+def main(player1: str, player2: str, num_games: int, workers: int,
+         chunk_size: int | None, seed: int | None) -> None:
+    """
+    The "main" loop that runs
+    """
+    #without a seed, every run plays different games
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    win0, win1, tie = tournament(player1, player2, num_games, workers,
+                                 chunk_size, seed)
 
     print( \
     f"Bot 0 ({player1}) Wins |  {(win0 / num_games) * 100} %\
     \nBot 1 ({player2}) Wins |  {(win1 / num_games) * 100} %\
     \nTies           |  {(tie / num_games) * 100} % \n")
 
-print(main())
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Events reported by a Blokus game to its listeners.
+
+A listener is any object with the methods of BlokusListener (which
+does nothing, so listeners can subclass it and override only what they
+need). It is attached with Blokus.add_listener, and is then told about
+every change to the game as it happens, so that a renderer, a logger or
+a cache can update only what changed instead of reading the whole grid
+again.
+
+After a placement or a retirement, the listeners hear, in order: the
+piece placed or the player who retired, the players retired because
+they could not move (with auto_pass), and then either the player whose
+turn it is or the end of the game.
+
+The games do not copy anything for their listeners: the cells given to
+on_place and on_undo are the game's own, and must not be changed.
+"""
+from typing import Optional
+
+from shape_definitions import ShapeKind
+from piece import Point
+
+
+class BlokusListener:
+    """
+    A listener that ignores every event.
+    """
+
+    def on_place(self, player: int, kind: ShapeKind,
+                 cells: list[Point]) -> None:
+        """
+        A player placed a piece of the given kind on the given cells.
+        """
+
+    def on_retire(self, player: int) -> None:
+        """
+        A player retired, or was retired because they could not move.
+        """
+
+    def on_turn(self, player: int) -> None:
+        """
+        It is now the given player's turn.
+        """
+
+    def on_game_over(self) -> None:
+        """
+        The game is over.
+        """
+
+    def on_undo(self, player: int, kind: Optional[ShapeKind],
+                cells: list[Point]) -> None:
+        """
+        The most recent placement (of the given kind, on the given
+        cells) or retirement (with kind None, and no cells) of a
+        player was undone, and it is their turn again.
+        """
+
+    def on_restore(self) -> None:
+        """
+        The game was put back in an earlier state (see
+        Blokus.restore); anything kept about it must be read again.
+        """
@@ -5,8 +5,8 @@ We provide a BlokusStub implementation, and
 you must provide a BlokusFake implementation.
 """
 from typing import Optional
-from shape_definitions import ShapeKind, definitions
-from piece import Point, Shape, Piece
+from shape_definitions import ShapeKind
+from piece import Point, Shape, Piece, shape_copies
 from base import BlokusBase, Grid
 
 class BlokusStub(BlokusBase):
@@ -308,10 +308,8 @@ class BlokusFake(BlokusBase):
             for y in range(size):
                 self.empty_locations.add((x,y))
 
-        #load in _shapes using the from_string method in piece.py
-        self._shapes = {}
-        for shape, rep in definitions.items():
-            self._shapes[shape] = Shape.from_string(shape, rep)
+        #copy the shapes parsed once in piece.py
+        self._shapes = shape_copies()
 
         #a dictionary to keep track of the players and their pieces left
         #since this implementation only takes 2 players, this dictionary is
@@ -0,0 +1,399 @@
+"""
+Immutable Blokus positions.
+
+A GameState is a frozen value: applying a move returns a new state and
+leaves the old one as it was, so states can be shared between threads,
+sent to other processes, and used as keys in caches. Everything in a
+state is an int or a tuple of ints (bitboard masks, in the layout of
+bitboard.Bitboard, and bit sets of shape kinds), so pickling one costs
+about as much as pickling a short tuple. Its hash is the Zobrist hash
+of the position, the same one Blokus.zobrist gives.
+
+As in a Blokus game created with auto_pass, a player who has no legal
+move when their turn comes is retired automatically, so a state that is
+not terminal always has legal moves.
+"""
+from typing import Iterator
+
+from shape_definitions import ShapeKind
+from piece import Point, Placement, SHAPE_SIZES
+from bitboard import Bitboard
+from zobrist import keys_for
+from placements import KINDS, KIND_INDEX
+from blokus import Blokus, generate_moves
+
+_ONE = KIND_INDEX[ShapeKind.ONE]
+
+# Empty boards, used for their geometry (masks, edges and corners)
+_BOARDS: dict[int, Bitboard] = {}
+
+
+def _board(size: int) -> Bitboard:
+    """
+    Returns an empty board of the given size.
+    """
+    if size not in _BOARDS:
+        _BOARDS[size] = Bitboard(1, size)
+    return _BOARDS[size]
+
+
+def _kinds(remaining: int) -> list[ShapeKind]:
+    """
+    Returns the kinds in a bit set of kinds, in the order of
+    shape_definitions.
+    """
+    return [kind for k, kind in enumerate(KINDS) if remaining >> k & 1]
+
+
+class GameState:
+    """
+    A frozen Blokus position.
+
+    Players are numbered from 1, and the tuples below are indexed by
+    player number minus one:
+
+        remaining: the kinds of shapes each player has left, as a bit
+                   set (bit k for placements.KINDS[k])
+        last:      the index in KINDS of the last shape each player
+                   played, or -1
+        masks:     the squares covered by each player
+        corners:   the open corners of each player (see
+                   Blokus.open_corners)
+
+    retired is a bit set of players (bit p for player p), and pieces
+    lists the (player, kind index, mask) of every piece played, in
+    order, so that the grid can be rebuilt.
+
+    States are built with new or from_blokus, and changed with apply
+    and retire.
+    """
+
+    __slots__ = ("size", "num_players", "start_positions", "start_mask",
+                 "curr_player", "retired", "remaining", "last", "masks",
+                 "corners", "pieces", "zobrist")
+
+    size: int
+    num_players: int
+    start_positions: frozenset[Point]
+    start_mask: int
+    curr_player: int
+    retired: int
+    remaining: tuple[int, ...]
+    last: tuple[int, ...]
+    masks: tuple[int, ...]
+    corners: tuple[int, ...]
+    pieces: tuple[tuple[int, int, int], ...]
+    zobrist: int
+
+    def __init__(self, size: int, num_players: int,
+                 start_positions: frozenset[Point], start_mask: int,
+                 curr_player: int, retired: int, remaining: tuple[int, ...],
+                 last: tuple[int, ...], masks: tuple[int, ...],
+                 corners: tuple[int, ...],
+                 pieces: tuple[tuple[int, int, int], ...],
+                 zobrist: int) -> None:
+        """
+        Constructor. Takes every field as is, without checking them;
+        see new and from_blokus.
+        """
+        values = (size, num_players, start_positions, start_mask,
+                  curr_player, retired, remaining, last, masks, corners,
+                  pieces, zobrist)
+        for name, value in zip(GameState.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    @staticmethod
+    def new(num_players: int, size: int,
+            start_positions: set[Point]) -> "GameState":
+        """
+        Returns the state at the start of a game.
+
+        Raises ValueError in the same cases as the Blokus constructor.
+        """
+        return GameState.from_blokus(Blokus(num_players, size,
+                                            start_positions))
+
+    @staticmethod
+    def from_blokus(blokus: Blokus) -> "GameState":
+        """
+        Returns the state of a Blokus game. If the current player of
+        the game cannot move, they are retired in the state.
+        """
+        players = range(1, blokus.num_players + 1)
+        snapshot = blokus.snapshot()
+        remaining = []
+        last = []
+        for p in players:
+            bits = 0
+            for kind in snapshot.players[p]:
+                bits |= 1 << KIND_INDEX[kind]
+            remaining.append(bits)
+            played = snapshot.last_move[p]
+            last.append(-1 if played is None else KIND_INDEX[played])
+        retired = 0
+        for p in snapshot.retired:
+            retired |= 1 << p
+
+        state = GameState(
+            snapshot.size, snapshot.num_players,
+            frozenset(blokus.start_positions), snapshot.start_mask,
+            snapshot.curr_player, retired, tuple(remaining), tuple(last),
+            tuple(snapshot.player_masks[p] for p in players),
+            tuple(snapshot.corners[p] for p in players),
+            tuple((p, KIND_INDEX[kind], mask)
+                  for p, kind, mask in snapshot.pieces),
+            snapshot.zobrist)
+        curr = state.curr_player
+        if state._is_active(curr) \
+           and next(state._moves(curr, state._occupied()), None) is None:
+            zobrist = state.zobrist ^ keys_for(state.size).turn[curr]
+            return state._settle(curr, zobrist)
+        return state
+
+    def to_blokus(self) -> Blokus:
+        """
+        Returns a Blokus game (with auto_pass) in this state. The game
+        has no history, so its moves cannot be undone past this state.
+        """
+        players = range(1, self.num_players + 1)
+        return Blokus.load(
+            self.num_players, self.size, set(self.start_positions),
+            curr_player=self.curr_player,
+            retired=[p for p in players if self.retired >> p & 1],
+            remaining={p: _kinds(self.remaining[p - 1]) for p in players},
+            last_move={p: None if self.last[p - 1] < 0
+                       else KINDS[self.last[p - 1]] for p in players},
+            player_masks={p: self.masks[p - 1] for p in players},
+            pieces=[(p, KINDS[k], mask) for p, k, mask in self.pieces],
+            corners={p: self.corners[p - 1] for p in players},
+            auto_pass=True)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("GameState is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("GameState is immutable")
+
+    def __reduce__(self) -> tuple[type, tuple]:
+        return (GameState, tuple(getattr(self, name)
+                                 for name in GameState.__slots__))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return (self.zobrist == other.zobrist
+                and self._key() == other._key())
+
+    def __hash__(self) -> int:
+        return self.zobrist
+
+    def __repr__(self) -> str:
+        return (f"GameState(size={self.size}, "
+                f"players={self.num_players}, "
+                f"curr_player={self.curr_player}, "
+                f"pieces={len(self.pieces)}, zobrist={self.zobrist:#018x})")
+
+    def _key(self) -> tuple:
+        """
+        Returns the fields that tell positions apart (not the order
+        in which the pieces were played).
+        """
+        return (self.size, self.num_players, self.start_mask,
+                self.curr_player, self.retired, self.remaining, self.last,
+                self.masks, self.corners)
+
+    #
+    # QUERIES
+    #
+
+    def _occupied(self) -> int:
+        """
+        Returns the mask of every covered square.
+        """
+        occupied = 0
+        for mask in self.masks:
+            occupied |= mask
+        return occupied
+
+    def _is_active(self, player: int) -> bool:
+        """
+        Returns whether a player is still playing (neither retired
+        nor out of shapes).
+        """
+        return not self.retired >> player & 1 \
+            and self.remaining[player - 1] != 0
+
+    def _remaining_squares(self, player: int) -> int:
+        """
+        Returns the number of squares a player has left to play.
+        """
+        return sum(SHAPE_SIZES[kind]
+                   for kind in _kinds(self.remaining[player - 1]))
+
+    def _moves(self, player: int,
+               occupied: int) -> Iterator[tuple[ShapeKind, int, Point]]:
+        """
+        Returns the generator of the legal moves of a player (see
+        blokus.generate_moves).
+        """
+        board = _board(self.size)
+        blocked = occupied | board.edges(self.masks[player - 1])
+        return generate_moves(self.size, blocked,
+                              board.points(self.corners[player - 1]),
+                              _kinds(self.remaining[player - 1]))
+
+    @property
+    def is_terminal(self) -> bool:
+        """
+        Returns whether the game is over: every player is either
+        retired or has played all their pieces.
+        """
+        return not any(self._is_active(p)
+                       for p in range(1, self.num_players + 1))
+
+    @property
+    def scores(self) -> tuple[int, ...]:
+        """
+        Returns the score of every player (see Blokus.get_score),
+        indexed by player number minus one.
+        """
+        scores = []
+        for p in range(1, self.num_players + 1):
+            if self.remaining[p - 1] == 0:
+                scores.append(20 if self.last[p - 1] == _ONE else 15)
+            else:
+                scores.append(-self._remaining_squares(p))
+        return tuple(scores)
+
+    def legal_moves(self) -> list[Placement]:
+        """
+        Returns the legal moves of the current player (none if the
+        game is over).
+        """
+        if self.is_terminal:
+            return []
+        return [Placement(kind, orientation, anchor)
+                for kind, orientation, anchor
+                in self._moves(self.curr_player, self._occupied())]
+
+    #
+    # MOVES
+    #
+
+    def apply(self, move: Placement) -> "GameState":
+        """
+        Returns the state after the current player plays the given
+        move.
+
+        Raises ValueError if the game is over, if the player has
+        already played this shape, or if the move is not legal.
+        """
+        if self.is_terminal:
+            raise ValueError("The game is over")
+        player = self.curr_player
+        k = KIND_INDEX[move.kind]
+        if not self.remaining[player - 1] >> k & 1:
+            raise ValueError("This piece is already played")
+
+        board = _board(self.size)
+        mask = board.mask(move.cells)
+        occupied = self._occupied()
+        own = self.masks[player - 1]
+        if mask is None or mask & (occupied | board.edges(own)) \
+           or not mask & self.corners[player - 1]:
+            raise ValueError(f"Illegal move: {move}")
+
+        keys = keys_for(self.size)
+        zobrist = self.zobrist ^ keys.shapes[player][move.kind]
+        square_keys = keys.squares[player]
+        for r, c in move.cells:
+            zobrist ^= square_keys[r * self.size + c]
+        if self.last[player - 1] == _ONE:
+            zobrist ^= keys.bonus[player]
+        if k == _ONE:
+            zobrist ^= keys.bonus[player]
+
+        #the same frontier update as Blokus._update_frontier
+        first_move = own == 0
+        own |= mask
+        occupied |= mask
+        corners = [c & ~mask for c in self.corners]
+        mine = 0 if first_move else corners[player - 1]
+        mine |= board.corners(mask) & ~occupied
+        corners[player - 1] = mine & ~board.edges(own)
+
+        i = player - 1
+        state = GameState(
+            self.size, self.num_players, self.start_positions,
+            self.start_mask, player, self.retired,
+            self.remaining[:i] + (self.remaining[i] & ~(1 << k),)
+            + self.remaining[i + 1:],
+            self.last[:i] + (k,) + self.last[i + 1:],
+            self.masks[:i] + (own,) + self.masks[i + 1:],
+            tuple(corners), self.pieces + ((player, k, mask),), zobrist)
+        return state._next_player()
+
+    def retire(self) -> "GameState":
+        """
+        Returns the state after the current player retires.
+        """
+        player = self.curr_player
+        retired = self.retired | 1 << player
+        zobrist = self.zobrist
+        if not self.retired >> player & 1:
+            zobrist ^= keys_for(self.size).retired[player]
+        state = GameState(
+            self.size, self.num_players, self.start_positions,
+            self.start_mask, player, retired, self.remaining, self.last,
+            self.masks, self.corners, self.pieces, zobrist)
+        return state._next_player()
+
+    def _next_player(self) -> "GameState":
+        """
+        Passes the turn to the next player that is still playing.
+        """
+        zobrist = self.zobrist ^ keys_for(self.size).turn[self.curr_player]
+        return self._settle(self.curr_player % self.num_players + 1, zobrist)
+
+    def _settle(self, curr: int, zobrist: int) -> "GameState":
+        """
+        Returns this state with the turn passed on from the given
+        player (whose turn key is not in the given hash yet), as
+        Blokus._next_player does with auto_pass: players on the way
+        who cannot move are retired.
+        """
+        keys = keys_for(self.size)
+        n = self.num_players
+        retired = self.retired
+        occupied = self._occupied()
+
+        def active(p: int) -> bool:
+            return not retired >> p & 1 and self.remaining[p - 1] != 0
+
+        if any(active(p) for p in range(1, n + 1)):
+            while True:
+                while not active(curr):
+                    curr = curr % n + 1
+                if next(self._moves(curr, occupied), None) is not None:
+                    break
+
+                #stuck: retire them, and look further
+                retired |= 1 << curr
+                zobrist ^= keys.retired[curr]
+                if not any(active(p) for p in range(1, n + 1)):
+                    break
+        elif retired != _all_players(n):
+            while retired >> curr & 1:
+                curr = curr % n + 1
+        zobrist ^= keys.turn[curr]
+        return GameState(self.size, n, self.start_positions,
+                         self.start_mask, curr, retired, self.remaining,
+                         self.last, self.masks, self.corners, self.pieces,
+                         zobrist)
+
+
+def _all_players(num_players: int) -> int:
+    """
+    Returns the bit set of every player.
+    """
+    return ((1 << (num_players + 1)) - 1) & ~1
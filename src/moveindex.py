@@ -0,0 +1,217 @@
+"""
+Live move lists for every player of a Blokus game.
+
+The legal placements of each player are kept as a set of ids from the
+game's PlacementTable (see placements.py). A placement is legal for a
+player when they still have its shape, it covers none of the squares
+that are occupied or that share an edge with the player's pieces, and
+it covers one of the player's open corners.
+
+When a piece is played, only the placements covering the squares
+around it can change: the ones covering the piece itself are gone for
+everybody, the ones covering squares next to it are gone for the player
+who played it, and the ones covering that player's new corners may have
+become legal. The inverted index of the table lists the placements
+covering each of those squares; they are looked up in the players'
+lists all at once (with NumPy, through one flag per placement), so the
+cost of an update depends on the piece, not the board or the lists.
+
+The number of legal placements of every shape is kept alongside the
+lists, and updated with them, so that how many moves a player has (in
+all, or with each shape) is known without looking at the lists.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+from shape_definitions import ShapeKind
+from placements import KINDS, KIND_INDEX, PlacementTable
+
+# Below this many ids, sets are handled in Python rather than with NumPy
+_FEW = 48
+
+
+class MoveDelta:
+    """
+    What one placement changed in the move lists, so it can be undone:
+    the ids added to the list of the player who moved, and the ids
+    removed from the list of each player.
+    """
+
+    player: int
+    added: set[int]
+    removed: dict[int, set[int]]
+
+    def __init__(self, player: int) -> None:
+        """
+        Constructor
+        """
+        self.player = player
+        self.added = set()
+        self.removed = {}
+
+
+class MoveIndex:
+    """
+    The legal placements of every player, as sets of placement ids
+    (live[player]), and how many of them there are of each kind of
+    shape (counts[player][k] for KINDS[k]).
+
+    The same lists are kept as arrays of flags, one per placement of
+    the table (alive[player]), so that the placements covering some
+    squares can be looked up in them all at once.
+    """
+
+    table: PlacementTable
+    live: dict[int, set[int]]
+    alive: dict[int, np.ndarray]
+    counts: dict[int, list[int]]
+
+    def __init__(self, table: PlacementTable, players: Iterable[int]) -> None:
+        """
+        Constructor. Every move list starts out empty; see fill.
+        """
+        self.table = table
+        self.live = {player: set() for player in players}
+        self.alive = {player: np.zeros(len(table), dtype=bool)
+                      for player in self.live}
+        self.counts = {player: [0] * len(KINDS) for player in self.live}
+
+    def _add(self, player: int, ids: set[int]) -> None:
+        """
+        Adds ids to the move list of a player.
+        """
+        self.live[player] |= ids
+        self._flag(player, ids, 1)
+
+    def _drop(self, player: int, ids: set[int]) -> None:
+        """
+        Takes ids out of the move list of a player.
+        """
+        self.live[player] -= ids
+        self._flag(player, ids, -1)
+
+    def _flag(self, player: int, ids: set[int], step: int) -> None:
+        """
+        Sets the flags of ids for a player (or clears them if step is
+        -1), and adds step to the counts of their kinds.
+        """
+        alive = self.alive[player]
+        counts = self.counts[player]
+        if len(ids) <= _FEW:
+            kinds = self.table.kind_indices
+            for i in ids:
+                alive[i] = step > 0
+                counts[kinds[i]] += step
+            return
+        found = np.fromiter(ids, dtype=np.intp, count=len(ids))
+        alive[found] = step > 0
+        added = np.bincount(np.asarray(self.table.kinds)[found],
+                            minlength=len(KINDS))
+        self.counts[player] = (counts + step * added).tolist()
+
+    def _covering(self, player: int, squares: int,
+                  ids: Optional[np.ndarray] = None) -> set[int]:
+        """
+        Returns the ids in the move list of a player that cover at
+        least one of the squares of a bitboard mask: the placements
+        covering those squares (ids, if already known) are looked up in
+        the list, or the list is checked directly when it is short.
+        """
+        live = self.live[player]
+        if len(live) <= _FEW:
+            masks = self.table.mask_ints
+            return {i for i in live if masks[i] & squares}
+        if ids is None:
+            ids = self.table.covering(squares)
+        return set(ids[self.alive[player][ids]].tolist())
+
+    def _legal(self, candidates: np.ndarray, blocked: int,
+               kinds: Iterable[ShapeKind]) -> set[int]:
+        """
+        Returns the candidates whose shape is one of the given kinds,
+        and which cover no blocked square.
+        """
+        table = self.table
+        allowed = np.zeros(len(KINDS), dtype=bool)
+        for kind in kinds:
+            allowed[KIND_INDEX[kind]] = True
+        kind_of = np.asarray(table.kinds)[candidates]
+        candidates = candidates[allowed[kind_of]]
+        squares = table.mask_words[candidates]
+        hit = (squares & table.to_mask_words(blocked)).any(axis=1)
+        return set(candidates[~hit].tolist())
+
+    def fill(self, player: int, blocked: int, corners: int,
+             kinds: Iterable[ShapeKind]) -> None:
+        """
+        Finds the legal placements of a player from scratch, given the
+        squares they cannot cover and their open corners (as bitboard
+        masks), and the kinds of shapes they have left. Every placement
+        of the table is checked at once, with NumPy.
+        """
+        ids = self.table.legal_ids(blocked, corners, list(kinds))
+        self.live[player] = set(ids.tolist())
+        self.alive[player][:] = False
+        self.alive[player][ids] = True
+        counts = np.bincount(self.table.kinds[ids], minlength=len(KINDS))
+        self.counts[player] = counts.tolist()
+
+    def place(self, player: int, kind: ShapeKind, mask: int, edges: int,
+              corners_before: dict[int, int], corners: dict[int, int],
+              blocked: int, kinds: Iterable[ShapeKind]) -> MoveDelta:
+        """
+        Updates the move lists after a player placed a piece of the given
+        kind, and returns what changed.
+
+        All the squares are given as bitboard masks: the piece, the
+        squares next to it, the corners of every player before and after
+        the move, and the squares the player cannot cover any more. kinds
+        are the kinds of shapes the player has left.
+        """
+        table = self.table
+        masks = table.mask_ints
+        delta = MoveDelta(player)
+
+        def remove(other: int, gone: set[int]) -> None:
+            if gone:
+                self._drop(other, gone)
+                delta.removed.setdefault(other, set()).update(gone)
+
+        #nobody can cover the squares of the piece any more, and the
+        #player cannot cover the squares next to it either
+        covered = table.covering(mask)
+        for other in self.live:
+            if other == player:
+                remove(other, self._covering(other, mask | edges))
+            else:
+                remove(other, self._covering(other, mask, covered))
+
+        #the player has played this shape
+        remove(player, self.live[player] & table.by_kind[kind])
+
+        #placements that only touched lost corners are no longer legal
+        for other, before in corners_before.items():
+            lost = before & ~corners[other]
+            if lost:
+                now = corners[other]
+                remove(other, {i for i in self._covering(other, lost)
+                               if not masks[i] & now})
+
+        #new corners open up new placements
+        opened = corners[player] & ~corners_before[player]
+        if opened:
+            candidates = table.covering(opened)
+            candidates = candidates[~self.alive[player][candidates]]
+            delta.added = self._legal(candidates, blocked, kinds)
+            self._add(player, delta.added)
+        return delta
+
+    def undo(self, delta: MoveDelta) -> None:
+        """
+        Puts the move lists back as they were before the placement
+        that returned the given delta.
+        """
+        self._drop(delta.player, delta.added)
+        for other, ids in delta.removed.items():
+            self._add(other, ids)
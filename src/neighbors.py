@@ -0,0 +1,107 @@
+"""
+Neighbor tables for the squares of a Blokus board.
+
+Squares are numbered row by row (the square at row r and column c of a
+(size x size) board is r * size + c, as in the cells of
+placements.PlacementTable). For every square, the tables list the
+squares of the board that share an edge with it (orthogonal) and that
+share only a corner with it (diagonal), so that nothing walking the
+board has to work out neighbors, or check bounds, again.
+
+Each table is an array with one row per square, padded with -1, since
+squares on the sides and in the corners of the board have fewer
+neighbors. The same rows are also kept as tuples, for loops in plain
+Python. Tables are built once per board size and shared by the whole
+process (see neighbors_for).
+"""
+import numpy as np
+
+# Row and column offsets of the orthogonal and diagonal neighbors
+ORTHOGONAL = ((-1, 0), (0, -1), (0, 1), (1, 0))
+DIAGONAL = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _build(size: int, offsets: tuple[tuple[int, int], ...]) -> np.ndarray:
+    """
+    Returns the table of the in-bounds neighbors of every square of
+    a (size x size) board at the given offsets, padded with -1.
+    """
+    table = np.full((size * size, len(offsets)), -1, dtype=np.int16)
+    for r in range(size):
+        for c in range(size):
+            found = [(r + dr) * size + c + dc for dr, dc in offsets
+                     if 0 <= r + dr < size and 0 <= c + dc < size]
+            table[r * size + c, :len(found)] = found
+    table.setflags(write=False)
+    return table
+
+
+class NeighborTable:
+    """
+    The neighbors of every square of a (size x size) board:
+
+        orthogonal: (size * size, 4) array of the squares sharing an
+                    edge with each square, padded with -1
+        diagonal:   (size * size, 4) array of the squares sharing only
+                    a corner with each square, padded with -1
+        adjacent:   (size * size, 8) array of both, padded with -1
+
+    and the same rows without the padding, as tuples (orthogonal_ids,
+    diagonal_ids and adjacent_ids).
+    """
+
+    size: int
+    orthogonal: np.ndarray
+    diagonal: np.ndarray
+    adjacent: np.ndarray
+    orthogonal_ids: list[tuple[int, ...]]
+    diagonal_ids: list[tuple[int, ...]]
+    adjacent_ids: list[tuple[int, ...]]
+
+    def __init__(self, size: int) -> None:
+        """
+        Constructor
+
+            size: Number of squares on each side of the board
+        """
+        self.size = size
+        self.orthogonal = _build(size, ORTHOGONAL)
+        self.diagonal = _build(size, DIAGONAL)
+        self.adjacent = _build(size, ORTHOGONAL + DIAGONAL)
+        self.orthogonal_ids = _rows(self.orthogonal)
+        self.diagonal_ids = _rows(self.diagonal)
+        self.adjacent_ids = _rows(self.adjacent)
+
+    def index(self, point: tuple[int, int]) -> int:
+        """
+        Returns the number of a square of the board.
+        """
+        r, c = point
+        return r * self.size + c
+
+    def point(self, index: int) -> tuple[int, int]:
+        """
+        Returns the row and column of a square of the board.
+        """
+        return divmod(index, self.size)
+
+
+def _rows(table: np.ndarray) -> list[tuple[int, ...]]:
+    """
+    Returns the rows of a neighbor table as tuples, without the
+    padding.
+    """
+    return [tuple(i for i in row if i >= 0) for row in table.tolist()]
+
+
+_TABLES: dict[int, NeighborTable] = {}
+
+
+def neighbors_for(size: int) -> NeighborTable:
+    """
+    Returns the neighbor tables of a board of the given size, shared
+    by everything in the process that needs them.
+    """
+    if size not in _TABLES:
+        _TABLES[size] = NeighborTable(size)
+    return _TABLES[size]
@@ -3,13 +3,11 @@ Blokus shapes and pieces.
 
 Modify only the methods marked as TODO.
 """
-import copy
 from typing import Optional
 import textwrap
 
-import numpy as np
-
-from shape_definitions import ShapeKind
+from shape_definitions import ShapeKind, definitions
+from neighbors import ORTHOGONAL, DIAGONAL, neighbors_for
 
 # A point is represented by row and column numbers (r, c). The
 # top-left corner of a grid is (0, 0). Note that rows/columns
@@ -91,11 +89,9 @@ class Shape:
         square = list()
 
         #split the string representation of the piece into rows
-        #remove empty rows 
-        rows = definition.split('\n')
-        for row in rows:
-            if not ('X' in row or 'O' in row or '@' in row):
-                rows.remove(row)
+        #keep only the rows with squares (or the origin) in them
+        rows = [row for row in definition.split('\n')
+                if 'X' in row or 'O' in row or '@' in row]
         
         #strip away the extra units of leading whitespace 
         #all rows should now have the same length
@@ -120,7 +116,14 @@ class Shape:
             square[i] = (square[i][0] - origin[0], square[i][1] - origin[1])     
             
         return Shape(kind, origin, transform, square)
-        
+
+    def copy(self) -> "Shape":
+        """
+        Returns a copy of the shape, which can be flipped and
+        rotated without affecting this one.
+        """
+        return Shape(self.kind, self.origin, self.can_be_transformed,
+                     list(self.squares))
 
     def flip_horizontally(self) -> None:
         """
@@ -128,31 +131,143 @@ class Shape:
         (across the vertical axis through its origin),
         by modifying the squares in place.
         """
-        s = self.squares
-        for i in range(len(s)):
-            s[i] = (s[i][0], -s[i][1])
+        self.squares[:] = _flip(self.squares)
 
     def rotate_left(self) -> None:
         """
         Rotate the shape left by 90 degrees,
         by modifying the squares in place.
         """
-        r = np.array(( (0, -1), (1, 0)))
-        s = self.squares
-        for i in range(len(s)):
-            v = np.array((s[i][0], s[i][1]))
-            s[i] = (r.dot(v)[0], r.dot(v)[1])
+        self.squares[:] = _rotate_left(self.squares)
 
     def rotate_right(self) -> None:
         """
         Rotate the shape right by 90 degrees,
         by modifying the squares in place.
         """
-        r = np.array(( (0, 1), (-1, 0)))
-        s = self.squares
-        for i in range(len(s)):
-            v = np.array((s[i][0], s[i][1]))
-            s[i] = (r.dot(v)[0], r.dot(v)[1])
+        self.squares[:] = _rotate_right(self.squares)
+
+
+# The flips and rotations below map each square separately, so the
+# transformed squares stay in the same order as the original ones.
+#
+def _flip(squares: list[Point]) -> list[Point]:
+    return [(r, -c) for r, c in squares]
+
+
+def _rotate_left(squares: list[Point]) -> list[Point]:
+    return [(-c, r) for r, c in squares]
+
+
+def _rotate_right(squares: list[Point]) -> list[Point]:
+    return [(c, -r) for r, c in squares]
+
+
+class Orientation:
+    """
+    One of the (up to 8) distinct orientations of a Blokus shape,
+    as produced by flipping and rotating it around its origin.
+
+    The id of an orientation is its index in ORIENTATIONS[kind]. Id 0
+    is the shape as defined in shape_definitions.py; the others follow
+    in the order Piece produces them: face up with 0 to 3 right
+    rotations, then flipped with 0 to 3 right rotations. Orientations
+    that cover the same squares (relative to the origin) as an earlier
+    one are not repeated, so symmetric shapes have fewer than eight.
+
+    squares, edges and corners are offsets from the origin: the squares
+    of the shape, the squares sharing an edge with it, and the squares
+    sharing only a corner with it.
+
+    canonical is False when the orientation covers the same squares as
+    an earlier one up to a translation (for example, the "2" piece
+    rotated by 180 degrees), so only canonical orientations are needed
+    to list every distinct placement of a shape.
+
+    flipped, rotated_left and rotated_right are the ids of the
+    orientations reached by transforming this one.
+    """
+
+    kind: ShapeKind
+    id: int
+    face_up: bool
+    rotation: int
+    squares: tuple[Point, ...]
+    edges: tuple[Point, ...]
+    corners: tuple[Point, ...]
+    canonical: bool
+    flipped: int
+    rotated_left: int
+    rotated_right: int
+
+    def __init__(
+        self,
+        kind: ShapeKind,
+        ident: int,
+        face_up: bool,
+        rotation: int,
+        squares: list[Point],
+        canonical: bool,
+    ) -> None:
+        """
+        Constructor. The transition ids are filled in once every
+        orientation of the shape is known.
+        """
+        self.kind = kind
+        self.id = ident
+        self.face_up = face_up
+        self.rotation = rotation
+        self.squares = tuple(squares)
+        self.canonical = canonical
+
+        covered = set(squares)
+        edges: list[Point] = []
+        corners: list[Point] = []
+        for r, c in squares:
+            for dr, dc in ORTHOGONAL:
+                p = (r + dr, c + dc)
+                if p not in covered and p not in edges:
+                    edges.append(p)
+        for r, c in squares:
+            for dr, dc in DIAGONAL:
+                p = (r + dr, c + dc)
+                if p not in covered and p not in edges and p not in corners:
+                    corners.append(p)
+        self.edges = tuple(edges)
+        self.corners = tuple(corners)
+
+        self.flipped = ident
+        self.rotated_left = ident
+        self.rotated_right = ident
+
+
+def _build_orientations(shape: Shape) -> list[Orientation]:
+    """
+    Builds the distinct orientations of a shape (see Orientation).
+    """
+    found: list[Orientation] = []
+    by_squares: dict[frozenset[Point], int] = {}
+    translations: set[frozenset[Point]] = set()
+    for face_up in (True, False):
+        squares = list(shape.squares) if face_up else _flip(shape.squares)
+        for rotation in range(4):
+            key = frozenset(squares)
+            if key not in by_squares:
+                min_r = min(r for r, _ in squares)
+                min_c = min(c for _, c in squares)
+                normal = frozenset((r - min_r, c - min_c) for r, c in squares)
+                by_squares[key] = len(found)
+                found.append(Orientation(shape.kind, len(found), face_up,
+                                         rotation, squares,
+                                         normal not in translations))
+                translations.add(normal)
+            squares = _rotate_right(squares)
+
+    for o in found:
+        o.flipped = by_squares[frozenset(_flip(list(o.squares)))]
+        o.rotated_left = by_squares[frozenset(_rotate_left(list(o.squares)))]
+        o.rotated_right = by_squares[frozenset(_rotate_right(list(o.squares)))]
+    return found
 
 class Piece:
     """
@@ -160,42 +275,118 @@ class Piece:
 
     The anchor point is used to locate the Shape.
 
-    For flips and rotations, rather than storing these
-    orientations directly (for example, using two attributes
-    called face_up: bool and rotation: int), we modify
-    the shape attribute in place. Therefore, it is important
-    that each Piece object has its own deep copy of a
-    Shape, so that transforming one Piece does not affect
-    other Pieces that have the same Shape.
+    A Piece of one of the 21 shapes does not copy its Shape. It only
+    keeps the id of its current orientation in ORIENTATIONS, which is
+    shared by every Piece, and flips and rotations switch to another
+    id. The shape attribute is built, as the Piece's own copy, the
+    first time it is used; from then on, flips and rotations modify
+    that copy in place, as they always did, so transforming one Piece
+    never affects other Pieces that have the same Shape.
     """
 
-    shape: Shape
     anchor: Optional[Point]
-
-    def __init__(self, shape: Shape, face_up: bool = True, rotation: int = 0):
+    _kind: ShapeKind
+    _origin: Point
+    _can_be_transformed: bool
+    _orientation: Optional[int]
+    _shape: Optional[Shape]
+
+    def __init__(self, shape: Shape, face_up: bool = True, rotation: int = 0,
+                 orientation: Optional[int] = None):
         """
-        Each Piece will get its own deep copy of the given shape
-        subject to initial transformations according to the arguments:
+        Each Piece behaves as if it had its own deep copy of the given
+        shape, subject to initial transformations according to the
+        arguments:
 
             face_up:  If true, the initial Shape will be flipped
                       horizontally.
             rotation: This number, modulo 4, indicates how many
                       times the shape should be right-rotated by
                       90 degrees.
+            orientation: If given, the id of one of the orientations
+                      in ORIENTATIONS[shape.kind], which is used
+                      instead of face_up and rotation.
         """
-        # Deep copy shape, so that it can be transformed in place
-        self.shape = copy.deepcopy(shape)
+        self._kind = shape.kind
+        self._origin = shape.origin
+        self._can_be_transformed = shape.can_be_transformed
+        self._shape = None
 
         # The anchor will be set by set_anchor
         self.anchor = None
 
+        # A known orientation needs no transforming at all
+        if orientation is not None:
+            self._orientation = orientation
+            return
+
+        # A shape that matches none of the orientations of its kind (it
+        # was not built from shape_definitions) is copied after all
+        self._orientation = _ORIENTATION_IDS[shape.kind].get(
+            frozenset(shape.squares))
+        if self._orientation is None:
+            self._shape = shape.copy()
+
         # We choose to flip...
         if not face_up:
-            self.shape.flip_horizontally()
+            self._flip()
 
         # ... before rotating
         for _ in range(rotation % 4):
-            self.shape.rotate_right()
+            self._rotate_right()
+
+    @property
+    def shape(self) -> Shape:
+        """
+        Returns the Piece's own copy of its Shape, in its current
+        orientation, building it the first time.
+        """
+        if self._shape is None:
+            assert self._orientation is not None
+            squares = ORIENTATIONS[self._kind][self._orientation].squares
+            self._shape = Shape(self._kind, self._origin,
+                                self._can_be_transformed, list(squares))
+        return self._shape
+
+    @property
+    def kind(self) -> ShapeKind:
+        """
+        Returns the kind of shape of the piece.
+        """
+        return self._kind
+
+    @property
+    def orientation(self) -> Optional[int]:
+        """
+        Returns the id of the current orientation of the piece
+        (see ORIENTATIONS), or None if its squares do not match
+        any orientation of its kind of shape.
+        """
+        if self._shape is None:
+            return self._orientation
+        return _ORIENTATION_IDS[self._kind].get(frozenset(self._shape.squares))
+
+    def _flip(self) -> None:
+        """
+        Flips the piece, without checking the anchor.
+        """
+        if self._shape is None:
+            assert self._orientation is not None
+            o = ORIENTATIONS[self._kind][self._orientation]
+            self._orientation = o.flipped
+        else:
+            self._shape.flip_horizontally()
+
+    def _rotate_right(self) -> None:
+        """
+        Rotates the piece right, without checking the anchor.
+        """
+        if self._shape is None:
+            assert self._orientation is not None
+            o = ORIENTATIONS[self._kind][self._orientation]
+            self._orientation = o.rotated_right
+        else:
+            self._shape.rotate_right()
 
     def set_anchor(self, anchor: Point) -> None:
         """
@@ -210,14 +401,14 @@ class Piece:
         so each of those may raise ValueError.
         """
         if self.anchor is None:
-            raise ValueError(f"Piece does not have anchor: {self.shape}")
+            raise ValueError(f"Piece does not have anchor: {self._kind}")
 
     def flip_horizontally(self) -> None:
         """
         Flip the piece horizontally.
         """
         self._check_anchor()
-        self.shape.flip_horizontally()
+        self._flip()
 
     def rotate_left(self) -> None:
         """
@@ -225,7 +416,12 @@ class Piece:
         by modifying the squares in place.
         """
         self._check_anchor()
-        self.shape.rotate_left()
+        if self._shape is None:
+            assert self._orientation is not None
+            o = ORIENTATIONS[self._kind][self._orientation]
+            self._orientation = o.rotated_left
+        else:
+            self._shape.rotate_left()
 
     def rotate_right(self) -> None:
         """
@@ -233,7 +429,7 @@ class Piece:
         by modifying the squares in place.
         """
         self._check_anchor()
-        self.shape.rotate_right()
+        self._rotate_right()
 
     def squares(self) -> list[Point]:
         """
@@ -244,54 +440,66 @@ class Piece:
         """
         self._check_anchor()
         assert self.anchor is not None
+        if self._shape is None:
+            assert self._orientation is not None
+            offsets = ORIENTATIONS[self._kind][self._orientation].squares
+        else:
+            offsets = tuple(self._shape.squares)
         return [
             (row(self.anchor) + r, col(self.anchor) + c)
-            for r, c in self.shape.squares
+            for r, c in offsets
         ]
     
 
-    def cardinal_neighbors(self) -> set[Point]:
+    def cardinal_neighbors(self, size: Optional[int] = None) -> set[Point]:
         """
         Returns the combined cardinal neighbors
         (north, south, east, and west)
         corresponding to all of the piece's squares.
 
+        Without a board size, only neighbors with a negative
+        row or column are left out. Given the size of the board,
+        only the neighbors on the board are returned (found in
+        the shared neighbor tables, see neighbors.py).
+
         Raises ValueError if anchor is not set.
         """
         self._check_anchor()
+        squares = self.squares()
+        if size is not None:
+            return _on_board(squares, size, ORTHOGONAL,
+                             neighbors_for(size).orthogonal_ids)
 
         c_nghs = set()
-
-        for sq in self.squares():
-            x, y = sq
+        for x, y in squares:
             if x > 0:
                 c_nghs.add((x - 1, y))
             c_nghs.add((x + 1, y))
             if y > 0:
                 c_nghs.add((x, y - 1))
             c_nghs.add((x, y + 1))
-
-        for sq in self.squares():
-            if sq in c_nghs:
-                c_nghs.remove(sq)
-    
+        c_nghs.difference_update(squares)
         return c_nghs
 
-
-    def intercardinal_neighbors(self) -> set[Point]:
+    def intercardinal_neighbors(self,
+                                size: Optional[int] = None) -> set[Point]:
         """
         Returns the combined intercardinal neighbors
         (northeast, southeast, southwest, and northwest)
         corresponding to all of the piece's squares.
 
+        The board size works as in cardinal_neighbors.
+
         Raises ValueError if anchor is not set.
         """
         self._check_anchor()
-        
-        i_nghs = set()
+        squares = self.squares()
+        if size is not None:
+            return _on_board(squares, size, DIAGONAL,
+                             neighbors_for(size).diagonal_ids)
 
-        for sq in self.squares():
-            x, y = sq
+        i_nghs = set()
+        for x, y in squares:
             if x > 0 and y > 0:
                 i_nghs.add((x - 1, y - 1))
             if y > 0:
@@ -299,10 +507,200 @@ class Piece:
             i_nghs.add((x + 1, y + 1))
             if x > 0:
                 i_nghs.add((x - 1, y + 1))
+        i_nghs.difference_update(squares)
+        return i_nghs
 
-        for sq in self.squares():
-            if sq in i_nghs:
-                i_nghs.remove(sq)
 
-        return i_nghs
-    
+def _on_board(squares: list[Point], size: int,
+              offsets: tuple[tuple[int, int], ...],
+              ids: list[tuple[int, ...]]) -> set[Point]:
+    """
+    Returns the neighbors on a (size x size) board, at the given
+    offsets, of a piece's squares (but none of the squares themselves).
+    ids is the matching neighbor table of the board, used for the
+    squares on the board.
+    """
+    nghs: set[Point] = set()
+    for r, c in squares:
+        if 0 <= r < size and 0 <= c < size:
+            nghs.update(divmod(i, size) for i in ids[r * size + c])
+        else:
+            nghs.update((r + dr, c + dc) for dr, dc in offsets
+                        if 0 <= r + dr < size and 0 <= c + dc < size)
+    nghs.difference_update(squares)
+    return nghs
+
+
+class Placement:
+    """
+    An immutable move: a kind of shape, one of its orientations (an id
+    into ORIENTATIONS[kind]) and an anchor on the board.
+
+    Unlike a Piece, a Placement does not own a copy of its shape, and
+    two placements with the same kind, orientation and anchor are equal
+    (and hash the same), so they can be kept in sets and used as keys.
+    The squares it covers, and the squares around them, are worked out
+    the first time they are needed and then kept.
+    """
+
+    __slots__ = ("kind", "orientation", "anchor", "_cells", "_edges",
+                 "_corners")
+
+    kind: ShapeKind
+    orientation: int
+    anchor: Point
+    _cells: Optional[tuple[Point, ...]]
+    _edges: Optional[tuple[Point, ...]]
+    _corners: Optional[tuple[Point, ...]]
+
+    def __init__(self, kind: ShapeKind, orientation: int, anchor: Point
+                 ) -> None:
+        """
+        Constructor
+
+            kind: The kind of shape
+            orientation: The id of one of ORIENTATIONS[kind]
+            anchor: Where the origin of the shape goes on the board
+
+        Raises ValueError if the orientation id does not exist.
+        """
+        if not 0 <= orientation < len(ORIENTATIONS[kind]):
+            raise ValueError(f"{kind} has no orientation {orientation}")
+        object.__setattr__(self, "kind", kind)
+        object.__setattr__(self, "orientation", orientation)
+        object.__setattr__(self, "anchor", (int(anchor[0]), int(anchor[1])))
+        object.__setattr__(self, "_cells", None)
+        object.__setattr__(self, "_edges", None)
+        object.__setattr__(self, "_corners", None)
+
+    @staticmethod
+    def from_piece(piece: Piece) -> "Placement":
+        """
+        Returns the placement matching a piece.
+
+        Raises ValueError if the piece has no anchor, or if its
+        squares are not one of the orientations of its shape.
+        """
+        piece._check_anchor()
+        assert piece.anchor is not None
+        orientation = piece.orientation
+        if orientation is None:
+            raise ValueError(f"Unknown orientation: {piece.shape}")
+        return Placement(piece.kind, orientation, piece.anchor)
+
+    def to_piece(self, shape: Shape) -> Piece:
+        """
+        Returns a Piece of the given shape (which must be of the
+        same kind) in this orientation and at this anchor.
+        """
+        piece = Piece(shape, orientation=self.orientation)
+        piece.set_anchor(self.anchor)
+        return piece
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("Placement is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Placement is immutable")
+
+    def __reduce__(self) -> tuple[type, tuple[ShapeKind, int, Point]]:
+        return (Placement, (self.kind, self.orientation, self.anchor))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Placement):
+            return NotImplemented
+        return (self.kind == other.kind
+                and self.orientation == other.orientation
+                and self.anchor == other.anchor)
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.orientation, self.anchor))
+
+    def __repr__(self) -> str:
+        return f"Placement({self.kind}, {self.orientation}, {self.anchor})"
+
+    def _offset(self, offsets: tuple[Point, ...]) -> tuple[Point, ...]:
+        """
+        Moves offsets from the origin of the shape to the anchor.
+        """
+        r0, c0 = self.anchor
+        return tuple((r0 + r, c0 + c) for r, c in offsets)
+
+    @property
+    def cells(self) -> tuple[Point, ...]:
+        """
+        Returns the squares covered by the placement.
+        """
+        if self._cells is None:
+            o = ORIENTATIONS[self.kind][self.orientation]
+            object.__setattr__(self, "_cells", self._offset(o.squares))
+        assert self._cells is not None
+        return self._cells
+
+    @property
+    def edges(self) -> tuple[Point, ...]:
+        """
+        Returns the squares sharing an edge with the placement.
+        Some of them may be beyond the bounds of the board.
+        """
+        if self._edges is None:
+            o = ORIENTATIONS[self.kind][self.orientation]
+            object.__setattr__(self, "_edges", self._offset(o.edges))
+        assert self._edges is not None
+        return self._edges
+
+    @property
+    def corners(self) -> tuple[Point, ...]:
+        """
+        Returns the squares sharing only a corner with the placement.
+        Some of them may be beyond the bounds of the board.
+        """
+        if self._corners is None:
+            o = ORIENTATIONS[self.kind][self.orientation]
+            object.__setattr__(self, "_corners", self._offset(o.corners))
+        assert self._corners is not None
+        return self._corners
+
+    def squares(self) -> list[Point]:
+        """
+        Returns the list of points covered by the placement,
+        as Piece.squares does.
+        """
+        return list(self.cells)
+
+
+# The 21 shapes, parsed from shape_definitions once at import and
+# shared by every game in the process. They must not be flipped or
+# rotated; shape_copies returns shapes that can be.
+#
+SHAPES: dict[ShapeKind, Shape] = {
+    kind: Shape.from_string(kind, str_rep)
+    for kind, str_rep in definitions.items()
+}
+
+
+def shape_copies() -> dict[ShapeKind, Shape]:
+    """
+    Returns a fresh copy of each of the 21 shapes, in the order
+    of shape_definitions.
+    """
+    return {kind: shape.copy() for kind, shape in SHAPES.items()}
+
+
+# All distinct orientations of the 21 shapes, built once at import.
+#
+ORIENTATIONS: dict[ShapeKind, list[Orientation]] = {
+    kind: _build_orientations(shape) for kind, shape in SHAPES.items()
+}
+
+# The number of squares of each shape
+#
+SHAPE_SIZES: dict[ShapeKind, int] = {
+    kind: len(orientations[0].squares)
+    for kind, orientations in ORIENTATIONS.items()
+}
+
+_ORIENTATION_IDS: dict[ShapeKind, dict[frozenset[Point], int]] = {
+    kind: {frozenset(o.squares): o.id for o in orientations}
+    for kind, orientations in ORIENTATIONS.items()
+}
@@ -0,0 +1,421 @@
+"""
+The placement universe of a Blokus board.
+
+For a given board size, the placements that fit on the board (a kind
+of shape, one of its orientations, and a position) never change. They
+are listed here once per size, each with an id, the squares it covers
+and its masks, along with an inverted index from every square to the
+placements that cover it.
+
+Only canonical orientations are listed (see piece.Orientation), so no
+two placements of the same kind cover the same squares. Placements are
+numbered kind by kind, in the order of shape_definitions, so the ids of
+each kind are a contiguous range.
+
+The universe is kept as a handful of NumPy arrays, which are saved the
+first time they are built (one .npy file per array, in a directory per
+board size under the cache directory) and memory-mapped by later runs,
+so that no process has to build them again. The cache directory is
+BLOKUS_CACHE_DIR if set (an empty value turns the disk cache off), or
+~/.cache/blokus otherwise.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+from shape_definitions import ShapeKind, definitions
+from piece import Point, Placement, ORIENTATIONS
+
+# The board sizes of the usual game configurations
+BOARD_SIZES = {"mono": 11, "duo": 14, "classic": 20}
+
+# Kinds of shapes, numbered as in the kinds array
+KINDS: list[ShapeKind] = list(ORIENTATIONS)
+KIND_INDEX: dict[ShapeKind, int] = {kind: k for k, kind in enumerate(KINDS)}
+
+# Bumped whenever the arrays change meaning, so old caches are ignored
+FORMAT = 1
+
+# The most squares in one shape (cells rows are padded with -1)
+MAX_CELLS = 5
+
+_ARRAYS = ("kinds", "orientations", "anchors", "cells", "words", "masks",
+           "cover_starts", "cover_ids", "kind_starts")
+
+
+def build_arrays(size: int) -> dict[str, np.ndarray]:
+    """
+    Builds the arrays of the placement universe of a (size x size)
+    board (see PlacementTable for what each array holds).
+    """
+    stride = size + 1
+    num_words = (size * size + 63) // 64
+    num_bytes = (size * stride + 7) // 8
+
+    kinds: list[int] = []
+    orientations: list[int] = []
+    anchors: list[Point] = []
+    cells: list[list[int]] = []
+    kind_starts = [0]
+    for k, kind in enumerate(KINDS):
+        for o in ORIENTATIONS[kind]:
+            if not o.canonical:
+                continue
+            min_r = min(r for r, _ in o.squares)
+            min_c = min(c for _, c in o.squares)
+            max_r = max(r for r, _ in o.squares)
+            max_c = max(c for _, c in o.squares)
+            for r0 in range(-min_r, size - max_r):
+                for c0 in range(-min_c, size - max_c):
+                    kinds.append(k)
+                    orientations.append(o.id)
+                    anchors.append((r0, c0))
+                    covered = [(r0 + r) * size + c0 + c for r, c in o.squares]
+                    cells.append(covered + [-1] * (MAX_CELLS - len(covered)))
+        kind_starts.append(len(kinds))
+
+    count = len(kinds)
+    cell_array = np.array(cells, dtype=np.int16).reshape(count, MAX_CELLS)
+    ids, slots = np.nonzero(cell_array >= 0)
+    flat = cell_array[ids, slots].astype(np.int64)
+
+    #one bit per square, row by row (words), and in the bitboard layout
+    words = np.zeros((count, num_words), dtype=np.uint64)
+    np.bitwise_or.at(words, (ids, flat // 64),
+                     np.left_shift(np.uint64(1), (flat % 64).astype(np.uint64)))
+    bits = np.zeros((count, num_bytes * 8), dtype=np.uint8)
+    bits[ids, (flat // size) * stride + flat % size] = 1
+    masks = np.packbits(bits, axis=1, bitorder="little")
+
+    #the placements covering each square, grouped by square
+    order = np.argsort(flat, kind="stable")
+    cover_ids = ids[order].astype(np.int32)
+    cover_starts = np.searchsorted(flat[order], np.arange(size * size + 1))
+
+    return {
+        "kinds": np.array(kinds, dtype=np.uint8),
+        "orientations": np.array(orientations, dtype=np.uint8),
+        "anchors": np.array(anchors, dtype=np.int16).reshape(count, 2),
+        "cells": cell_array,
+        "words": words,
+        "masks": masks,
+        "cover_starts": cover_starts.astype(np.int32),
+        "cover_ids": cover_ids,
+        "kind_starts": np.array(kind_starts, dtype=np.int32),
+    }
+
+
+class PlacementTable:
+    """
+    Every placement that fits on a (size x size) board.
+
+    Placements are numbered from 0, and the arrays are indexed by
+    placement id:
+
+        kinds:        the kind of shape, as an index into KINDS
+        orientations: the orientation id (see piece.ORIENTATIONS)
+        anchors:      the anchor (row and column)
+        cells:        the squares covered, as cell indices
+                      (r * size + c), padded with -1
+        words:        the squares covered, one bit per cell index,
+                      in 64-bit words
+        masks:        the bitboard mask (see bitboard.Bitboard),
+                      as little-endian bytes
+
+    The ids of the placements covering the square with cell index i
+    are cover_ids[cover_starts[i]:cover_starts[i + 1]], and those of
+    kind KINDS[k] are range(kind_starts[k], kind_starts[k + 1]).
+
+    The views used to update move lists one placement at a time
+    (mask_ints, mask_words, covers, by_kind and kind_indices) are built
+    on first use.
+    """
+
+    size: int
+    stride: int
+    kinds: np.ndarray
+    orientations: np.ndarray
+    anchors: np.ndarray
+    cells: np.ndarray
+    words: np.ndarray
+    masks: np.ndarray
+    cover_starts: np.ndarray
+    cover_ids: np.ndarray
+    kind_starts: np.ndarray
+    _mask_ints: Optional[list[int]]
+    _mask_words: Optional[np.ndarray]
+    _covers: Optional[list[np.ndarray]]
+    _by_kind: Optional[dict[ShapeKind, frozenset[int]]]
+    _kind_indices: Optional[list[int]]
+    _ids: Optional[dict[tuple[ShapeKind, int], int]]
+    _placements: dict[int, Placement]
+
+    def __init__(self, size: int,
+                 arrays: Optional[dict[str, np.ndarray]] = None) -> None:
+        """
+        Constructor
+
+            size: Number of squares on each side of the board
+            arrays: The arrays of the universe, as returned by
+                    build_arrays or loaded from the cache; they
+                    are built if not given.
+        """
+        if arrays is None:
+            arrays = build_arrays(size)
+        self.size = size
+        self.stride = size + 1
+        self.kinds = arrays["kinds"]
+        self.orientations = arrays["orientations"]
+        self.anchors = arrays["anchors"]
+        self.cells = arrays["cells"]
+        self.words = arrays["words"]
+        self.masks = arrays["masks"]
+        self.cover_starts = arrays["cover_starts"]
+        self.cover_ids = arrays["cover_ids"]
+        self.kind_starts = arrays["kind_starts"]
+        self._mask_ints = None
+        self._mask_words = None
+        self._covers = None
+        self._by_kind = None
+        self._kind_indices = None
+        self._ids = None
+        self._placements = {}
+
+    def __len__(self) -> int:
+        """
+        Returns the number of placements.
+        """
+        return len(self.kinds)
+
+    def kind(self, ident: int) -> ShapeKind:
+        """
+        Returns the kind of shape of the placement with the given id.
+        """
+        return KINDS[self.kinds[ident]]
+
+    @property
+    def mask_ints(self) -> list[int]:
+        """
+        Returns the bitboard masks of the placements, as ints.
+        """
+        if self._mask_ints is None:
+            raw = self.masks.tobytes()
+            width = self.masks.shape[1]
+            self._mask_ints = [int.from_bytes(raw[i:i + width], "little")
+                               for i in range(0, len(raw), width)]
+        return self._mask_ints
+
+    @property
+    def mask_words(self) -> np.ndarray:
+        """
+        Returns the bitboard masks of the placements in 64-bit words
+        (the masks array, padded to whole words).
+        """
+        if self._mask_words is None:
+            count, width = self.masks.shape
+            padded = np.zeros((count, -(-width // 8) * 8), dtype=np.uint8)
+            padded[:, :width] = self.masks
+            self._mask_words = padded.view(np.uint64)
+        return self._mask_words
+
+    @property
+    def covers(self) -> list[np.ndarray]:
+        """
+        Returns, for each cell index, the ids of the placements
+        covering that square (views of cover_ids).
+        """
+        if self._covers is None:
+            #plain arrays rather than memory maps, which are slower to
+            #slice and index
+            ids = np.asarray(self.cover_ids)
+            starts = self.cover_starts.tolist()
+            self._covers = [ids[starts[i]:starts[i + 1]]
+                            for i in range(self.size * self.size)]
+        return self._covers
+
+    @property
+    def by_kind(self) -> dict[ShapeKind, frozenset[int]]:
+        """
+        Returns the ids of the placements of each kind of shape.
+        """
+        if self._by_kind is None:
+            starts = self.kind_starts.tolist()
+            self._by_kind = {kind: frozenset(range(starts[k], starts[k + 1]))
+                             for k, kind in enumerate(KINDS)}
+        return self._by_kind
+
+    @property
+    def kind_indices(self) -> list[int]:
+        """
+        Returns the kind of shape of every placement, as an index into
+        KINDS (the kinds array, as a list).
+        """
+        if self._kind_indices is None:
+            self._kind_indices = self.kinds.tolist()
+        return self._kind_indices
+
+    def placement(self, ident: int) -> Placement:
+        """
+        Returns the Placement with the given id.
+        """
+        found = self._placements.get(ident)
+        if found is None:
+            r, c = self.anchors[ident].tolist()
+            found = Placement(KINDS[self.kinds[ident]],
+                              int(self.orientations[ident]), (r, c))
+            self._placements[ident] = found
+        return found
+
+    def find(self, kind: ShapeKind, mask: int) -> Optional[int]:
+        """
+        Returns the id of the placement of the given kind of shape
+        covering the squares of the given bitboard mask, if any.
+        """
+        if self._ids is None:
+            self._ids = {(KINDS[k], mask): i
+                         for i, (k, mask)
+                         in enumerate(zip(self.kinds.tolist(),
+                                          self.mask_ints))}
+        return self._ids.get((kind, mask))
+
+    def covering(self, mask: int) -> np.ndarray:
+        """
+        Returns the ids of the placements covering at least one of
+        the squares of a bitboard mask (with repeats, for placements
+        covering several of them).
+        """
+        size = self.size
+        stride = self.stride
+        covers = self.covers
+        found = []
+        while mask:
+            low = mask & -mask
+            r, c = divmod(low.bit_length() - 1, stride)
+            found.append(covers[r * size + c])
+            mask ^= low
+        if not found:
+            return np.zeros(0, dtype=self.cover_ids.dtype)
+        return np.concatenate(found)
+
+    def to_mask_words(self, mask: int) -> np.ndarray:
+        """
+        Turns a bitboard mask into the 64-bit words of mask_words.
+        """
+        num_bytes = self.mask_words.shape[1] * 8
+        return np.frombuffer(mask.to_bytes(num_bytes, "little"),
+                             dtype=np.uint64)
+
+    def to_words(self, mask: int) -> np.ndarray:
+        """
+        Turns a bitboard mask into one bit per cell index, in the
+        64-bit words used by the words array.
+        """
+        size = self.size
+        num_bytes = (size * self.stride + 7) // 8
+        raw = np.frombuffer(mask.to_bytes(num_bytes, "little"), dtype=np.uint8)
+        bits = np.unpackbits(raw, bitorder="little")[:size * self.stride]
+        bits = bits.reshape(size, self.stride)[:, :size].ravel()
+        num_words = self.words.shape[1]
+        padded = np.zeros(num_words * 64, dtype=np.uint8)
+        padded[:size * size] = bits
+        return np.packbits(padded, bitorder="little").view(np.uint64)
+
+    def legal_ids(self, blocked: int, corners: int,
+                  kinds: list[ShapeKind]) -> np.ndarray:
+        """
+        Returns the ids of the placements of the given kinds that
+        cover none of the blocked squares and at least one of the
+        corner squares (both given as bitboard masks), all at once.
+        """
+        hit = (self.words & self.to_words(blocked)).any(axis=1)
+        touch = (self.words & self.to_words(corners)).any(axis=1)
+        allowed = np.zeros(len(KINDS), dtype=bool)
+        for kind in kinds:
+            allowed[KIND_INDEX[kind]] = True
+        return np.flatnonzero(~hit & touch & allowed[self.kinds])
+
+
+def cache_dir() -> Optional[str]:
+    """
+    Returns the directory where placement universes are cached, or
+    None if the disk cache is turned off.
+    """
+    path = os.environ.get("BLOKUS_CACHE_DIR")
+    if path is None:
+        return os.path.join(os.path.expanduser("~"), ".cache", "blokus")
+    return path or None
+
+
+def _cache_path(directory: str, size: int) -> str:
+    """
+    Returns the directory holding the cached arrays for a board size.
+    Its name changes with the format and the shape definitions.
+    """
+    digest = hashlib.sha256(
+        repr(sorted((kind.value, rep) for kind, rep in definitions.items()))
+        .encode()
+    ).hexdigest()[:12]
+    return os.path.join(directory, f"placements-{FORMAT}-{digest}-{size}")
+
+
+def save(arrays: dict[str, np.ndarray], path: str) -> None:
+    """
+    Saves the arrays of a universe to a directory, all at once: they
+    are written to a temporary directory that is then renamed, so a
+    reader never sees half of them.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp, name + ".npy"), arrays[name])
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        #another process saved the same arrays first
+        for name in _ARRAYS:
+            os.remove(os.path.join(tmp, name + ".npy"))
+        os.rmdir(tmp)
+
+
+def load(path: str) -> Optional[dict[str, np.ndarray]]:
+    """
+    Memory-maps the arrays of a universe saved by save, or returns
+    None if they are not there.
+    """
+    if not os.path.isdir(path):
+        return None
+    try:
+        return {name: np.load(os.path.join(path, name + ".npy"),
+                              mmap_mode="r")
+                for name in _ARRAYS}
+    except (OSError, ValueError):
+        return None
+
+
+_TABLES: dict[int, PlacementTable] = {}
+
+
+def placements_for(size: int) -> PlacementTable:
+    """
+    Returns the placements of a board of the given size, shared by
+    every game of that size in the process. They are loaded from the
+    disk cache if possible, and built (and saved there) otherwise.
+    """
+    if size not in _TABLES:
+        directory = cache_dir()
+        arrays = None
+        if directory is not None:
+            path = _cache_path(directory, size)
+            arrays = load(path)
+            if arrays is None:
+                arrays = build_arrays(size)
+                try:
+                    save(arrays, path)
+                except OSError:
+                    pass
+        _TABLES[size] = PlacementTable(size, arrays)
+    return _TABLES[size]
@@ -0,0 +1,398 @@
+"""
+Exact endgame search for Blokus.
+
+Late in a game, players have few shapes left and few open corners, so
+the whole rest of the game can be searched. EndgameSolver does so on
+the game itself, with push and pop (see Blokus.push), looking positions
+up by their Zobrist hash so that each is searched once, and trying the
+most promising moves first (the best move found earlier for the
+position, then the largest shapes).
+
+With two players, or in paranoid mode, the player to move at the root
+maximizes their lead over the best of the other players, and the other
+players play together against them (alpha-beta search, with the
+transposition table of ttable.py). In max^n mode, every player
+maximizes their own score.
+
+The search deepens one move at a time, and stops when it reaches the
+end of the game along every line (the result is then proven) or when
+its budget of positions or time runs out, in which case the result of
+the deepest search completed is returned, scored by the scores the
+players would have if nobody played again.
+"""
+import time
+from typing import Optional
+
+from piece import Placement, SHAPE_SIZES
+from blokus import Blokus
+from placements import placements_for
+from ttable import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+
+MODES = ("paranoid", "maxn")
+
+# The stored depth of results that reach the end of the game on every
+# line (deeper than any search)
+_PROVEN = 127
+
+# Positions searched between two looks at the clock
+_CLOCK_EVERY = 256
+
+
+class _OutOfBudget(Exception):
+    """
+    Raised inside the search when the budget is spent.
+    """
+
+
+class Solution:
+    """
+    The result of a search: the best line found for the player to move
+    (a list of moves, with None for a player retiring because they
+    cannot move), the score of every player at the end of that line
+    (indexed by player number minus one), the value of the line for
+    the player to move (their lead in paranoid mode, their score in
+    max^n mode), and whether it is proven, along with the number of
+    positions searched and the depth of the last completed search.
+    """
+
+    line: list[Optional[Placement]]
+    scores: tuple[int, ...]
+    value: float
+    proven: bool
+    nodes: int
+    depth: int
+
+    def __init__(self, line: list[Optional[Placement]],
+                 scores: tuple[int, ...], value: float, proven: bool,
+                 nodes: int, depth: int) -> None:
+        """
+        Constructor
+        """
+        self.line = line
+        self.scores = scores
+        self.value = value
+        self.proven = proven
+        self.nodes = nodes
+        self.depth = depth
+
+    @property
+    def move(self) -> Optional[Placement]:
+        """
+        Returns the first move of the line (None if the player to move
+        has to retire, or if the game is over).
+        """
+        return self.line[0] if self.line else None
+
+
+class EndgameSolver:
+    """
+    Searches Blokus positions to the end of the game (see the module
+    docstring).
+    """
+
+    threshold: int
+    max_nodes: Optional[int]
+    max_seconds: Optional[float]
+    mode: Optional[str]
+    table: TranspositionTable
+    nodes: int
+    _game: Blokus
+    _root: int
+    _deadline: Optional[float]
+    _maxn: dict[int, tuple[int, tuple[int, ...], int]]
+
+    def __init__(self, threshold: int = 12,
+                 max_nodes: Optional[int] = 200_000,
+                 max_seconds: Optional[float] = None,
+                 mode: Optional[str] = None,
+                 table_bytes: int = 16 * 1024 * 1024) -> None:
+        """
+        Constructor
+
+            threshold: The most legal moves any player may have for
+                       should_solve to say the game is in its endgame
+            max_nodes: The most positions one search may visit
+                       (None for no limit)
+            max_seconds: The most time one search may take (None for
+                         no limit)
+            mode: "paranoid" or "maxn"; by default, paranoid with two
+                  players and max^n with more
+            table_bytes: Memory for the transposition table
+
+        Raises ValueError if the mode is unknown.
+        """
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        self.threshold = threshold
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.mode = mode
+        self.table = TranspositionTable(table_bytes)
+        self.nodes = 0
+        self._root = 0
+        self._deadline = None
+        self._maxn = {}
+
+    def should_solve(self, game: Blokus) -> bool:
+        """
+        Returns whether the game is far enough in its endgame to be
+        searched: no player still playing has more than threshold
+        legal moves (see Blokus.mobility). The live move lists of the
+        game are left on only if they already were.
+        """
+        if game.game_over:
+            return False
+        was_live = game.live_moves_on
+        solvable = all(game.mobility(p) <= self.threshold
+                       for p in game.active_players)
+        if not was_live:
+            game.stop_live_moves()
+        return solvable
+
+    def solve(self, game: Blokus) -> Solution:
+        """
+        Searches the game from its current position, and returns the
+        best line found for the player to move. The game is left as
+        it was, with its live move lists on only if they already were.
+        """
+        mode = self.mode
+        if mode is None:
+            mode = "paranoid" if game.num_players == 2 else "maxn"
+        self._game = game
+        #keep the move lists up to date through the search, instead of
+        #finding the moves again in every position (see live_moves)
+        was_live = game.live_moves_on
+        game.live_moves()
+        if self._root != game.curr_player:
+            #values in the table are from the point of view of the root
+            self.table.clear()
+            self._root = game.curr_player
+        self.table.new_search()
+        self._maxn = {}
+        self.nodes = 0
+        self._deadline = None
+        if self.max_seconds is not None:
+            self._deadline = time.perf_counter() + self.max_seconds
+
+        depth = 0
+        value = self._value(self._scores())
+        proven = game.game_over
+        while not proven:
+            try:
+                if mode == "paranoid":
+                    value, proven = self._paranoid(depth + 1, -float("inf"),
+                                                   float("inf"))
+                else:
+                    scores, proven = self._search_maxn(depth + 1)
+                    value = scores[self._root - 1]
+            except _OutOfBudget:
+                break
+            depth += 1
+
+        line = self._line(mode, depth)
+        for move in line:
+            self._play(move)
+        scores = self._scores()
+        for _ in line:
+            game.pop()
+        if not was_live:
+            game.stop_live_moves()
+        if mode == "maxn":
+            value = scores[self._root - 1]
+        return Solution(line, scores, value, proven, self.nodes, depth)
+
+    #
+    # SEARCH
+    #
+
+    def _tick(self) -> None:
+        """
+        Counts one more position, and stops the search if the budget
+        is spent.
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise _OutOfBudget
+        if self._deadline is not None and self.nodes % _CLOCK_EVERY == 0 \
+           and time.perf_counter() > self._deadline:
+            raise _OutOfBudget
+
+    def _scores(self) -> tuple[int, ...]:
+        """
+        Returns the score of every player as the game stands.
+        """
+        game = self._game
+        return tuple(game.get_score(p)
+                     for p in range(1, game.num_players + 1))
+
+    def _value(self, scores: tuple[int, ...]) -> float:
+        """
+        Returns the lead of the root player over the best of the others.
+        """
+        root = self._root - 1
+        others = [s for p, s in enumerate(scores) if p != root]
+        if not others:
+            return float(scores[root])
+        return float(scores[root] - max(others))
+
+    def _moves(self, hint: int) -> list[int]:
+        """
+        Returns the moves of the player to move, as placement ids (or
+        NO_MOVE alone, if they can only retire), best first: the hint,
+        then the largest shapes.
+        """
+        game = self._game
+        table = placements_for(game.size)
+        #the live lists are on through the search (see solve)
+        ids = game.live_move_ids()
+        if not ids:
+            return [NO_MOVE]
+        return sorted(ids, key=lambda i: (i != hint,
+                                          -SHAPE_SIZES[table.kind(i)], i))
+
+    def _play(self, move: Optional[Placement]) -> None:
+        """
+        Plays a move of the line (None to retire).
+        """
+        if move is None:
+            self._game.retire()
+        else:
+            assert self._game.push(move)
+
+    def _play_id(self, move: int) -> None:
+        """
+        Plays a move given as a placement id (NO_MOVE to retire).
+        """
+        if move == NO_MOVE:
+            self._game.retire()
+        else:
+            table = placements_for(self._game.size)
+            assert self._game.push(table.placement(move))
+
+    def _paranoid(self, depth: int, alpha: float,
+                  beta: float) -> tuple[float, bool]:
+        """
+        Returns the value of the position for the root player, searched
+        depth moves ahead, and whether every line reached the end of
+        the game.
+        """
+        self._tick()
+        game = self._game
+        if game.game_over:
+            return self._value(self._scores()), True
+        if depth == 0:
+            return self._value(self._scores()), False
+
+        key = game.zobrist
+        hint = NO_MOVE
+        entry = self.table.probe(key)
+        if entry is not None:
+            stored, value, bound, hint = entry
+            if stored >= depth:
+                if bound == EXACT \
+                   or (bound == LOWER and value >= beta) \
+                   or (bound == UPPER and value <= alpha):
+                    return value, stored == _PROVEN
+
+        maximize = game.curr_player == self._root
+        start_alpha, start_beta = alpha, beta
+        best = -float("inf") if maximize else float("inf")
+        best_move = NO_MOVE
+        proven = True
+        for move in self._moves(hint):
+            self._play_id(move)
+            try:
+                value, exact = self._paranoid(depth - 1, alpha, beta)
+            finally:
+                game.pop()
+            proven = proven and exact
+            if maximize and value > best:
+                best, best_move = value, move
+                alpha = max(alpha, value)
+            elif not maximize and value < best:
+                best, best_move = value, move
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= start_alpha:
+            bound = UPPER
+        elif best >= start_beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, _PROVEN if proven else depth, best, bound,
+                         best_move)
+        return best, proven
+
+    def _search_maxn(self, depth: int) -> tuple[tuple[int, ...], bool]:
+        """
+        Returns the scores at the end of the line where every player
+        maximizes their own score, searched depth moves ahead, and
+        whether every line reached the end of the game. Ties go to the
+        line leaving the other players the fewest points.
+        """
+        self._tick()
+        game = self._game
+        if game.game_over:
+            return self._scores(), True
+        if depth == 0:
+            return self._scores(), False
+
+        key = game.zobrist
+        hint = NO_MOVE
+        found = self._maxn.get(key)
+        if found is not None:
+            stored, scores, hint = found
+            if stored >= depth:
+                return scores, stored == _PROVEN
+
+        player = game.curr_player - 1
+        best: Optional[tuple[int, ...]] = None
+        best_move = NO_MOVE
+        proven = True
+        for move in self._moves(hint):
+            self._play_id(move)
+            try:
+                scores, exact = self._search_maxn(depth - 1)
+            finally:
+                game.pop()
+            proven = proven and exact
+            if best is None or (scores[player], -sum(scores)) \
+                    > (best[player], -sum(best)):
+                best, best_move = scores, move
+
+        assert best is not None
+        self._maxn[key] = (_PROVEN if proven else depth, best, best_move)
+        return best, proven
+
+    def _line(self, mode: str, depth: int) -> list[Optional[Placement]]:
+        """
+        Returns the best line found, following the best move stored
+        for each position from the root. If the search could not
+        complete even one move ahead, the line is the first move in
+        order.
+        """
+        game = self._game
+        table = placements_for(game.size)
+        line: list[Optional[Placement]] = []
+        while not game.game_over:
+            move: Optional[int] = None
+            if mode == "paranoid":
+                entry = self.table.probe(game.zobrist)
+                if entry is not None:
+                    move = entry[3]
+            else:
+                found = self._maxn.get(game.zobrist)
+                if found is not None:
+                    move = found[2]
+            if move is None and not line and depth == 0:
+                move = self._moves(NO_MOVE)[0]
+            if move is None:
+                break
+            line.append(None if move == NO_MOVE
+                        else table.placement(move))
+            self._play_id(move)
+        for _ in line:
+            game.pop()
+        return line
@@ -0,0 +1,242 @@
+"""
+Territory and reachability analysis of a Blokus game.
+
+A square is free for a player when it is empty and does not share an
+edge with one of their pieces: only free squares can ever be covered
+by that player. The free squares fall into regions, the groups of free
+squares connected through edges or corners (8-connected). A player can
+still reach a region if one of their open corners is in it, since every
+later piece of theirs grows out of those corners through free squares.
+
+The regions of every player are kept as bitboard masks (see
+bitboard.py), and flood fills are a few shifts per step. Territory
+listens to the game (see events.py): after a placement, or after one is
+undone, only the regions touching the squares that changed are flooded
+again, for each player; the rest are kept as they were.
+
+The results are given as (size x size) NumPy arrays: the squares each
+player can reach, the squares only one player can reach (their
+exclusive territory) and the squares several players can reach
+(contested territory).
+"""
+from typing import Optional
+
+import numpy as np
+
+from shape_definitions import ShapeKind
+from piece import Point
+from bitboard import Bitboard
+from blokus import Blokus
+from events import BlokusListener
+
+
+def around(board: Bitboard, mask: int) -> int:
+    """
+    Returns the squares of a mask together with every square sharing
+    an edge or a corner with it.
+    """
+    stride = board.stride
+    wide = mask | (mask << 1) | (mask >> 1)
+    return (wide | (wide << stride) | (wide >> stride)) & board.full
+
+
+def flood(board: Bitboard, seed: int, free: int) -> int:
+    """
+    Returns the free squares connected to the seed squares (through
+    edges or corners) by free squares, including the free seeds.
+    """
+    region = seed & free
+    while True:
+        grown = around(board, region) & free
+        if grown == region:
+            return region
+        region = grown
+
+
+def split(board: Bitboard, free: int) -> list[int]:
+    """
+    Returns the regions (8-connected groups) of the given squares.
+    """
+    regions = []
+    while free:
+        region = flood(board, free & -free, free)
+        regions.append(region)
+        free &= ~region
+    return regions
+
+
+class Territory(BlokusListener):
+    """
+    The regions of free squares of every player of a Blokus game,
+    kept up to date as the game is played (and undone).
+
+    regions[player] lists the regions of the squares free for that
+    player, as bitboard masks, whether the player can reach them or not.
+    """
+
+    game: Blokus
+    regions: dict[int, list[int]]
+
+    def __init__(self, game: Blokus) -> None:
+        """
+        Constructor. Finds the regions of every player, and listens to
+        the game from then on (until close is called).
+        """
+        self.game = game
+        self.regions = {}
+        self._rebuild()
+        game.add_listener(self)
+
+    def close(self) -> None:
+        """
+        Stops following the game.
+        """
+        self.game.remove_listener(self)
+
+    def _free(self, player: int) -> int:
+        """
+        Returns the mask of the squares free for a player.
+        """
+        board = self.game.board
+        return board.full & ~board.occupied \
+            & ~board.edges(board.players[player])
+
+    def _rebuild(self) -> None:
+        """
+        Finds the regions of every player from scratch.
+        """
+        board = self.game.board
+        for player in board.players:
+            self.regions[player] = split(board, self._free(player))
+
+    def _refresh(self, player: int, changed: int) -> None:
+        """
+        Floods again the regions of a player that touch the given
+        squares, whose freedom has changed. A region that touches none
+        of them cannot have been split or joined to another one.
+        """
+        board = self.game.board
+        free = self._free(player)
+        near = around(board, changed)
+        kept = []
+        stale = changed & free
+        for region in self.regions[player]:
+            if region & near:
+                stale |= region
+            else:
+                kept.append(region)
+        self.regions[player] = kept + split(board, stale & free)
+
+    #
+    # EVENTS
+    #
+
+    def on_place(self, player: int, kind: ShapeKind,
+                 cells: list[Point]) -> None:
+        board = self.game.board
+        mask = board.mask(cells)
+        assert mask is not None
+        for other in self.regions:
+            if other == player:
+                self._refresh(other, mask | board.edges(mask))
+            else:
+                self._refresh(other, mask)
+
+    def on_undo(self, player: int, kind: Optional[ShapeKind],
+                cells: list[Point]) -> None:
+        if kind is not None:
+            self.on_place(player, kind, cells)
+
+    def on_restore(self) -> None:
+        self._rebuild()
+
+    #
+    # QUERIES
+    #
+
+    def reachable_mask(self, player: int) -> int:
+        """
+        Returns the mask of the squares a player can still reach: the
+        regions holding one of their open corners. Players who are no
+        longer playing (retired, or out of shapes) reach nothing.
+        """
+        game = self.game
+        if player not in game.active_players:
+            return 0
+        corners = game.open_corners_mask(player)
+        reach = 0
+        for region in self.regions[player]:
+            if region & corners:
+                reach |= region
+        return reach
+
+    def reachable(self, player: int) -> np.ndarray:
+        """
+        Returns the squares a player can still reach, as a
+        (size x size) array of booleans.
+        """
+        return self.game.board.to_array(self.reachable_mask(player))
+
+    def reachable_regions(self, player: int) -> np.ndarray:
+        """
+        Returns the regions a player can still reach, as a (size x size)
+        array of region numbers (from 1, largest region first), with 0
+        for the squares they cannot reach.
+        """
+        game = self.game
+        board = game.board
+        labels = np.zeros((board.size, board.size), dtype=np.int16)
+        if player not in game.active_players:
+            return labels
+        corners = game.open_corners_mask(player)
+        reached = sorted((region for region in self.regions[player]
+                          if region & corners),
+                         key=lambda region: -region.bit_count())
+        for number, region in enumerate(reached, 1):
+            labels[board.to_array(region)] = number
+        return labels
+
+    def potential(self, player: int) -> int:
+        """
+        Returns the most squares a player could still cover: the
+        squares they can reach, but no more than the squares of the
+        shapes they have left.
+        """
+        return min(self.reachable_mask(player).bit_count(),
+                   self.game.remaining_squares(player))
+
+    def _counts(self) -> tuple[int, int]:
+        """
+        Returns the masks of the squares reached by at least one
+        player, and by at least two.
+        """
+        once = 0
+        twice = 0
+        for player in self.regions:
+            reach = self.reachable_mask(player)
+            twice |= once & reach
+            once |= reach
+        return once, twice
+
+    def exclusive(self) -> np.ndarray:
+        """
+        Returns the exclusive territory of every player: a (size x size)
+        array holding, on each square that only one player can reach,
+        that player's number, and 0 on the other squares.
+        """
+        board = self.game.board
+        _, twice = self._counts()
+        owners = np.zeros((board.size, board.size), dtype=np.int8)
+        for player in self.regions:
+            owned = self.reachable_mask(player) & ~twice
+            owners[board.to_array(owned)] = player
+        return owners
+
+    def contested(self) -> np.ndarray:
+        """
+        Returns the contested territory: a (size x size) array of
+        booleans, true on the squares that two players or more can
+        reach.
+        """
+        _, twice = self._counts()
+        return self.game.board.to_array(twice)
@@ -0,0 +1,215 @@
+"""
+Transposition table for game-tree search over Blokus positions.
+
+Positions are looked up by their Zobrist hash (Blokus.zobrist), so a
+search that reaches the same position through a different move order
+can reuse what it already found there.
+
+The table is a fixed number of two-slot buckets stored in NumPy arrays,
+sized from a memory cap. The first slot of a bucket keeps the deepest
+result of the current search (depth-preferred); the second one always
+takes the newest result that did not fit in the first. Entries left by
+an earlier search (see new_search) are replaced first.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Bound types: the stored value is exact, or only a lower/upper bound
+# on the true value (after a beta/alpha cutoff).
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Marks an unused slot (in the bound array) and a missing best move
+_EMPTY = -1
+NO_MOVE = -1
+
+# A stored entry: (depth, value, bound, best move)
+Entry = tuple[int, float, int, int]
+
+# Bytes per slot: key, value, best move, depth, bound, age
+ENTRY_BYTES = 8 + 8 + 4 + 1 + 1 + 1
+
+
+class TranspositionTable:
+    """
+    A bounded transposition table.
+
+    Best moves are stored as ints chosen by the caller (NO_MOVE when
+    there is none), so that entries stay fixed-size.
+    """
+
+    max_bytes: int
+    num_buckets: int
+    probes: int
+    hits: int
+    stores: int
+    overwrites: int
+    _age: int
+    _keys: np.ndarray
+    _values: np.ndarray
+    _moves: np.ndarray
+    _depths: np.ndarray
+    _bounds: np.ndarray
+    _ages: np.ndarray
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        """
+        Constructor
+
+            max_bytes: Upper bound on the memory used by the entries.
+                       The number of buckets is the largest power of
+                       two that fits, and at least one.
+
+        Raises ValueError if max_bytes is not positive.
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.max_bytes = max_bytes
+
+        buckets = max(1, max_bytes // (2 * ENTRY_BYTES))
+        self.num_buckets = 1 << (buckets.bit_length() - 1)
+
+        shape = (self.num_buckets, 2)
+        self._keys = np.zeros(shape, dtype=np.uint64)
+        self._values = np.zeros(shape, dtype=np.float64)
+        self._moves = np.full(shape, NO_MOVE, dtype=np.int32)
+        self._depths = np.zeros(shape, dtype=np.int8)
+        self._bounds = np.full(shape, _EMPTY, dtype=np.int8)
+        self._ages = np.zeros(shape, dtype=np.uint8)
+        self._age = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def __len__(self) -> int:
+        """
+        Returns the number of slots in use.
+        """
+        return int(np.count_nonzero(self._bounds != _EMPTY))
+
+    @property
+    def capacity(self) -> int:
+        """
+        Returns the number of slots in the table.
+        """
+        return 2 * self.num_buckets
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns the fraction of probes that found their position
+        (0.0 if there were no probes).
+        """
+        if self.probes == 0:
+            return 0.0
+        return self.hits / self.probes
+
+    def new_search(self) -> None:
+        """
+        Starts a new search. Entries stored before this call are
+        still found by probe, but are the first to be replaced.
+        """
+        self._age = (self._age + 1) % 256
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the statistics.
+        """
+        self._bounds.fill(_EMPTY)
+        self._moves.fill(NO_MOVE)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def _slot(self, bucket: int, key: np.uint64) -> Optional[int]:
+        """
+        Returns the slot of the bucket that holds the key, if any.
+        """
+        for slot in (0, 1):
+            if self._bounds[bucket, slot] != _EMPTY \
+               and self._keys[bucket, slot] == key:
+                return slot
+        return None
+
+    def probe(self, key: int) -> Optional[Entry]:
+        """
+        Returns the (depth, value, bound, best move) stored for the
+        position with the given hash, or None if there is none.
+        """
+        self.probes += 1
+        bucket = key & (self.num_buckets - 1)
+        slot = self._slot(bucket, np.uint64(key))
+        if slot is None:
+            return None
+        self.hits += 1
+        return (
+            int(self._depths[bucket, slot]),
+            float(self._values[bucket, slot]),
+            int(self._bounds[bucket, slot]),
+            int(self._moves[bucket, slot]),
+        )
+
+    def store(self, key: int, depth: int, value: float, bound: int,
+              move: int = NO_MOVE) -> None:
+        """
+        Stores the result of searching the position with the given
+        hash to the given depth (at most 127).
+
+        A result for a position already in the table replaces the
+        old one, unless the old one is deeper and from the current
+        search. Otherwise the new result goes in the depth-preferred
+        slot if it is at least as deep as what is there (or what is
+        there is from an earlier search), pushing the old entry to
+        the always-replace slot; if not, it goes in the always-replace
+        slot.
+
+        Raises ValueError if depth is not between 0 and 127.
+        """
+        if not 0 <= depth <= 127:
+            raise ValueError("depth must be between 0 and 127")
+        self.stores += 1
+        bucket = key & (self.num_buckets - 1)
+        k = np.uint64(key)
+
+        slot = self._slot(bucket, k)
+        if slot is not None:
+            if self._ages[bucket, slot] == self._age \
+               and self._depths[bucket, slot] > depth:
+                return
+            if move == NO_MOVE:
+                move = int(self._moves[bucket, slot])
+        else:
+            used = self._bounds[bucket, 0] != _EMPTY
+            stale = used and self._ages[bucket, 0] != self._age
+            if not used or stale or depth >= self._depths[bucket, 0]:
+                slot = 0
+                if stale:
+                    self.overwrites += 1
+                elif used:
+                    self._copy_slot(bucket, 0, 1)
+            else:
+                slot = 1
+                if self._bounds[bucket, 1] != _EMPTY:
+                    self.overwrites += 1
+
+        self._keys[bucket, slot] = k
+        self._values[bucket, slot] = value
+        self._moves[bucket, slot] = move
+        self._depths[bucket, slot] = depth
+        self._bounds[bucket, slot] = bound
+        self._ages[bucket, slot] = self._age
+
+    def _copy_slot(self, bucket: int, src: int, dst: int) -> None:
+        """
+        Copies one slot of a bucket over the other.
+        """
+        if self._bounds[bucket, dst] != _EMPTY:
+            self.overwrites += 1
+        for array in (self._keys, self._values, self._moves, self._depths,
+                      self._bounds, self._ages):
+            array[bucket, dst] = array[bucket, src]
@@ -0,0 +1,96 @@
+"""
+Zobrist keys for Blokus positions.
+
+A position is hashed by XOR-ing together one 64-bit key for each fact
+that describes it: which player covers each square, whose turn it is,
+which shapes each player has left, which players have retired, and
+which players played the "1" piece last (which decides their bonus).
+Since XOR is its own inverse, a move updates the hash by XOR-ing in
+only the keys of the facts it changes.
+
+The keys are derived from a fixed seed with the SplitMix64 mixing
+function, rather than from random or hash(), so every process (and
+every machine) computes the same keys, and hashes can be shared
+between workers.
+"""
+from shape_definitions import ShapeKind
+
+MASK64 = (1 << 64) - 1
+SEED = 0x426C6F6B7573  # "Blokus"
+
+# Tags that keep the keys of different kinds of facts apart
+_SQUARE = 1
+_TURN = 2
+_SHAPE = 3
+_RETIRED = 4
+_BONUS = 5
+
+
+def splitmix64(x: int) -> int:
+    """
+    Returns the SplitMix64 mix of a 64-bit integer.
+    """
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def _key(tag: int, player: int, item: int) -> int:
+    """
+    Returns the key of one fact about one player.
+    """
+    return splitmix64(SEED ^ (tag << 56) ^ (player << 48) ^ item)
+
+
+class ZobristKeys:
+    """
+    All the keys needed to hash positions on a (size x size) board.
+
+    squares[player][r * size + c] is the key of the player covering
+    the square (r, c); turn, retired and bonus map a player to the key
+    of it being their turn, of them having retired, and of their last
+    piece being the "1" piece; shapes[player][kind] is the key of the
+    player still having that shape.
+    """
+
+    size: int
+    squares: dict[int, list[int]]
+    turn: dict[int, int]
+    shapes: dict[int, dict[ShapeKind, int]]
+    retired: dict[int, int]
+    bonus: dict[int, int]
+
+    def __init__(self, size: int) -> None:
+        """
+        Constructor
+
+            size: Number of squares on each side of the board
+        """
+        self.size = size
+        self.squares = {}
+        self.turn = {}
+        self.shapes = {}
+        self.retired = {}
+        self.bonus = {}
+        for player in range(1, 5):
+            self.squares[player] = [_key(_SQUARE, player, i)
+                                    for i in range(size * size)]
+            self.turn[player] = _key(_TURN, player, 0)
+            self.shapes[player] = {kind: _key(_SHAPE, player, i)
+                                   for i, kind in enumerate(ShapeKind)}
+            self.retired[player] = _key(_RETIRED, player, 0)
+            self.bonus[player] = _key(_BONUS, player, 0)
+
+
+_KEYS: dict[int, ZobristKeys] = {}
+
+
+def keys_for(size: int) -> ZobristKeys:
+    """
+    Returns the keys for a board of the given size, shared by every
+    game of that size in the process.
+    """
+    if size not in _KEYS:
+        _KEYS[size] = ZobristKeys(size)
+    return _KEYS[size]
@@ -0,0 +1,7 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def t_no_disk_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep the placement tables built by the tests off the disk (see
+    placements.cache_dir); test_disk_cache points the cache elsewhere"""
+    monkeypatch.setenv("BLOKUS_CACHE_DIR", "")
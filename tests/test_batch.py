@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from blokus import Blokus
+from batch import Batch
+
+def t_corners() -> set[tuple[int, int]]:
+    """Start positions of a 4-player game on a 10x10 board"""
+    return {(0, 0), (9, 9), (0, 9), (9, 0)}
+
+def t_mirror(batch: Batch, policy: str) -> None:
+    """Play a batch to the end, playing the same moves in one Blokus game
+    (with auto_pass) per batch game, and check that the legal moves, the
+    current players and the scores always agree. (A batch retires a stuck
+    player on their turn, where Blokus does it as soon as the turn before
+    ends, so the games are only compared when the batch player can move.)"""
+    table = batch.geometry.table
+    games = [Blokus(batch.num_players, batch.size, t_corners(),
+                    auto_pass=True) for _ in range(batch.count)]
+    while not batch.over.all():
+        for k, blokus in enumerate(games):
+            ids = batch.legal_ids(k)
+            if len(ids):
+                assert not blokus.game_over
+                assert batch.curr[k] == blokus.curr_player
+                legal = {table.placement(i) for i in ids}
+                assert legal == blokus.available_placements()
+        played = batch.step(policy)
+        for k, blokus in enumerate(games):
+            if played[k] >= 0:
+                assert blokus.maybe_place(table.placement(played[k]))
+    for k, blokus in enumerate(games):
+        assert blokus.game_over
+        assert list(batch.scores()[k]) \
+            == [blokus.get_score(p) for p in range(1, 5)]
+        assert {p + 1 for p in np.flatnonzero(batch.winners()[k])} \
+            == set(blokus.winners or [])
+
+def test_random_games_match_blokus() -> None:
+    """Test that random batch games follow the rules of Blokus"""
+    t_mirror(Batch(3, 4, 10, t_corners(), seed=1), "random")
+
+def test_greedy_games_match_blokus() -> None:
+    """Test that greedy batch games follow the rules of Blokus, and always
+    play one of the largest shapes they can"""
+    batch = Batch(2, 4, 10, t_corners(), seed=2)
+    sizes = batch.geometry.sizes[batch.geometry.table.kinds]
+    while not batch.over.all():
+        legal = [batch.legal_ids(k) for k in range(2)]
+        played = batch.step("greedy")
+        for k in range(2):
+            if played[k] >= 0:
+                assert sizes[played[k]] == sizes[legal[k]].max()
+    t_mirror(Batch(2, 4, 10, t_corners(), seed=2), "greedy")
+
+def test_run_and_seeds() -> None:
+    """Test that run plays every game to the end, and that the same seed
+    plays the same games"""
+    first = Batch(8, 2, 8, {(0, 0), (7, 7)}, seed=5)
+    second = Batch(8, 2, 8, {(0, 0), (7, 7)}, seed=5)
+    moves = first.run()
+    assert moves == second.run() == first.moves > 0
+    assert first.over.all()
+    assert (first.owner == second.owner).all()
+    with pytest.raises(ValueError):
+        first.step("clever")
+    with pytest.raises(ValueError):
+        Batch(0, 2, 8, {(0, 0), (7, 7)})
@@ -0,0 +1,87 @@
+from shape_definitions import ShapeKind
+from piece import Piece
+from bitboard import Bitboard
+from blokus import Blokus
+
+def test_mask_and_points() -> None:
+    """Test that points are packed into a mask and unpacked in row-major
+    order, and that points beyond the board have no mask"""
+    board = Bitboard(2, 5)
+    mask = board.mask([(4, 4), (0, 0), (2, 3)])
+    assert mask is not None
+    assert board.points(mask) == [(0, 0), (2, 3), (4, 4)]
+    assert board.mask([(0, 0), (0, 5)]) is None
+    assert board.mask([(-1, 0)]) is None
+    assert board.point(board.index((3, 2))) == (3, 2)
+
+def test_edges_do_not_wrap() -> None:
+    """Test that the edge neighbors of squares on the left and right columns
+    do not wrap around to the neighboring rows"""
+    board = Bitboard(1, 5)
+    mask = board.mask([(2, 4)])
+    assert mask is not None
+    assert set(board.points(board.edges(mask))) == {(1, 4), (3, 4), (2, 3)}
+
+    mask = board.mask([(0, 0)])
+    assert mask is not None
+    assert set(board.points(board.edges(mask))) == {(0, 1), (1, 0)}
+
+def test_corners() -> None:
+    """Test that the corner neighbors of a piece exclude the piece itself and
+    its edge neighbors"""
+    board = Bitboard(1, 5)
+    mask = board.mask([(1, 1), (1, 2)])
+    assert mask is not None
+    assert set(board.points(board.corners(mask))) == {(0, 0), (2, 0), (0, 3),
+                                                      (2, 3)}
+
+    mask = board.mask([(0, 4)])
+    assert mask is not None
+    assert board.points(board.corners(mask)) == [(1, 3)]
+
+def test_place_and_to_grid() -> None:
+    """Test that placing a piece updates the occupancy masks and the grid"""
+    board = Bitboard(2, 5)
+    mask = board.mask([(0, 0), (0, 1)])
+    assert mask is not None
+    board.place(2, ShapeKind.TWO, mask)
+    assert board.occupied == mask
+    assert board.players[2] == mask
+    assert board.players[1] == 0
+
+    grid = board.to_grid()
+    assert grid[0][0] == (2, ShapeKind.TWO)
+    assert grid[0][1] == (2, ShapeKind.TWO)
+    assert sum(cell is not None for row in grid for cell in row) == 2
+
+def test_grid_view_in_sync() -> None:
+    """Test that the grid of a game stays correct whether it is built before
+    or after pieces are placed"""
+    early = Blokus(1, 5, {(0, 0)})
+    late = Blokus(1, 5, {(0, 0)})
+    assert early.grid == [[None] * 5 for _ in range(5)]
+
+    for blokus in (early, late):
+        piece = Piece(blokus.shapes[ShapeKind.TWO])
+        piece.set_anchor((0, 0))
+        assert blokus.maybe_place(piece)
+        piece = Piece(blokus.shapes[ShapeKind.ONE])
+        piece.set_anchor((1, 2))
+        assert blokus.maybe_place(piece)
+
+    assert early.grid == late.grid
+    assert late.grid[1][2] == (1, ShapeKind.ONE)
+    assert (0, 1) not in late.empty_locations
+
+def test_rotated_piece_mask_is_int() -> None:
+    """Test that the mask of a rotated piece near the far corner of a large
+    board is a plain int covering the rotated squares, so that squares past
+    the 64th bit are not lost"""
+    blokus = Blokus(1, 20, {(0, 0)})
+    piece = Piece(blokus.shapes[ShapeKind.FOUR])
+    piece.set_anchor((17, 18))
+    piece.rotate_right()
+    mask = blokus._board.mask(piece.squares())
+    assert isinstance(mask, int)
+    assert blokus._board.points(mask) == [(16, 18), (17, 18), (18, 18),
+                                          (19, 18)]
@@ -1,11 +1,16 @@
 from typing import Optional
+import os
+import random
+import subprocess
+import sys
 import pytest
 
 import shape_definitions
 from shape_definitions import ShapeKind
-from piece import Shape, Piece
+from piece import Point, Shape, Piece, Placement, ORIENTATIONS
 from base import BlokusBase
-from blokus import Blokus
+from blokus import Blokus, largest_first, smallest_first
+from zobrist import keys_for
 
 def test_inheritance() -> None:
     """Test that Blokus inherits from BlokusBase"""
@@ -660,3 +665,701 @@ def test_20_points() -> None:
     assert blokus.game_over
     assert blokus.get_score(1) == 20
     assert blokus.winners == [1]
+
+def t_frontier_from_grid(blokus: Blokus,
+                         player: int) -> tuple[set[Point], set[Point]]:
+    """Compute the open corners and forbidden squares of a player by looking
+    at every square of the grid. Helper for the frontier tests."""
+    grid = blokus.grid
+    size = blokus.size
+    own = set()
+    for r in range(size):
+        for c in range(size):
+            cell = grid[r][c]
+            if cell is not None and cell[0] == player:
+                own.add((r, c))
+    if not own:
+        starts = {(r, c) for r, c in blokus.start_positions
+                  if grid[r][c] is None}
+        return starts, set()
+
+    forbidden = set()
+    corners = set()
+    for r, c in own:
+        for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            forbidden.add((r + dr, c + dc))
+        for dr, dc in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            corners.add((r + dr, c + dc))
+    on_board = {(r, c) for r in range(size) for c in range(size)}
+    forbidden = (forbidden & on_board) - own
+    corners = {(r, c) for r, c in corners & on_board
+               if grid[r][c] is None and (r, c) not in forbidden}
+    return corners, forbidden
+
+def test_frontier_before_first_move() -> None:
+    """Test that before their first move, a player's open corners are the
+    start positions, and that a start position covered by another player is
+    no longer open"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9), (4, 9)})
+    assert blokus.open_corners(1) == {(4, 4), (9, 9), (4, 9)}
+    assert blokus.forbidden_squares(2) == set()
+
+    piece = Piece(blokus.shapes[ShapeKind.ONE])
+    piece.set_anchor((9, 9))
+    assert blokus.maybe_place(piece)
+    assert blokus.open_corners(2) == {(4, 4), (4, 9)}
+    assert blokus.open_corners(1) == {(8, 8), (8, 10), (10, 8), (10, 10)}
+    assert blokus.forbidden_squares(1) == {(8, 9), (10, 9), (9, 8), (9, 10)}
+
+def test_frontier_matches_grid() -> None:
+    """Test that the frontier kept by maybe_place matches the one computed
+    from the grid during a two-player game"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)})
+    for _ in range(16):
+        moves = blokus.available_moves()
+        if not moves:
+            break
+        piece = min(moves, key=lambda p: (-len(p.squares()), p.shape.kind.value,
+                                          sorted(p.squares())))
+        assert blokus.maybe_place(piece)
+        for player in (1, 2):
+            corners, forbidden = t_frontier_from_grid(blokus, player)
+            assert blokus.open_corners(player) == corners
+            assert blokus.forbidden_squares(player) == forbidden
+    assert len(blokus.remaining_shapes(1)) < 21
+
+def t_all_placements(blokus: Blokus) -> set:
+    """Find every legal placement for the current player by trying every
+    orientation of every remaining shape at every anchor on the board.
+    Helper for the available_moves tests."""
+    found = set()
+    for kind in blokus.remaining_shapes(blokus.curr_player):
+        for face_up in (True, False):
+            for rotation in range(4):
+                for r in range(-2, blokus.size + 2):
+                    for c in range(-2, blokus.size + 2):
+                        piece = Piece(blokus.shapes[kind], face_up, rotation)
+                        piece.set_anchor((r, c))
+                        if blokus.legal_to_place(piece):
+                            found.add((kind, frozenset(piece.squares())))
+    return found
+
+def test_available_moves_all_orientations() -> None:
+    """Test that available_moves finds every legal placement, including
+    flipped and rotated ones, and lists each of them exactly once"""
+    blokus = Blokus(2, 7, {(0, 0), (6, 6)})
+    for _ in range(5):
+        moves = blokus.available_moves()
+        if not moves:
+            break
+        placements = [(p.shape.kind, frozenset(p.squares())) for p in moves]
+        assert len(placements) == len(set(placements))
+        assert set(placements) == t_all_placements(blokus)
+
+        piece = max(moves, key=lambda p: (len(p.squares()),
+                                          sorted(p.squares())))
+        assert blokus.maybe_place(piece)
+
+def test_available_moves_symmetric_shapes() -> None:
+    """Test that symmetric shapes are not listed once per orientation"""
+    blokus = Blokus(1, 11, {(5, 5)})
+    moves = blokus.available_moves()
+    by_kind: dict[ShapeKind, int] = {}
+    for p in moves:
+        by_kind[p.shape.kind] = by_kind.get(p.shape.kind, 0) + 1
+    assert by_kind[ShapeKind.ONE] == 1
+    assert by_kind[ShapeKind.LETTER_O] == 4
+    assert by_kind[ShapeKind.X] == 5
+    assert by_kind[ShapeKind.FIVE] == 10
+    assert by_kind[ShapeKind.L] == 40
+
+def test_orientation_table() -> None:
+    """Test that the orientation table has the distinct orientations of each
+    shape, with the 91 canonical ones needed to list every placement"""
+    counts = {ShapeKind.ONE: 1, ShapeKind.X: 1, ShapeKind.LETTER_O: 4,
+              ShapeKind.TWO: 4, ShapeKind.FIVE: 2, ShapeKind.F: 8}
+    for kind, orientations in ORIENTATIONS.items():
+        assert 1 <= len(orientations) <= 8
+        assert [o.id for o in orientations] == list(range(len(orientations)))
+        assert len({frozenset(o.squares) for o in orientations}) \
+            == len(orientations)
+        if kind in counts:
+            assert len(orientations) == counts[kind]
+    assert sum(o.canonical for os in ORIENTATIONS.values() for o in os) == 91
+
+def test_orientation_neighbors() -> None:
+    """Test the edge and corner offsets of an orientation"""
+    two = ORIENTATIONS[ShapeKind.TWO][0]
+    assert two.squares == ((0, 0), (0, 1))
+    assert set(two.edges) == {(-1, 0), (-1, 1), (0, -1), (0, 2), (1, 0),
+                              (1, 1)}
+    assert set(two.corners) == {(-1, -1), (-1, 2), (1, -1), (1, 2)}
+
+def test_orientation_ids_follow_transforms() -> None:
+    """Test that pieces built from an orientation id match pieces built by
+    flipping and rotating, and that the transition ids are consistent"""
+    blokus = t_blokus_mini(1)
+    for kind, orientations in ORIENTATIONS.items():
+        for o in orientations:
+            piece = Piece(blokus.shapes[kind], o.face_up, o.rotation)
+            piece.set_anchor((2, 2))
+            assert piece.orientation == o.id
+            assert piece.squares() == [(2 + r, 2 + c) for r, c in o.squares]
+
+            same = Piece(blokus.shapes[kind], orientation=o.id)
+            same.set_anchor((2, 2))
+            assert same.squares() == piece.squares()
+
+            piece.flip_horizontally()
+            assert piece.orientation == o.flipped
+            piece.flip_horizontally()
+            piece.rotate_left()
+            assert piece.orientation == o.rotated_left
+            piece.rotate_right()
+            piece.rotate_right()
+            assert piece.orientation == o.rotated_right
+
+def t_state(blokus: Blokus) -> tuple:
+    """Collect everything about a game that a move can change. Helper for the
+    push/pop tests."""
+    players = range(1, blokus.num_players + 1)
+    return (
+        [row[:] for row in blokus.grid],
+        blokus.curr_player,
+        set(blokus.retired_players),
+        [blokus.remaining_shapes(p) for p in players],
+        [blokus._last_move[p] for p in players],
+        [blokus.open_corners(p) for p in players],
+        [blokus.forbidden_squares(p) for p in players],
+        set(blokus.empty_locations),
+        [blokus.get_score(p) for p in players],
+        blokus.game_over,
+        blokus.zobrist,
+    )
+
+def test_push_pop_restores_state() -> None:
+    """Test that popping every move of a game, including retirements, brings
+    the game back through exactly the same states in reverse"""
+    blokus = Blokus(3, 10, {(0, 0), (9, 9), (0, 9)})
+    states = [t_state(blokus)]
+    while not blokus.game_over:
+        moves = blokus.available_moves()
+        if moves:
+            piece = max(moves, key=lambda p: (len(p.squares()),
+                                              sorted(p.squares())))
+            assert blokus.push(piece)
+        else:
+            blokus.retire()
+        states.append(t_state(blokus))
+
+    for state in reversed(states[:-1]):
+        blokus.pop()
+        assert t_state(blokus) == state
+
+    with pytest.raises(ValueError):
+        blokus.pop()
+
+def test_push_illegal_piece() -> None:
+    """Test that pushing an illegal piece changes nothing, so there is nothing
+    to pop"""
+    blokus = t_blokus_mini(1)
+    piece = Piece(blokus.shapes[ShapeKind.ONE])
+    piece.set_anchor((1, 1))
+    assert not blokus.push(piece)
+    with pytest.raises(ValueError):
+        blokus.pop()
+
+def t_place(blokus: Blokus, kind: ShapeKind, anchor: tuple[int, int]) -> None:
+    """Place an unrotated piece, which must be legal. Helper for the hashing
+    tests."""
+    piece = Piece(blokus.shapes[kind])
+    piece.set_anchor(anchor)
+    assert blokus.maybe_place(piece)
+
+def t_zobrist_from_scratch(blokus: Blokus) -> int:
+    """Compute the hash of a position from the grid and the game state.
+    Helper for the hashing tests."""
+    keys = keys_for(blokus.size)
+    h = keys.turn[blokus.curr_player]
+    for r, row in enumerate(blokus.grid):
+        for c, cell in enumerate(row):
+            if cell is not None:
+                h ^= keys.squares[cell[0]][r * blokus.size + c]
+    for player in range(1, blokus.num_players + 1):
+        for kind in blokus.remaining_shapes(player):
+            h ^= keys.shapes[player][kind]
+        if player in blokus.retired_players:
+            h ^= keys.retired[player]
+        if blokus._last_move[player] == ShapeKind.ONE:
+            h ^= keys.bonus[player]
+    return h
+
+def test_zobrist_transpositions() -> None:
+    """Test that the same position reached through different move orders has
+    the same hash, and that the hash is kept up to date by every move"""
+    first = Blokus(2, 14, {(4, 4), (9, 9)})
+    second = Blokus(2, 14, {(4, 4), (9, 9)})
+    assert first.zobrist == second.zobrist
+    assert first.zobrist == t_zobrist_from_scratch(first)
+
+    for blokus in (first, second):
+        t_place(blokus, ShapeKind.ONE, (4, 4))
+        t_place(blokus, ShapeKind.ONE, (9, 9))
+    moves = [(ShapeKind.TWO, (5, 5)), (ShapeKind.TWO, (10, 10)),
+             (ShapeKind.C, (2, 3)), (ShapeKind.C, (7, 10))]
+    for kind, anchor in moves:
+        t_place(first, kind, anchor)
+        assert first.zobrist == t_zobrist_from_scratch(first)
+    for kind, anchor in moves[2:] + moves[:2]:
+        t_place(second, kind, anchor)
+        assert second.zobrist == t_zobrist_from_scratch(second)
+        if kind == ShapeKind.C:
+            assert first.zobrist != second.zobrist
+
+    assert first.grid == second.grid
+    assert first.zobrist == second.zobrist
+
+    first.retire()
+    assert first.zobrist != second.zobrist
+    assert first.zobrist == t_zobrist_from_scratch(first)
+    first.pop()
+    assert first.zobrist == second.zobrist
+
+def test_zobrist_reproducible() -> None:
+    """Test that another process, with a different hash seed, computes the
+    same hash for the same position"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)})
+    t_place(blokus, ShapeKind.ONE, (4, 4))
+    t_place(blokus, ShapeKind.TWO, (9, 9))
+
+    code = ("from blokus import Blokus\n"
+            "from piece import Piece\n"
+            "from shape_definitions import ShapeKind\n"
+            "b = Blokus(2, 14, {(4, 4), (9, 9)})\n"
+            "for kind, anchor in ((ShapeKind.ONE, (4, 4)),"
+            " (ShapeKind.TWO, (9, 9))):\n"
+            "    p = Piece(b.shapes[kind])\n"
+            "    p.set_anchor(anchor)\n"
+            "    b.maybe_place(p)\n"
+            "print(b.zobrist)\n")
+    src = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+    env = dict(os.environ, PYTHONHASHSEED="12345", PYTHONPATH=src)
+    out = subprocess.run([sys.executable, "-c", code], env=env,
+                         capture_output=True, text=True, check=True)
+    assert int(out.stdout) == blokus.zobrist
+
+def t_placements_from_masks(blokus: Blokus, player: Optional[int] = None) -> set:
+    """Turn the legal masks of every remaining shape into the set of legal
+    placements. Helper for the legal_mask tests."""
+    if player is None:
+        player = blokus.curr_player
+    found = set()
+    for kind in blokus.remaining_shapes(player):
+        legal = blokus.legal_mask(kind, player)
+        assert legal.shape == (len(ORIENTATIONS[kind]), blokus.size,
+                               blokus.size)
+        for o, r, c in zip(*legal.nonzero()):
+            squares = ORIENTATIONS[kind][o].squares
+            found.add((kind, frozenset((r + dr, c + dc)
+                                       for dr, dc in squares)))
+    return found
+
+def test_legal_mask_matches_available_moves() -> None:
+    """Test that the legal masks give exactly the placements listed by
+    available_moves during a game"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    for _ in range(8):
+        moves = blokus.available_moves()
+        placements = {(p.shape.kind, frozenset(p.squares())) for p in moves}
+        assert t_placements_from_masks(blokus) == placements
+
+        piece = max(moves, key=lambda p: (len(p.squares()),
+                                          sorted(p.squares())))
+        assert blokus.maybe_place(piece)
+
+def test_legal_mask_other_player() -> None:
+    """Test the legal masks of a player whose turn it is not, and that a
+    played shape has no mask"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    t_place(blokus, ShapeKind.ONE, (0, 0))
+    assert set(zip(*blokus.legal_mask(ShapeKind.X, 1)[0].nonzero())) \
+        == {(1, 2), (2, 1)}
+    assert blokus.legal_mask(ShapeKind.TWO, 1).sum() == 4
+    assert blokus.legal_mask(ShapeKind.ONE, 2)[0, 9, 9]
+    assert blokus.legal_mask(ShapeKind.ONE, 2).sum() == 1
+    with pytest.raises(ValueError):
+        blokus.legal_mask(ShapeKind.ONE, 1)
+
+def test_iter_available_moves() -> None:
+    """Test that iter_available_moves yields the same moves as
+    available_moves, in the requested shape order, and only for the requested
+    shapes"""
+    blokus = Blokus(1, 11, {(5, 5)})
+    t_place(blokus, ShapeKind.X, (5, 5))
+    expected = {(p.shape.kind, frozenset(p.squares()))
+                for p in blokus.available_moves()}
+
+    for key in (None, largest_first, smallest_first):
+        moves = list(blokus.iter_available_moves(key=key))
+        assert len(moves) == len(expected)
+        assert {(p.shape.kind, frozenset(p.squares())) for p in moves} \
+            == expected
+        sizes = [len(p.squares()) for p in moves]
+        if key is largest_first:
+            assert sizes == sorted(sizes, reverse=True)
+        if key is smallest_first:
+            assert sizes == sorted(sizes)
+
+    kinds = [ShapeKind.Z, ShapeKind.X, ShapeKind.ONE]
+    moves = list(blokus.iter_available_moves(shapes=kinds))
+    assert {p.shape.kind for p in moves} == {ShapeKind.Z, ShapeKind.ONE}
+    assert moves[0].shape.kind == ShapeKind.Z
+    assert moves[-1].shape.kind == ShapeKind.ONE
+
+def test_has_any_move() -> None:
+    """Test that has_any_move tells whether the current player can move"""
+    blokus = Blokus(1, 5, {(0, 0)})
+    assert blokus.has_any_move()
+    t_place(blokus, ShapeKind.FIVE, (2, 0))
+    assert not blokus.has_any_move()
+
+def test_auto_pass() -> None:
+    """Test that with auto_pass, a player with no legal move is retired when
+    their turn comes, and that pop brings them back"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)}, auto_pass=True)
+    t_place(blokus, ShapeKind.FIVE, (2, 0))
+    assert blokus.curr_player == 2
+    assert not blokus.retired_players
+
+    # Player 1 has no corner left, so the turn comes straight back
+    t_place(blokus, ShapeKind.ONE, (4, 4))
+    assert blokus.retired_players == {1}
+    assert blokus.curr_player == 2
+    assert not blokus.game_over
+    assert blokus.zobrist == t_zobrist_from_scratch(blokus)
+
+    blokus.pop()
+    assert not blokus.retired_players
+    assert blokus.curr_player == 2
+    assert blokus.zobrist == t_zobrist_from_scratch(blokus)
+
+def test_auto_pass_off() -> None:
+    """Test that without auto_pass, a stuck player keeps their turn until
+    they retire"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)})
+    t_place(blokus, ShapeKind.FIVE, (2, 0))
+    t_place(blokus, ShapeKind.ONE, (4, 4))
+    assert blokus.curr_player == 1
+    assert not blokus.has_any_move()
+    blokus.retire()
+    assert blokus.curr_player == 2
+
+def test_auto_pass_game_over() -> None:
+    """Test that the game ends as soon as no player can move, and that
+    game_over follows pop"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)}, auto_pass=True)
+    t_place(blokus, ShapeKind.FIVE, (2, 0))
+    t_place(blokus, ShapeKind.FIVE, (2, 4))
+    assert blokus.retired_players == {1, 2}
+    assert blokus.game_over
+
+    blokus.pop()
+    assert not blokus.game_over
+    assert blokus.curr_player == 2
+    assert blokus.retired_players == set()
+
+def t_score_from_scratch(blokus: Blokus, player: int) -> int:
+    """Compute a player's score from their remaining shapes. Helper for the
+    scoring tests."""
+    shapes = blokus.remaining_shapes(player)
+    if not shapes:
+        return 20 if blokus._last_move[player] == ShapeKind.ONE else 15
+    return -sum(len(blokus.shapes[kind].squares) for kind in shapes)
+
+def test_scores_follow_moves() -> None:
+    """Test that the running scores match the remaining shapes after moves
+    and after undoing them"""
+    blokus = Blokus(3, 10, {(0, 0), (9, 9), (0, 9)})
+    assert all(blokus.get_score(p) == -89 for p in (1, 2, 3))
+    for _ in range(6):
+        move = min(blokus.available_moves(),
+                   key=lambda p: (p.shape.kind.value, sorted(p.squares())))
+        assert blokus.maybe_place(move)
+        for p in (1, 2, 3):
+            assert blokus.get_score(p) == t_score_from_scratch(blokus, p)
+    for _ in range(6):
+        blokus.pop()
+        for p in (1, 2, 3):
+            assert blokus.get_score(p) == t_score_from_scratch(blokus, p)
+    assert all(blokus.get_score(p) == -89 for p in (1, 2, 3))
+
+def test_ranking() -> None:
+    """Test that the ranking groups players by score once the game is over,
+    and is recomputed after an undo"""
+    blokus = Blokus(3, 10, {(0, 0), (9, 9), (0, 9)})
+    t_place(blokus, ShapeKind.ONE, (0, 0))
+    t_place(blokus, ShapeKind.FIVE, (7, 9))
+    blokus.retire()
+    assert blokus.ranking is None
+    assert blokus.winners is None
+    blokus.retire()
+    blokus.retire()
+    assert blokus.game_over
+    assert blokus.ranking == [[2], [1], [3]]
+    assert blokus.winners == [2]
+
+    blokus.pop()
+    blokus.pop()
+    blokus.pop()
+    t_place(blokus, ShapeKind.FIVE, (2, 9))
+    blokus.retire()
+    blokus.retire()
+    blokus.retire()
+    assert blokus.ranking == [[2, 3], [1]]
+    assert blokus.winners == [2, 3]
+
+def test_placement_value() -> None:
+    """Test that placements compare and hash by value, cannot be changed, and
+    survive pickling"""
+    import pickle
+    a = Placement(ShapeKind.L, 3, (4, 5))
+    b = Placement(ShapeKind.L, 3, (4, 5))
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b, Placement(ShapeKind.L, 2, (4, 5))}) == 2
+    with pytest.raises(AttributeError):
+        a.anchor = (0, 0)  # type: ignore
+    with pytest.raises(ValueError):
+        Placement(ShapeKind.ONE, 1, (0, 0))
+    assert pickle.loads(pickle.dumps(a)) == a
+
+def test_placement_matches_piece() -> None:
+    """Test that a placement covers and touches the same squares as the
+    matching piece"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    for kind in (ShapeKind.W, ShapeKind.F, ShapeKind.TWO):
+        piece = Piece(blokus.shapes[kind], face_up=False, rotation=1)
+        piece.set_anchor((5, 5))
+        placement = Placement.from_piece(piece)
+        assert sorted(placement.cells) == sorted(piece.squares())
+        assert set(placement.edges) == piece.cardinal_neighbors()
+        assert set(placement.corners) == piece.intercardinal_neighbors() \
+            - piece.cardinal_neighbors()
+        assert sorted(placement.to_piece(blokus.shapes[kind]).squares()) \
+            == sorted(piece.squares())
+    with pytest.raises(ValueError):
+        Placement.from_piece(Piece(blokus.shapes[ShapeKind.W]))
+
+def test_engine_accepts_placements() -> None:
+    """Test that the legality checks and maybe_place take placements like
+    pieces, and that available_placements matches available_moves"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    placements = blokus.available_placements()
+    assert placements == {Placement.from_piece(p)
+                          for p in blokus.available_moves()}
+
+    off = Placement(ShapeKind.FIVE, 0, (0, 0))
+    assert blokus.any_wall_collisions(off)
+    assert blokus.any_collisions(off)
+    assert not blokus.legal_to_place(off)
+    assert not blokus.maybe_place(off)
+
+    move = Placement(ShapeKind.FIVE, 0, (2, 0))
+    assert move in placements
+    assert not blokus.any_collisions(move)
+    assert blokus.legal_to_place(move)
+    assert blokus.maybe_place(move)
+    assert blokus.grid[4][0] == (1, ShapeKind.FIVE)
+    assert blokus.curr_player == 2
+    blokus.pop()
+    assert blokus.grid[4][0] is None
+
+def test_pieces_share_nothing_mutable() -> None:
+    """Test that transforming a piece, or its shape, does not affect other
+    pieces or the game's shapes"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    shape = blokus.shapes[ShapeKind.L]
+    before = list(shape.squares)
+    a = Piece(shape)
+    b = Piece(shape)
+    a.set_anchor((5, 5))
+    b.set_anchor((5, 5))
+
+    a.rotate_left()
+    a.flip_horizontally()
+    assert shape.squares == before
+    assert sorted(b.squares()) == sorted((5 + r, 5 + c) for r, c in before)
+
+    # Once a piece's shape is used, it is that piece's own copy
+    b.shape.rotate_right()
+    assert b.shape is not shape
+    assert shape.squares == before
+    assert Piece(shape).orientation == 0
+    b.rotate_left()
+    assert b.orientation == 0
+
+    # The game's shape can be changed without affecting existing pieces
+    c = Piece(shape)
+    c.set_anchor((5, 5))
+    shape.flip_horizontally()
+    assert sorted(c.squares()) == sorted((5 + r, 5 + c) for r, c in before)
+    shape.flip_horizontally()
+
+def test_piece_transforms_match_shape() -> None:
+    """Test that flipping and rotating a piece covers the same squares as
+    flipping and rotating a copy of its shape"""
+    for kind, definition in shape_definitions.definitions.items():
+        shape = Shape.from_string(kind, definition)
+        piece = Piece(Shape.from_string(kind, definition), face_up=False)
+        piece.set_anchor((0, 0))
+        shape.flip_horizontally()
+        for step in ("rotate_left", "rotate_left", "flip_horizontally",
+                     "rotate_right"):
+            getattr(piece, step)()
+            getattr(shape, step)()
+            assert sorted(piece.squares()) == sorted(shape.squares)
+        assert piece.kind == kind
+
+def test_piece_of_custom_shape() -> None:
+    """Test that a piece of a shape that is not one of the 21 definitions
+    still works, by copying the shape"""
+    shape = Shape(ShapeKind.TWO, (0, 0), True, [(0, 0), (0, 1), (0, 2)])
+    piece = Piece(shape, rotation=1)
+    piece.set_anchor((3, 3))
+    assert piece.orientation is None
+    assert sorted(piece.squares()) == [(3, 3), (4, 3), (5, 3)]
+    assert shape.squares == [(0, 0), (0, 1), (0, 2)]
+
+def test_from_string_skips_blank_rows() -> None:
+    """Test that from_string ignores every blank row, including several in a
+    row"""
+    shape = Shape.from_string(ShapeKind.TWO, "\n\n   \nO\n\n\nX\n\n")
+    assert shape.origin == (0, 0)
+    assert shape.squares == [(0, 0), (1, 0)]
+
+def test_shapes_are_per_game() -> None:
+    """Test that every game shares the parsed shapes, but that changing a
+    game's shapes does not change those of another game"""
+    from piece import SHAPES
+    a = Blokus(2, 10, {(0, 0), (9, 9)})
+    b = Blokus(2, 10, {(0, 0), (9, 9)})
+    a.shapes[ShapeKind.L].rotate_right()
+    assert b.shapes[ShapeKind.L].squares == SHAPES[ShapeKind.L].squares
+    assert a.shapes[ShapeKind.L].squares != SHAPES[ShapeKind.L].squares
+    assert list(b.shapes) == list(SHAPES)
+    for kind, definition in shape_definitions.definitions.items():
+        shape = Shape.from_string(kind, definition)
+        assert SHAPES[kind].squares == shape.squares
+        assert SHAPES[kind].origin == shape.origin
+
+def t_play(blokus: Blokus, count: int, seed: int) -> None:
+    """Play some random legal moves, retiring players who cannot move. Helper
+    for the snapshot tests."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        if blokus.game_over:
+            return
+        moves = sorted(blokus.available_placements(), key=repr)
+        if moves:
+            assert blokus.maybe_place(rng.choice(moves))
+        else:
+            blokus.retire()
+
+def test_snapshot_restore() -> None:
+    """Test that restore brings back the exact state of a snapshot, however
+    the game changed since, and that pop still works afterwards"""
+    blokus = Blokus(4, 14, {(0, 0), (13, 13), (0, 13), (13, 0)})
+    t_play(blokus, 12, 1)
+    state = t_state(blokus)
+    snapshot = blokus.snapshot()
+
+    t_play(blokus, 20, 2)
+    for _ in range(15):
+        blokus.pop()
+    t_play(blokus, 10, 3)
+    assert t_state(blokus) != state
+
+    blokus.restore(snapshot)
+    assert t_state(blokus) == state
+    assert blokus.zobrist == t_zobrist_from_scratch(blokus)
+    t_play(blokus, 5, 4)
+    for _ in range(5):
+        blokus.pop()
+    assert t_state(blokus) == state
+
+    with pytest.raises(ValueError):
+        Blokus(4, 14, {(0, 0), (13, 13), (0, 13), (13, 1)}).restore(snapshot)
+
+def test_clone_is_independent() -> None:
+    """Test that a clone starts in the same state, and that moves and undos on
+    either game do not affect the other"""
+    blokus = Blokus(3, 14, {(0, 0), (13, 13), (0, 13)})
+    t_play(blokus, 9, 5)
+    blokus.live_moves()
+    clone = blokus.clone()
+    state = t_state(blokus)
+    assert t_state(clone) == state
+    assert clone.live_moves(2) == blokus.live_moves(2)
+
+    t_play(clone, 10, 6)
+    assert t_state(blokus) == state
+    for _ in range(12):
+        clone.pop()
+    t_play(blokus, 3, 7)
+    for _ in range(3):
+        blokus.pop()
+    assert t_state(blokus) == state
+    assert t_state(clone) != state
+    assert {(p.kind, frozenset(p.cells)) for p in clone.live_moves()} \
+        == t_placements_from_masks(clone)
+
+    clone.shapes[ShapeKind.L].flip_horizontally()
+    assert blokus.shapes[ShapeKind.L].squares \
+        == Shape.from_string(ShapeKind.L,
+                             shape_definitions.definitions[ShapeKind.L]).squares
+
+def test_board_accessors() -> None:
+    """Test the public views of the board that other modules read: the
+    bitboard, the players still playing, their open corners as a mask and
+    the squares they have left"""
+    blokus = Blokus(2, 6, {(0, 0), (5, 5)})
+    assert blokus.active_players == {1, 2}
+    placement = Placement(ShapeKind.TWO, 0, (0, 0))
+    assert blokus.maybe_place(placement)
+    board = blokus.board
+    assert set(board.points(board.players[1])) == set(placement.cells)
+    assert set(board.points(blokus.open_corners_mask(1))) \
+        == blokus.open_corners(1)
+    assert blokus.remaining_squares(1) == blokus.remaining_squares(2) - 2
+    blokus.retire()
+    assert blokus.active_players == {1}
+
+def test_load() -> None:
+    """Test that a game loaded from the position of a played game matches it:
+    same hash, scores, moves and squares left"""
+    rng = random.Random(3)
+    blokus = Blokus(3, 9, {(0, 0), (8, 8), (0, 8)})
+    for _ in range(10):
+        moves = sorted(blokus.available_placements(), key=repr)
+        if not moves:
+            blokus.retire()
+        else:
+            assert blokus.maybe_place(rng.choice(moves))
+    blokus.retire()
+    snapshot = blokus.snapshot()
+    players = range(1, 4)
+    loaded = Blokus.load(
+        3, 9, blokus.start_positions, snapshot.curr_player, snapshot.retired,
+        {p: blokus.remaining_shapes(p) for p in players},
+        snapshot.last_move, snapshot.player_masks, snapshot.pieces,
+        snapshot.corners)
+    assert loaded.zobrist == blokus.zobrist
+    assert loaded.curr_player == blokus.curr_player
+    assert loaded.retired_players == blokus.retired_players
+    assert loaded.active_players == blokus.active_players
+    assert loaded.grid == blokus.grid
+    assert loaded.available_placements() == blokus.available_placements()
+    for p in players:
+        assert loaded.get_score(p) == blokus.get_score(p)
+        assert loaded.remaining_squares(p) == blokus.remaining_squares(p)
+    with pytest.raises(ValueError):
+        Blokus.load(3, 9, blokus.start_positions, 4, [], {}, {}, {}, [], {})
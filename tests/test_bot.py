@@ -0,0 +1,16 @@
+from bot import play_chunk, tournament
+
+def test_tournament_is_the_same_with_workers() -> None:
+    """Test that a seeded tournament gives the same results whether its games
+    are played in one process or spread over several, in any chunks"""
+    alone = tournament("N", "S", 6, seed=5)
+    assert sum(alone) == 6
+    assert tournament("N", "S", 6, workers=2, chunk_size=2, seed=5) == alone
+    assert tournament("N", "S", 6, workers=3, seed=5) == alone
+
+def test_endgame_bot_forgets_earlier_games() -> None:
+    """Test that a game of the E-bot plays the same whether or not the process
+    played other games before it"""
+    alone = play_chunk("E", "N", 7, 3, 1)
+    play_chunk("E", "N", 7, 0, 3)
+    assert play_chunk("E", "N", 7, 3, 1) == alone
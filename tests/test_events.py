@@ -0,0 +1,106 @@
+from typing import Optional
+import pytest
+
+from shape_definitions import ShapeKind
+from piece import Point, Placement
+from blokus import Blokus
+from events import BlokusListener
+
+class Recorder(BlokusListener):
+    """A listener that records every event it hears"""
+
+    events: list[tuple]
+
+    def __init__(self) -> None:
+        self.events = []
+
+    def on_place(self, player: int, kind: ShapeKind,
+                 cells: list[Point]) -> None:
+        self.events.append(("place", player, kind, sorted(cells)))
+
+    def on_retire(self, player: int) -> None:
+        self.events.append(("retire", player))
+
+    def on_turn(self, player: int) -> None:
+        self.events.append(("turn", player))
+
+    def on_game_over(self) -> None:
+        self.events.append(("game over",))
+
+    def on_undo(self, player: int, kind: Optional[ShapeKind],
+                cells: list[Point]) -> None:
+        self.events.append(("undo", player, kind, sorted(cells)))
+
+    def on_restore(self) -> None:
+        self.events.append(("restore",))
+
+def test_place_and_turn_events() -> None:
+    """Test that a placement reports the exact cells and shape kind, then
+    the next player"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)})
+    recorder = Recorder()
+    blokus.add_listener(recorder)
+    assert blokus.maybe_place(Placement(ShapeKind.TWO, 0, (4, 4)))
+    cells = sorted(Placement(ShapeKind.TWO, 0, (4, 4)).cells)
+    assert recorder.events == [("place", 1, ShapeKind.TWO, cells),
+                               ("turn", 2)]
+
+    #illegal moves report nothing
+    recorder.events.clear()
+    assert not blokus.maybe_place(Placement(ShapeKind.ONE, 0, (0, 0)))
+    assert recorder.events == []
+
+def test_retire_and_game_over_events() -> None:
+    """Test that retirements and the end of the game are reported, including
+    players retired by auto_pass"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)}, auto_pass=True)
+    recorder = Recorder()
+    blokus.add_listener(recorder)
+    blokus.retire()
+    assert recorder.events == [("retire", 1), ("turn", 2)]
+
+    recorder.events.clear()
+    blokus.retire()
+    assert recorder.events == [("retire", 2), ("game over",)]
+
+def test_undo_and_restore_events() -> None:
+    """Test that pop reports what it undid once the game is back in its
+    earlier state, and that restore is reported"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)})
+    snapshot = blokus.snapshot()
+    assert blokus.maybe_place(Placement(ShapeKind.ONE, 0, (4, 4)))
+    blokus.retire()
+
+    seen: list[Optional[tuple]] = []
+    class Check(BlokusListener):
+        def on_undo(self, player: int, kind: Optional[ShapeKind],
+                    cells: list[Point]) -> None:
+            seen.append((player, kind, cells, blokus.curr_player,
+                         blokus.grid[4][4]))
+    recorder = Recorder()
+    blokus.add_listener(recorder)
+    blokus.add_listener(Check())
+    blokus.pop()
+    blokus.pop()
+    assert recorder.events == [("undo", 2, None, []),
+                               ("undo", 1, ShapeKind.ONE, [(4, 4)])]
+    assert seen == [(2, None, [], 2, (1, ShapeKind.ONE)),
+                    (1, ShapeKind.ONE, [(4, 4)], 1, None)]
+
+    recorder.events.clear()
+    blokus.restore(snapshot)
+    assert recorder.events == [("restore",)]
+
+def test_remove_listener() -> None:
+    """Test that detached listeners hear nothing, and that clones start
+    without listeners"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)})
+    recorder = Recorder()
+    blokus.add_listener(recorder)
+    clone = blokus.clone()
+    assert clone.maybe_place(Placement(ShapeKind.ONE, 0, (4, 4)))
+    blokus.remove_listener(recorder)
+    assert blokus.maybe_place(Placement(ShapeKind.ONE, 0, (4, 4)))
+    assert recorder.events == []
+    with pytest.raises(ValueError):
+        blokus.remove_listener(recorder)
@@ -0,0 +1,109 @@
+import pickle
+import random
+import pytest
+
+from shape_definitions import ShapeKind
+from piece import Placement
+from blokus import Blokus
+from gamestate import GameState
+
+def t_corners() -> set[tuple[int, int]]:
+    """Start positions of a 4-player Blokus Duo-sized board"""
+    return {(0, 0), (13, 13), (0, 13), (13, 0)}
+
+def t_same(state: GameState, blokus: Blokus) -> None:
+    """Check that a state and a Blokus game are in the same position"""
+    assert state.zobrist == blokus.zobrist
+    assert state.curr_player == blokus.curr_player
+    assert state.is_terminal == blokus.game_over
+    assert list(state.scores) == [blokus.get_score(p)
+                                  for p in range(1, blokus.num_players + 1)]
+    assert state == GameState.from_blokus(blokus)
+    if not state.is_terminal:
+        assert set(state.legal_moves()) == set(blokus.available_placements())
+
+def test_apply_matches_blokus() -> None:
+    """Test that applying moves to a state gives the same positions, hashes
+    and scores as playing them in a Blokus game with auto_pass, to the end
+    of the game"""
+    blokus = Blokus(4, 14, t_corners(), auto_pass=True)
+    state = GameState.new(4, 14, t_corners())
+    rng = random.Random(7)
+    t_same(state, blokus)
+    while not state.is_terminal:
+        move = rng.choice(sorted(state.legal_moves(), key=repr))
+        state = state.apply(move)
+        assert blokus.maybe_place(move)
+        t_same(state, blokus)
+    assert blokus.game_over
+    assert state.legal_moves() == []
+
+def test_apply_leaves_state_unchanged() -> None:
+    """Test that apply returns a new state, and that states cannot be
+    changed"""
+    state = GameState.new(2, 14, {(4, 4), (9, 9)})
+    before = pickle.dumps(state)
+    after = state.apply(Placement(ShapeKind.ONE, 0, (4, 4)))
+    assert pickle.dumps(state) == before
+    assert after != state
+    assert after.curr_player == 2
+    with pytest.raises(AttributeError):
+        state.curr_player = 2 # type: ignore
+    with pytest.raises(AttributeError):
+        del state.zobrist
+
+def test_apply_illegal() -> None:
+    """Test that illegal moves raise ValueError"""
+    state = GameState.new(2, 14, {(4, 4), (9, 9)})
+    with pytest.raises(ValueError):
+        state.apply(Placement(ShapeKind.ONE, 0, (0, 0)))
+    with pytest.raises(ValueError):
+        state.apply(Placement(ShapeKind.ONE, 0, (20, 20)))
+    state = state.apply(Placement(ShapeKind.ONE, 0, (4, 4)))
+    state = state.apply(Placement(ShapeKind.ONE, 0, (9, 9)))
+    with pytest.raises(ValueError):
+        state.apply(Placement(ShapeKind.ONE, 0, (5, 5)))
+
+def test_retire() -> None:
+    """Test that retiring players ends the game, as in Blokus"""
+    blokus = Blokus(2, 14, {(4, 4), (9, 9)}, auto_pass=True)
+    state = GameState.new(2, 14, {(4, 4), (9, 9)})
+    state = state.retire()
+    blokus.retire()
+    t_same(state, blokus)
+    state = state.retire()
+    blokus.retire()
+    t_same(state, blokus)
+    assert state.is_terminal
+
+def test_pickle_and_hash() -> None:
+    """Test that states survive pickling, that equal states hash the same,
+    and that the hash is the Zobrist hash"""
+    state = GameState.new(2, 14, {(4, 4), (9, 9)})
+    state = state.apply(Placement(ShapeKind.ONE, 0, (4, 4)))
+    state = state.apply(Placement(ShapeKind.ONE, 0, (9, 9)))
+    copy = pickle.loads(pickle.dumps(state))
+    assert copy == state
+    assert copy is not state
+    assert hash(copy) == hash(state) == state.zobrist
+    assert len({state, copy, GameState.new(2, 14, {(4, 4), (9, 9)})}) == 2
+    assert copy.apply(Placement(ShapeKind.TWO, 0, (5, 5))) \
+        == state.apply(Placement(ShapeKind.TWO, 0, (5, 5)))
+
+def test_to_blokus_round_trip() -> None:
+    """Test that a state turned into a Blokus game and back is unchanged, and
+    that the game can be played on from there"""
+    blokus = Blokus(4, 14, t_corners(), auto_pass=True)
+    rng = random.Random(3)
+    for _ in range(14):
+        move = rng.choice(sorted(blokus.available_placements(), key=repr))
+        assert blokus.maybe_place(move)
+    state = GameState.from_blokus(blokus)
+
+    copy = state.to_blokus()
+    assert copy.grid == blokus.grid
+    assert copy.zobrist == blokus.zobrist
+    t_same(state, copy)
+    move = sorted(copy.available_placements(), key=repr)[0]
+    assert copy.maybe_place(move)
+    t_same(state.apply(move), copy)
@@ -0,0 +1,188 @@
+import pathlib
+import random
+import numpy as np
+import pytest
+
+import placements
+from shape_definitions import ShapeKind
+from piece import Placement
+from placements import BOARD_SIZES, PlacementTable, placements_for
+from blokus import Blokus
+
+def t_brute_moves(blokus: Blokus, player: int) -> set:
+    """Find a player's moves from scratch, as sets of covered squares.
+    Helper for the live move list tests."""
+    remaining = blokus._players[player]
+    return {(kind, frozenset(Placement(kind, o, anchor).cells))
+            for kind, o, anchor in blokus._iter_moves(player, remaining)}
+
+def t_cells(placements: set[Placement]) -> set:
+    """Turn placements into sets of covered squares, so that placements with
+    different orientation ids but the same squares compare equal"""
+    return {(p.kind, frozenset(p.cells)) for p in placements}
+
+def test_table_counts() -> None:
+    """Test the number of placements of a few shapes, and that every
+    placement fits on the board"""
+    table = PlacementTable(5)
+    assert len(table.by_kind[ShapeKind.ONE]) == 25
+    assert len(table.by_kind[ShapeKind.TWO]) == 2 * 20
+    assert len(table.by_kind[ShapeKind.X]) == 9
+    assert len(table.by_kind[ShapeKind.FIVE]) == 2 * 5
+    for i in range(len(table)):
+        placement = table.placement(i)
+        cells = placement.cells
+        assert placement.kind == table.kind(i)
+        assert all(0 <= r < 5 and 0 <= c < 5 for r, c in cells)
+        assert [r * 5 + c for r, c in cells] \
+            == [c for c in table.cells[i].tolist() if c >= 0]
+        assert table.find(placement.kind, table.mask_ints[i]) == i
+    assert placements_for(5) is placements_for(5)
+
+def test_words_match_masks() -> None:
+    """Test that the two bit layouts of each placement cover the same
+    squares"""
+    table = PlacementTable(7)
+    for i in range(0, len(table), 7):
+        assert (table.to_words(table.mask_ints[i]) == table.words[i]).all()
+
+def test_legal_ids() -> None:
+    """Test that the vectorized legality pass finds the same moves as the
+    move generator"""
+    blokus = Blokus(2, 11, {(0, 0), (10, 10)})
+    for _ in range(6):
+        move = sorted(blokus.available_placements(), key=repr)[-1]
+        assert blokus.maybe_place(move)
+    table = placements_for(11)
+    board = blokus._board
+    for player in (1, 2):
+        blocked = board.occupied | board.edges(board.players[player])
+        corners = board.mask(blokus.open_corners(player))
+        assert corners is not None
+        ids = table.legal_ids(blocked, corners, blokus.remaining_shapes(player))
+        assert {(table.kind(i), frozenset(table.placement(i).cells))
+                for i in ids.tolist()} == t_brute_moves(blokus, player)
+
+def test_disk_cache(tmp_path: pathlib.Path,
+                    monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the universe is saved on first use, and memory-mapped from
+    the cache after that"""
+    monkeypatch.setenv("BLOKUS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(placements, "_TABLES", {})
+    built = placements_for(9)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    monkeypatch.setattr(placements, "_TABLES", {})
+    loaded = placements_for(9)
+    assert loaded is not built
+    assert isinstance(loaded.words, np.memmap)
+    for name in placements._ARRAYS:
+        assert (getattr(loaded, name) == getattr(built, name)).all()
+    assert loaded.placement(100) == built.placement(100)
+
+    monkeypatch.setenv("BLOKUS_CACHE_DIR", "")
+    monkeypatch.setattr(placements, "_TABLES", {})
+    assert len(placements_for(8)) > 0
+    assert len(list(tmp_path.iterdir())) == 1
+
+def test_board_sizes() -> None:
+    """Test the size of the universe of the usual configurations"""
+    assert BOARD_SIZES == {"mono": 11, "duo": 14, "classic": 20}
+    table = PlacementTable(BOARD_SIZES["duo"])
+    assert len(table) == sum(len(ids) for ids in table.by_kind.values())
+    assert table.words.dtype == np.uint64
+
+def test_covers_index() -> None:
+    """Test that the inverted index lists exactly the placements covering each
+    square"""
+    table = PlacementTable(6)
+    for cell, ids in enumerate(table.covers):
+        assert set(ids.tolist()) \
+            == {i for i in range(len(table)) if cell in table.cells[i]}
+
+def t_check_live(blokus: Blokus) -> None:
+    """Check every player's live move list against a search from scratch, and
+    its flags against the list"""
+    index = blokus._move_index()
+    for player in range(1, blokus.num_players + 1):
+        assert t_cells(blokus.live_moves(player)) \
+            == t_brute_moves(blokus, player)
+        assert set(np.flatnonzero(index.alive[player]).tolist()) \
+            == index.live[player]
+
+def test_live_moves_follow_the_game() -> None:
+    """Test that the live move lists of every player match a search from
+    scratch after every move of a random game, and after every pop"""
+    rng = random.Random(5)
+    blokus = Blokus(4, 14, {(0, 0), (13, 13), (0, 13), (13, 0)})
+    blokus.live_moves()
+    while not blokus.game_over:
+        moves = sorted(blokus.live_moves(), key=repr)
+        if not moves or len(blokus._history) == 40:
+            blokus.retire()
+            continue
+        assert blokus.maybe_place(rng.choice(moves))
+        t_check_live(blokus)
+
+    while blokus._history:
+        blokus.pop()
+        t_check_live(blokus)
+
+def test_live_moves_started_mid_game() -> None:
+    """Test that move lists started in the middle of a game are rebuilt when
+    a move made before them is undone"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    assert blokus.maybe_place(Placement(ShapeKind.FIVE, 0, (2, 0)))
+    assert blokus.maybe_place(Placement(ShapeKind.ONE, 0, (9, 9)))
+    before = blokus.live_moves(1)
+    assert blokus.maybe_place(sorted(blokus.live_moves(), key=repr)[0])
+    blokus.pop()
+    assert blokus.live_moves(1) == before
+    blokus.pop()
+    blokus.pop()
+    assert t_cells(blokus.live_moves()) == t_brute_moves(blokus, 1)
+
+def test_live_moves_stopped_and_started_again() -> None:
+    """Test that move lists stopped and started again stay right back through
+    pops of moves made before they stopped"""
+    blokus = Blokus(2, 10, {(0, 0), (9, 9)})
+    blokus.live_moves()
+    assert blokus.maybe_place(Placement(ShapeKind.FIVE, 0, (2, 0)))
+    assert blokus.maybe_place(Placement(ShapeKind.ONE, 0, (9, 9)))
+    blokus.stop_live_moves()
+    assert not blokus.live_moves_on
+    blokus.live_moves()
+    assert blokus.live_moves_on
+    blokus.pop()
+    t_check_live(blokus)
+    blokus.pop()
+    t_check_live(blokus)
+
+def t_check_mobility(blokus: Blokus) -> None:
+    """Check every player's mobility against a search from scratch"""
+    for player in range(1, blokus.num_players + 1):
+        moves = t_brute_moves(blokus, player)
+        if player in blokus.retired_players:
+            moves = set()
+        by_shape = blokus.mobility_by_shape(player)
+        assert blokus.mobility(player) == len(moves)
+        assert set(by_shape) == set(blokus.remaining_shapes(player))
+        for kind, count in by_shape.items():
+            assert count == sum(1 for k, _ in moves if k == kind)
+
+def test_mobility_follows_the_game() -> None:
+    """Test that the mobility of every player, in all and per shape, stays
+    right through a random game and back through pops"""
+    rng = random.Random(11)
+    blokus = Blokus(4, 14, {(0, 0), (13, 13), (0, 13), (13, 0)})
+    t_check_mobility(blokus)
+    while not blokus.game_over:
+        moves = sorted(blokus.live_moves(), key=repr)
+        if not moves or len(blokus._history) == 30:
+            blokus.retire()
+        else:
+            assert blokus.maybe_place(rng.choice(moves))
+        t_check_mobility(blokus)
+    while blokus._history:
+        blokus.pop()
+        t_check_mobility(blokus)
@@ -0,0 +1,46 @@
+from shape_definitions import ShapeKind
+from piece import Piece, SHAPES
+from bitboard import Bitboard
+from neighbors import neighbors_for
+
+def test_tables_match_bitboard() -> None:
+    """Test that the neighbors of every square are the squares the bitboard
+    finds around it, on every side of the board"""
+    for size in (5, 14):
+        table = neighbors_for(size)
+        board = Bitboard(1, size)
+        for i in range(size * size):
+            point = table.point(i)
+            mask = board.mask([point])
+            assert mask is not None
+            orthogonal = {table.point(j) for j in table.orthogonal_ids[i]}
+            diagonal = {table.point(j) for j in table.diagonal_ids[i]}
+            assert orthogonal == set(board.points(board.edges(mask)))
+            assert diagonal == set(board.points(board.corners(mask)))
+            assert set(table.adjacent_ids[i]) \
+                == set(table.orthogonal_ids[i]) | set(table.diagonal_ids[i])
+            assert table.index(point) == i
+
+def test_table_arrays() -> None:
+    """Test the shape and padding of the arrays, and that they are shared
+    and read-only"""
+    table = neighbors_for(5)
+    assert table is neighbors_for(5)
+    assert table.orthogonal.shape == (25, 4)
+    assert table.adjacent.shape == (25, 8)
+    assert list(table.orthogonal[0]) == [1, 5, -1, -1]
+    assert list(table.diagonal[12]) == [6, 8, 16, 18]
+    assert not table.adjacent.flags.writeable
+
+def test_piece_neighbors_on_board() -> None:
+    """Test that, given the board size, piece neighbors are bounded on every
+    side"""
+    piece = Piece(SHAPES[ShapeKind.LETTER_O])
+    piece.set_anchor((4, 4))
+    assert piece.cardinal_neighbors(6) == {(3, 4), (3, 5), (4, 3), (5, 3)}
+    assert piece.intercardinal_neighbors(6) \
+        == {(3, 3), (3, 4), (3, 5), (4, 3), (5, 3)}
+    assert (6, 4) in piece.cardinal_neighbors()
+
+    piece.set_anchor((5, 5))
+    assert piece.cardinal_neighbors(6) == {(4, 5), (5, 4)}
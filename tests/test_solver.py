@@ -0,0 +1,117 @@
+import random
+from typing import Optional
+import pytest
+
+from blokus import Blokus
+from solver import EndgameSolver
+
+def t_endgame(num_players: int, seed: int, moves: int) -> Blokus:
+    """Play random moves on a small board, to get a position near the end of
+    the game"""
+    starts = {(0, 0), (6, 6), (0, 6)}
+    blokus = Blokus(num_players, 7, starts)
+    rng = random.Random(seed)
+    for _ in range(moves):
+        placements = sorted(blokus.available_placements(), key=repr)
+        if blokus.game_over:
+            break
+        if placements:
+            assert blokus.maybe_place(rng.choice(placements))
+        else:
+            blokus.retire()
+    return blokus
+
+def t_scores(blokus: Blokus) -> tuple[int, ...]:
+    """Every player's score"""
+    return tuple(blokus.get_score(p) for p in range(1, blokus.num_players + 1))
+
+def t_children(blokus: Blokus) -> list[Optional[object]]:
+    """The moves of the player to move, or [None] if they must retire"""
+    moves: list[Optional[object]] = list(blokus.available_placements())
+    return moves or [None]
+
+def t_play(blokus: Blokus, move: Optional[object]) -> None:
+    """Play a move, or retire for None"""
+    if move is None:
+        blokus.retire()
+    else:
+        assert blokus.push(move) # type: ignore
+
+def t_paranoid(blokus: Blokus, root: int) -> float:
+    """Plain minimax of the root player's lead, without pruning or memory"""
+    if blokus.game_over:
+        scores = t_scores(blokus)
+        return scores[root - 1] - max(s for p, s in enumerate(scores)
+                                      if p != root - 1)
+    values = []
+    for move in t_children(blokus):
+        t_play(blokus, move)
+        values.append(t_paranoid(blokus, root))
+        blokus.pop()
+    return max(values) if blokus.curr_player == root else min(values)
+
+def t_maxn(blokus: Blokus) -> tuple[int, ...]:
+    """Plain max^n, with ties broken as the solver does"""
+    if blokus.game_over:
+        return t_scores(blokus)
+    player = blokus.curr_player - 1
+    results = []
+    for move in t_children(blokus):
+        t_play(blokus, move)
+        results.append(t_maxn(blokus))
+        blokus.pop()
+    return max(results, key=lambda s: (s[player], -sum(s)))
+
+def test_paranoid_matches_minimax() -> None:
+    """Test that the proven value of two-player endgames is the minimax value,
+    that the line reaches it, and that the game is left unchanged"""
+    for seed in range(3):
+        blokus = t_endgame(2, seed, 7)
+        before = (blokus.zobrist, len(blokus._history))
+        solution = EndgameSolver(max_nodes=None).solve(blokus)
+        assert solution.proven
+        assert solution.value == t_paranoid(blokus, blokus.curr_player)
+        assert (blokus.zobrist, len(blokus._history)) == before
+
+        for move in solution.line:
+            t_play(blokus, move)
+        assert blokus.game_over
+        assert t_scores(blokus) == solution.scores
+
+def test_maxn_matches_brute_force() -> None:
+    """Test that three-player endgames are solved with max^n"""
+    blokus = t_endgame(3, 4, 9)
+    solution = EndgameSolver(max_nodes=None).solve(blokus)
+    assert solution.proven
+    assert solution.scores == t_maxn(blokus)
+    assert solution.value == solution.scores[blokus.curr_player - 1]
+
+def test_budget() -> None:
+    """Test that a search out of budget still gives a legal move, but is not
+    proven"""
+    blokus = t_endgame(2, 0, 2)
+    solution = EndgameSolver(max_nodes=20).solve(blokus)
+    assert not solution.proven
+    assert solution.nodes <= 21
+    assert solution.move in blokus.available_placements()
+
+    solver = EndgameSolver(threshold=3)
+    assert not solver.should_solve(blokus)
+    assert solver.should_solve(t_endgame(2, 0, 8))
+    assert not solver.should_solve(t_endgame(2, 0, 12))
+    with pytest.raises(ValueError):
+        EndgameSolver(mode="minimax")
+
+def test_leaves_live_moves_as_they_were() -> None:
+    """Test that searching a game leaves its live move lists off if they were
+    off, and on (and right) if they were on"""
+    blokus = t_endgame(2, 0, 8)
+    solver = EndgameSolver()
+    assert solver.should_solve(blokus)
+    solver.solve(blokus)
+    assert not blokus.live_moves_on
+
+    moves = blokus.live_moves()
+    solver.solve(blokus)
+    assert blokus.live_moves_on
+    assert blokus.live_moves() == moves
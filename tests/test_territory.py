@@ -0,0 +1,96 @@
+import random
+import numpy as np
+
+from shape_definitions import ShapeKind
+from piece import Placement
+from blokus import Blokus
+from territory import Territory
+
+def t_brute_reach(blokus: Blokus, player: int) -> np.ndarray:
+    """Find the squares a player can reach with a breadth-first search over
+    the grid, from their open corners"""
+    size = blokus.size
+    reach = np.zeros((size, size), dtype=bool)
+    if player not in blokus.active_players:
+        return reach
+    forbidden = blokus.forbidden_squares(player)
+    todo = list(blokus.open_corners(player))
+    for r, c in todo:
+        reach[r, c] = True
+    while todo:
+        r, c = todo.pop()
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                r2, c2 = r + dr, c + dc
+                if 0 <= r2 < size and 0 <= c2 < size \
+                   and not reach[r2, c2] and blokus.grid[r2][c2] is None \
+                   and (r2, c2) not in forbidden:
+                    reach[r2, c2] = True
+                    todo.append((r2, c2))
+    return reach
+
+def t_check(territory: Territory) -> None:
+    """Check a territory against a search from scratch"""
+    blokus = territory.game
+    players = range(1, blokus.num_players + 1)
+    reaches = {p: t_brute_reach(blokus, p) for p in players}
+    counts = sum(reaches[p].astype(int) for p in players)
+    for p in players:
+        assert (territory.reachable(p) == reaches[p]).all()
+        assert ((territory.reachable_regions(p) > 0) == reaches[p]).all()
+        assert territory.potential(p) \
+            == min(int(reaches[p].sum()), blokus.remaining_squares(p))
+        assert ((territory.exclusive() == p) == (reaches[p] & (counts == 1))
+                ).all()
+    assert (territory.contested() == (counts >= 2)).all()
+    assert sorted(territory.regions) == list(players)
+    assert sorted(territory.regions[1]) == sorted(Territory(blokus).regions[1])
+
+def test_start_of_game() -> None:
+    """Test that every player reaches the whole empty board at first, so it is
+    all contested"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)})
+    territory = Territory(blokus)
+    assert territory.reachable(1).all()
+    assert territory.contested().all()
+    assert (territory.exclusive() == 0).all()
+    assert territory.potential(1) == 25
+
+def test_walled_off_region() -> None:
+    """Test that a player's own pieces wall off squares they can no longer
+    reach, while their opponent still can"""
+    blokus = Blokus(2, 5, {(0, 0), (4, 4)})
+    territory = Territory(blokus)
+    assert blokus.maybe_place(Placement(ShapeKind.TWO, 0, (0, 0)))
+    blokus.retire()
+    #the squares of the piece and beside it are lost to player 1, whose
+    #corner reaches the rest of the board
+    reach = territory.reachable(1)
+    assert not reach[0, 0] and not reach[1, 0]
+    assert reach[4, 4]
+    assert (territory.reachable(2) == 0).all()
+    assert territory.exclusive()[4, 4] == 1
+    t_check(territory)
+
+def test_follows_the_game() -> None:
+    """Test that the territory stays right through a random game, back
+    through pops, and after restoring a snapshot"""
+    rng = random.Random(4)
+    blokus = Blokus(4, 10, {(0, 0), (9, 9), (0, 9), (9, 0)})
+    territory = Territory(blokus)
+    snapshot = blokus.snapshot()
+    while not blokus.game_over:
+        moves = sorted(blokus.available_placements(), key=repr)
+        if not moves:
+            blokus.retire()
+        else:
+            assert blokus.maybe_place(rng.choice(moves))
+        t_check(territory)
+    for _ in range(20):
+        blokus.pop()
+        t_check(territory)
+    blokus.restore(snapshot)
+    t_check(territory)
+
+    territory.close()
+    assert territory not in blokus._listeners
@@ -0,0 +1,91 @@
+import pytest
+
+from ttable import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE, \
+    ENTRY_BYTES
+
+def test_size_from_memory_cap() -> None:
+    """Test that the table never uses more than its memory cap"""
+    table = TranspositionTable(1000)
+    assert table.capacity * ENTRY_BYTES <= 1000
+    assert table.num_buckets & (table.num_buckets - 1) == 0
+    assert TranspositionTable(1).capacity == 2
+    with pytest.raises(ValueError):
+        TranspositionTable(0)
+
+def test_store_and_probe() -> None:
+    """Test that stored entries are found, and that missing ones are not"""
+    table = TranspositionTable(1 << 16)
+    key = 0xFEDCBA9876543210
+    assert table.probe(key) is None
+    table.store(key, 3, -12.5, LOWER, 42)
+    assert table.probe(key) == (3, -12.5, LOWER, 42)
+    assert table.probe(key + table.num_buckets) is None
+    assert len(table) == 1
+    assert table.hits == 1
+    assert table.probes == 3
+    assert table.hit_rate == pytest.approx(1 / 3)
+
+    table.store(key, 127, 1.0, EXACT)
+    for depth in (-1, 128):
+        with pytest.raises(ValueError):
+            table.store(key, depth, 1.0, EXACT)
+    assert table.probe(key) == (127, 1.0, EXACT, 42)
+
+def test_same_position_keeps_deeper_result() -> None:
+    """Test that a shallower result does not replace a deeper one from the
+    same search, and that the best move is kept when none is given"""
+    table = TranspositionTable(1 << 16)
+    table.store(7, 5, 1.0, EXACT, 3)
+    table.store(7, 2, 9.0, UPPER)
+    assert table.probe(7) == (5, 1.0, EXACT, 3)
+    table.store(7, 6, 2.0, LOWER)
+    assert table.probe(7) == (6, 2.0, LOWER, 3)
+
+    table.new_search()
+    table.store(7, 1, 4.0, EXACT, NO_MOVE)
+    assert table.probe(7) == (1, 4.0, EXACT, 3)
+
+def test_depth_preferred_replacement() -> None:
+    """Test that colliding positions go to the depth-preferred slot when they
+    are deeper, and to the always-replace slot when they are not"""
+    table = TranspositionTable(2 * ENTRY_BYTES)
+    assert table.num_buckets == 1
+
+    table.store(1, 4, 1.0, EXACT)
+    table.store(2, 2, 2.0, EXACT)
+    assert table.probe(1) is not None
+    assert table.probe(2) is not None
+
+    # Shallow results keep replacing the always-replace slot
+    table.store(3, 1, 3.0, EXACT)
+    assert table.probe(1) is not None
+    assert table.probe(2) is None
+    assert table.probe(3) is not None
+
+    # A deeper result takes the depth-preferred slot and demotes the old one
+    table.store(4, 6, 4.0, EXACT)
+    assert table.probe(4) is not None
+    assert table.probe(1) is not None
+    assert table.probe(3) is None
+    assert table.overwrites == 2
+
+def test_age_based_replacement() -> None:
+    """Test that entries from an earlier search are replaced even when they
+    are deeper"""
+    table = TranspositionTable(2 * ENTRY_BYTES)
+    table.store(1, 9, 1.0, EXACT)
+    table.new_search()
+    table.store(2, 1, 2.0, EXACT)
+    assert table.probe(1) is None
+    assert table.probe(2) == (1, 2.0, EXACT, NO_MOVE)
+
+def test_clear() -> None:
+    """Test that clear empties the table and resets the statistics"""
+    table = TranspositionTable(1 << 12)
+    for key in range(50):
+        table.store(key * 7919, 1, float(key), EXACT)
+    table.probe(0)
+    table.clear()
+    assert len(table) == 0
+    assert table.probes == 0
+    assert table.probe(0) is None